@@ -24,11 +24,51 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 
+# PROGRESS
+# REDIS - progress events published with redis pub/sub, LOCAL - in-process channel
+SIMBAD_PROGRESS_CHANNEL = os.getenv('SIMBAD_PROGRESS_CHANNEL', 'REDIS')
+SIMBAD_PROGRESS_REDIS_URL = os.getenv('SIMBAD_PROGRESS_REDIS_URL', CELERY_BROKER_URL)
+# Minimum seconds between runtime info writes to database, status changes are written at once
+SIMBAD_PROGRESS_DB_INTERVAL = float(os.getenv('SIMBAD_PROGRESS_DB_INTERVAL', 10))
+# Seconds between keepalive comments of idle event streams
+SIMBAD_PROGRESS_KEEPALIVE = float(os.getenv('SIMBAD_PROGRESS_KEEPALIVE', 15))
+
 # FLASK
 PROPAGATE_EXCEPTIONS = True
 
 # CLI
 SIMBAD_CLI_EXECUTOR = os.getenv('SIMBAD_CLI_EXECUTOR', 'LOCAL')
+SIMBAD_CLI_SAMPLING_INTERVAL = float(os.getenv('SIMBAD_CLI_SAMPLING_INTERVAL', 1.0))
+SIMBAD_CLI_MAX_SAMPLES = int(os.getenv('SIMBAD_CLI_MAX_SAMPLES', 86400))
+SIMBAD_CLI_LOG_BUFFER_KB = int(os.getenv('SIMBAD_CLI_LOG_BUFFER_KB', 256))
+# CSV - stdout saved as cli_out.csv, PARQUET - stdout converted to cli_out.parquet while the simulation runs,
+# BOTH - cli_out.parquet is passed to analyzer and cli_out.csv is kept
+SIMBAD_CLI_OUTPUT_FORMAT = os.getenv('SIMBAD_CLI_OUTPUT_FORMAT', 'CSV')
+SIMBAD_CLI_OUTPUT_DELIMITER = os.getenv('SIMBAD_CLI_OUTPUT_DELIMITER', ';')
+SIMBAD_CLI_PARQUET_ROW_GROUP_ROWS = int(os.getenv('SIMBAD_CLI_PARQUET_ROW_GROUP_ROWS', 1000000))
+# Run analyzer concurrently with the simulation, on parquet segments of simulator output
+SIMBAD_PIPELINED = os.getenv('SIMBAD_PIPELINED', '0') == '1'
+# Local scheduler of simulator runs, the ledger is shared by all workers on the host
+SIMBAD_SCHEDULER_PATH = os.getenv('SIMBAD_SCHEDULER_PATH', SIMBAD_DATA_PATH)
+SIMBAD_SCHEDULER_CPU_BUDGET = float(os.getenv('SIMBAD_SCHEDULER_CPU_BUDGET', os.cpu_count() or 1))
+# 0 - 80% of host memory
+SIMBAD_SCHEDULER_MEMORY_BUDGET_MB = int(os.getenv('SIMBAD_SCHEDULER_MEMORY_BUDGET_MB', 0))
+# Footprint of runs without declared resources
+SIMBAD_SCHEDULER_RUN_CPU = float(os.getenv('SIMBAD_SCHEDULER_RUN_CPU', 1))
+SIMBAD_SCHEDULER_RUN_MEMORY_MB = int(os.getenv('SIMBAD_SCHEDULER_RUN_MEMORY_MB', 2048))
+# Seconds between admission attempts of queued runs, the cli task is retried instead of holding a worker
+SIMBAD_SCHEDULER_POLLING_PERIOD = float(os.getenv('SIMBAD_SCHEDULER_POLLING_PERIOD', 5))
+# Queued runs that did not retry admission for this many seconds lose their place, ex. revoked tasks
+SIMBAD_SCHEDULER_QUEUED_TTL = float(os.getenv('SIMBAD_SCHEDULER_QUEUED_TTL', 600))
+# Maximum number of simulations in one parameter sweep
+SIMBAD_SWEEP_MAX_SIZE = int(os.getenv('SIMBAD_SWEEP_MAX_SIZE', 10000))
+# Results of simulations with identical configuration, simulator binary and analyzer version are reused, when enabled
+SIMBAD_RESULT_CACHE = os.getenv('SIMBAD_RESULT_CACHE', '0') == '1'
+SIMBAD_RESULT_CACHE_PATH = os.getenv('SIMBAD_RESULT_CACHE_PATH', '{}/result_cache'.format(SIMBAD_DATA_PATH))
+SIMBAD_RESULT_CACHE_MAX_AGE_DAYS = float(os.getenv('SIMBAD_RESULT_CACHE_MAX_AGE_DAYS', 30))
+SIMBAD_RESULT_CACHE_MAX_SIZE_MB = int(os.getenv('SIMBAD_RESULT_CACHE_MAX_SIZE_MB', 50 * 1024))
+# Dotted path of the random seed in simulation configuration, configurations without the seed are not cached
+SIMBAD_RESULT_CACHE_SEED_PATH = os.getenv('SIMBAD_RESULT_CACHE_SEED_PATH', 'seed')
 
 # ANALYZER
 SIMBAD_ANALYZER_EXECUTOR = os.getenv('SIMBAD_ANALYZER_EXECUTOR', 'SSH')
@@ -41,5 +81,24 @@ SIMBAD_ANALYZER_START_ENDPOINT = '{}/api/analyzer/start'.format(SIMBAD_ANALYZER_
 SIMBAD_ANALYZER_RUNTIME_ENDPOINT = '{}/api/analyzer/runtime'.format(SIMBAD_ANALYZER_GATEWAY)
 SIMBAD_ANALYZER_RESULT_ENDPOINT = '{}/api/analyzer/result'.format(SIMBAD_ANALYZER_GATEWAY)
 SIMBAD_ANALYZER_POLLING_PERIOD = os.getenv('SIMBAD_ANALYZER_POLLING_PERIOD', 5)
+# Seconds the pipelined analyzer waits for sealed simulator output, the step fails when it expires
+SIMBAD_ANALYZER_PIPELINED_TIMEOUT = float(os.getenv('SIMBAD_ANALYZER_PIPELINED_TIMEOUT', 24 * 3600))
+# Part of result cache key, change when analyzer output changes
+SIMBAD_ANALYZER_VERSION = os.getenv('SIMBAD_ANALYZER_VERSION', '1')
 SIMBAD_ANALYZER_USER = os.getenv('SIMBAD_ANALYZER_USER', 'pi')
 SIMBAD_ANALYZER_PASSWORD = os.getenv('SIMBAD_ANALYZER_USER', 'simbadcore')
+
+# REPORTS
+REPORTS_DATA_CACHE_SIZE_MB = int(os.getenv('REPORTS_DATA_CACHE_SIZE_MB', 1024))
+REPORTS_PLOT_MAX_POINTS = int(os.getenv('REPORTS_PLOT_MAX_POINTS', 0))
+REPORTS_PLOT_RENDERER = os.getenv('REPORTS_PLOT_RENDERER', 'path')
+REPORTS_PLOT_STATS_WORKERS = int(os.getenv('REPORTS_PLOT_STATS_WORKERS', 0))
+SIMBAD_RENDER_WORKER = os.getenv('SIMBAD_RENDER_WORKER', '0') == '1'
+SIMBAD_RENDER_QUEUE = os.getenv('SIMBAD_RENDER_QUEUE', None)
+REPORTS_PDF_STREAMING = os.getenv('REPORTS_PDF_STREAMING', '1') == '1'
+REPORTS_PDF_WORKERS = int(os.getenv('REPORTS_PDF_WORKERS', 4))
+REPORTS_MODEL_PER_PARAMETER = os.getenv('REPORTS_MODEL_PER_PARAMETER', '0') == '1'
+REPORTS_MODEL_CHUNK_ROWS = int(os.getenv('REPORTS_MODEL_CHUNK_ROWS', 1000000))
+REPORTS_MODEL_CPU_BUDGET = int(os.getenv('REPORTS_MODEL_CPU_BUDGET', os.cpu_count() or 4))
+REPORTS_PREVIEW_MODEL_POINTS = int(os.getenv('REPORTS_PREVIEW_MODEL_POINTS', 200000))
+REPORTS_PREVIEW_MODEL_CPU_SHARE = float(os.getenv('REPORTS_PREVIEW_MODEL_CPU_SHARE', 0.25))
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect
 from sqlalchemy.orm import scoped_session, create_session
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -6,6 +6,15 @@ engine = None
 Base = declarative_base()
 db_session = scoped_session(lambda: create_session(bind=engine))
 
+# Columns added to existing tables, (table, column). create_all only creates missing tables, so these
+# are added to databases created before them by upgrade_db
+ADDED_COLUMNS = [
+    ('artifacts', 'parent_id'),
+    ('artifacts', 'resolution'),
+    ('simulations', 'sweep_id'),
+    ('simulations', 'config_hash'),
+]
+
 
 def init_engine(uri, **kwargs):
     global engine
@@ -15,3 +24,25 @@ def init_engine(uri, **kwargs):
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    upgrade_db()
+
+
+def upgrade_db():
+    """
+    Adds columns from ADDED_COLUMNS that are missing in existing tables, with their foreign keys and indexes
+    :return:
+    """
+    inspector = inspect(engine)
+    for table_name, column_name in ADDED_COLUMNS:
+        existing = [column['name'] for column in inspector.get_columns(table_name)]
+        if column_name in existing:
+            continue
+        table = Base.metadata.tables[table_name]
+        column = table.c[column_name]
+        definition = '{} {}'.format(column_name, column.type.compile(dialect=engine.dialect))
+        for foreign_key in column.foreign_keys:
+            definition += ' REFERENCES {}({})'.format(foreign_key.column.table.name, foreign_key.column.name)
+        engine.execute('ALTER TABLE {} ADD COLUMN {}'.format(table_name, definition))
+        for index in table.indexes:
+            if index.columns.contains_column(column):
+                index.create(bind=engine)
@@ -1,6 +1,7 @@
 import os
 
 from sqlalchemy import Column, Integer, ForeignKey, DateTime, String
+from sqlalchemy.orm import relationship, backref
 
 from database import Base
 
@@ -16,9 +17,28 @@ class Artifact(Base):
     name = Column(String())
     path = Column(String())
     file_type = Column(String())
+    # Downscaled variants of plot images point to the full resolution artifact
+    parent_id = Column(Integer, ForeignKey('artifacts.id'))
+    resolution = Column(String())
+    variants = relationship("Artifact", backref=backref('parent', remote_side=[id]))
 
     def get_workdir(self):
         return os.path.dirname(os.path.abspath(self.path)) if self.path is not None else None
 
+    def get_variant(self, resolution: str):
+        """
+        Returns the variant of artifact in given resolution, or the artifact itself if there is no such variant
+        :param resolution: ex. 'thumbnail', 'preview'
+        :return:
+        """
+        for variant in self.variants:
+            if variant.resolution == resolution:
+                return variant
+        return self
+
+    @property
+    def resolutions(self):
+        return [variant.resolution for variant in self.variants]
+
     def __json__(self):
-        return ['id', 'created_utc', 'size_kb', 'name', 'file_type']
+        return ['id', 'created_utc', 'size_kb', 'name', 'file_type', 'resolution', 'resolutions']
@@ -1,6 +1,6 @@
 import enum
 
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
 
 from database import Base
@@ -25,8 +25,14 @@ class Simulation(Base):
     workdir = Column(String())
     name = Column(String(50), unique=False)
     status = Column(String())
+    sweep_id = Column(Integer, ForeignKey('sweeps.id'))
+    # Result cache key, see result_cache.config_hash
+    config_hash = Column(String(64), index=True)
     steps = relationship("SimulationStep", backref="simulations")
-    artifacts = relationship("Artifact", backref="simulations")
+    # Downscaled variants of plots are reachable through their full resolution artifacts
+    artifacts = relationship("Artifact", primaryjoin="and_(Simulation.id == Artifact.simulation_id, "
+                                                     "Artifact.parent_id == None)", backref="simulations")
 
     def __json__(self):
-        return ['id', 'started_utc', 'status', 'finished_utc', 'current_step', 'current_step_id', 'steps']
+        return ['id', 'started_utc', 'status', 'finished_utc', 'current_step', 'current_step_id', 'sweep_id',
+                'config_hash', 'steps']
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, DateTime, String
+from sqlalchemy.orm import relationship
+
+from database import Base
+
+
+class Sweep(Base):
+    __tablename__ = 'sweeps'
+
+    id = Column(Integer, primary_key=True)
+    created_utc = Column(DateTime)
+    name = Column(String())
+    size = Column(Integer)
+    simulations = relationship("Simulation", backref="sweep")
+
+    def __json__(self):
+        return ['id', 'created_utc', 'name', 'size']
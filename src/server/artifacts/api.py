@@ -1,6 +1,6 @@
 import logging
 
-from flask import Blueprint, send_file, jsonify, make_response
+from flask import Blueprint, send_file, jsonify, make_response, request
 
 from database import db_session
 from models.artifact import Artifact
@@ -19,7 +19,14 @@ def get_info(artifact_id: int):
 
 @artifact_api.route('/<artifact_id>/download', methods=['GET'])
 def download(artifact_id: int):
+    """
+    Downloads artifact file. Plot images can be downloaded in lower resolution with
+    ?resolution=preview or ?resolution=thumbnail
+    """
     artifact: Artifact = db_session.query(Artifact).get(artifact_id)
+    resolution = request.args.get('resolution')
+    if artifact is not None and resolution is not None:
+        artifact = artifact.get_variant(resolution)
     print('Downloading...', artifact)
     response = make_response(send_file(artifact.path, as_attachment=True))
     response.headers["Content-Type"] = "application/pdf; charset=utf-8"
@@ -10,7 +10,9 @@ from server.artifacts.api import artifact_api
 from server.encoder import AlchemyEncoder
 from server.pipeline.analyzer import tasks as simbad_analyzer_task
 from server.pipeline.cli import tasks as simbad_cli_task
+from server.pipeline.lineage.api import lineage_api
 from server.pipeline.reports import tasks as simbad_reports_task
+from server.pipeline.reports import render_worker
 from server.pipeline.reports.api import reports_api
 from server.pipeline.simulation import tasks as simulation_tasks
 from server.pipeline.simulation.api import simulation_api
@@ -40,16 +42,20 @@ def entrypoint(debug=False, mode='app'):
     init_db()
 
     configure_logging(debug=debug)
+    # Fail on startup rather than when the first pipelined simulation runs
+    simbad_analyzer_task.check_pipelined_mode()
 
     configure_celery(app, simulation_tasks.celery)
     configure_celery(app, simbad_cli_task.celery)
     configure_celery(app, simbad_analyzer_task.celery)
     configure_celery(app, simbad_reports_task.celery)
+    render_worker.configure(simbad_reports_task.celery, simbad_reports_task.RENDER_TASK_NAMES)
 
     # register blueprints
     app.register_blueprint(simulation_api, url_prefix='/api/simulation')
     app.register_blueprint(artifact_api, url_prefix='/api/artifact')
     app.register_blueprint(reports_api, url_prefix='/api/reports')
+    app.register_blueprint(lineage_api, url_prefix='/api/lineage')
 
     if mode == 'app':
         mark_ongoing_as_failed()
@@ -105,7 +111,7 @@ def configure_logging(debug=True):
 def mark_ongoing_as_failed():
     """
     Marks all ongoing simulations and steps as failed. This method runs on app init
-    and any simulation that has status 'ONGOING' in db, is treated as failed
+    and any simulation that has status 'ONGOING' in db, is treated as failed, like steps 'ONGOING' or 'QUEUED'
     :return:
     """
     db_session.begin()
@@ -118,11 +124,12 @@ def mark_ongoing_as_failed():
     db_session.commit()
 
     db_session.begin()
-    db_session.query(SimulationStep).filter(SimulationStep.status == 'ONGOING').update(
+    db_session.query(SimulationStep).filter(SimulationStep.status.in_(['ONGOING', 'QUEUED'])).update(
         {
             SimulationStep.status: 'FAILURE',
             SimulationStep.finished_utc: datetime.datetime.utcnow()
-        }
+        },
+        synchronize_session=False
     )
     db_session.commit()
     return
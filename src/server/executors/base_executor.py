@@ -12,9 +12,15 @@ class BaseExecutor:
         self.result = None
         self.status = None
         self.log = None
+        # Optional ProgressReporter, executors push progress changes to it as they happen
+        self.reporter = None
 
     def execute(self, in_file: Artifact) -> None:
         pass
 
     def cleanup(self) -> None:
         pass
+
+    def report(self, **fields) -> None:
+        if self.reporter is not None:
+            self.reporter.update(**fields)
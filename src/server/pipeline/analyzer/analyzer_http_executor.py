@@ -7,11 +7,15 @@ import requests
 from models.analyzer_runtime_info import AnalyzerRuntimeInfo
 from models.artifact import Artifact
 from server.executors.http_executor import HttpExecutor
+from server.pipeline.cli.output_stream import SUCCESS_MARKER
 
 SIMBAD_ANALYZER_POLLING_PERIOD = 3
 
 
 class AnalyzerHttpExecutor(HttpExecutor):
+    # Whether the analyzer can read segments of simulator output while they are written, see SIMBAD_PIPELINED
+    supports_streaming = True
+
     def __init__(self, start_endpoint: str, status_endpoint: str, runtime_endpoint: str, result_endpoint: str):
         """
         Creates http executor for SIMBAD-ANALYZER
@@ -23,6 +27,8 @@ class AnalyzerHttpExecutor(HttpExecutor):
         self.status: AnalyzerRuntimeInfo = AnalyzerRuntimeInfo(progress=0, is_finished=False)
         self.result = None
         self.is_finished = False
+        # Input is a directory of segments still written by the simulation, complete when marker appears
+        self.streaming = False
 
     def execute(self, in_file: Artifact) -> None:
         """
@@ -30,7 +36,12 @@ class AnalyzerHttpExecutor(HttpExecutor):
         :param in_file: object representing output file of SIMBAD-CLI
         :return:
         """
-        data = json.dumps({"path": in_file.path})
+        data = json.dumps({
+            "path": in_file.path,
+            "format": in_file.file_type,
+            "streaming": self.streaming,
+            "completeMarker": SUCCESS_MARKER,
+        })
         response_status_code = requests.post(self.start_endpoint, data=data).status_code
 
         if response_status_code == 202:
@@ -64,6 +75,7 @@ class AnalyzerHttpExecutor(HttpExecutor):
                 progress=response["progress"],
                 error=response["error"]
             )
+            self.report(progress=self.status.progress, error=self.status.error)
             if self.status.is_finished or self.status.error is not None:
                 # Stop polling, do not set set status to finished yet
                 # Setting self.is_finished to true here might cause NoneType result
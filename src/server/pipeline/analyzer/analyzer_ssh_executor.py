@@ -7,6 +7,9 @@ SIMBAD_ANALYZER_POLLING_PERIOD = 60
 
 
 class AnalyzerSshExecutor(AnalyzerHttpExecutor):
+    # The analyzer runs on another host, and does not see segments written to the local workdir
+    supports_streaming = False
+
     def __init__(
             self,
             start_endpoint: str,
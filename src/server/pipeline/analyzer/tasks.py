@@ -2,7 +2,7 @@ import datetime
 import enum
 import logging
 import os
-from time import sleep
+from time import monotonic, sleep
 from typing import List
 
 from celery import Celery, shared_task
@@ -18,7 +18,9 @@ from server.artifacts.utils import path_leaf, file_extension
 from server.executors import BaseExecutor
 from server.pipeline.analyzer.analyzer_http_executor import AnalyzerHttpExecutor
 from server.pipeline.analyzer.analyzer_ssh_executor import AnalyzerSshExecutor
+from server.pipeline.cli.output_stream import FAILURE_MARKER, is_sealed, mark_segments, segments_dir
 from server.pipeline.util import revoke_chain_authority
+from server.pipeline.util.progress import ProgressReporter
 from server.pipeline.util.revoke_chain_authority import RevokeChainRequested
 
 logger = logging.getLogger()
@@ -70,12 +72,54 @@ def get_analyzer_executor():
     }.get(ExecutorType[settings.SIMBAD_ANALYZER_EXECUTOR])
 
 
+def check_pipelined_mode() -> None:
+    """
+    Checks whether the analyzer executor specified by SIMBAD_ANALYZER_EXECUTOR can run in pipelined mode
+    :raises ValueError: when SIMBAD_PIPELINED is set, but the executor does not support streaming input
+    :return:
+    """
+    executor_class = {
+        ExecutorType.HTTP: AnalyzerHttpExecutor,
+        ExecutorType.SSH: AnalyzerSshExecutor
+    }.get(ExecutorType[settings.SIMBAD_ANALYZER_EXECUTOR])
+    if settings.SIMBAD_PIPELINED and not executor_class.supports_streaming:
+        raise ValueError('SIMBAD_PIPELINED is not supported by {} analyzer executor'.format(
+            settings.SIMBAD_ANALYZER_EXECUTOR))
+
+
 @celery.task(bind=True, name='SIMBAD-ANALYZER')
 def analyzer_step(self, artifact_id: int) -> int:
     print('analyzer artifact id', artifact_id)
     cli_out: Artifact = db_session.query(Artifact).get(artifact_id)
     print('analyzer artifact id', cli_out.__dict__)
+    return run_analyzer(self, cli_out)
 
+
+@celery.task(bind=True, name='SIMBAD-ANALYZER-PIPELINED')
+def analyzer_pipelined_step(self, conf_id: int) -> int:
+    """
+    Starts analyzer on the directory of simulator output segments, concurrently with the cli step.
+    The analyzer consumes segments as they are sealed, and finishes after the _SUCCESS marker appears.
+    Sent by the cli step once the simulator is admitted, see cli.tasks.start_pipelined_analyzer
+    :param conf_id: the id of simulation configuration artifact
+    :return: the simulation id
+    """
+    conf: Artifact = db_session.query(Artifact).get(conf_id)
+    segments = segments_dir(conf.get_workdir())
+    os.makedirs(segments, exist_ok=True)
+    # Not persisted, cli step saves the cli_out artifact when simulation finishes
+    cli_out = Artifact(path=segments, file_type='PARQUET', simulation_id=conf.simulation_id)
+    return run_analyzer(self, cli_out, streaming=True)
+
+
+def run_analyzer(self, cli_out: Artifact, streaming: bool = False) -> int:
+    """
+    Runs analyzer on the cli output and saves its results
+    :param self: the analyzer task
+    :param cli_out: the cli output artifact
+    :param streaming: whether cli output is a directory of segments still written by the simulation
+    :return: the simulation id
+    """
     simulation: Simulation = db_session.query(Simulation).get(cli_out.simulation_id)
     start_time = datetime.datetime.utcnow()
     step: SimulationStep = SimulationStep(started_utc=start_time, origin="ANALYZER", simulation_id=simulation.id,
@@ -100,22 +144,39 @@ def analyzer_step(self, artifact_id: int) -> int:
     db_session.add(runtime_info)
     db_session.commit()
 
+    reporter = ProgressReporter(simulation.id, step.id, 'ANALYZER')
+    reporter.update(status='ONGOING')
     executor: BaseExecutor = get_analyzer_executor()
+    executor.streaming = streaming
+    executor.reporter = reporter
     print('Starting executor')
     executor.execute(cli_out)
     print('Starting polling..')
 
+    started = monotonic()
     while executor.is_finished is not True:
-        db_session.begin()
-        print('status', executor.status.__dict__)
-        runtime_info.progress = executor.status.progress
-        runtime_info.error = executor.status.error
-        db_session.commit()
+        if streaming and os.path.exists(os.path.join(cli_out.path, FAILURE_MARKER)):
+            executor.status.error = 'Simulation failed, analyzer input is incomplete'
+            break
+        if streaming and monotonic() - started > settings.SIMBAD_ANALYZER_PIPELINED_TIMEOUT:
+            # Simulator output stays incomplete, the marker tells the cli step not to seal it as success
+            if not is_sealed(cli_out.path):
+                mark_segments(cli_out.path, FAILURE_MARKER)
+            executor.status.error = 'Analyzer did not finish within {} seconds'.format(
+                settings.SIMBAD_ANALYZER_PIPELINED_TIMEOUT)
+            break
+        if reporter.persist_due():
+            db_session.begin()
+            print('status', executor.status.__dict__)
+            runtime_info.progress = executor.status.progress
+            runtime_info.error = executor.status.error
+            db_session.commit()
+            reporter.persisted()
         sleep(settings.SIMBAD_ANALYZER_POLLING_PERIOD)
 
     db_session.begin()
 
-    result: List[Artifact] = list(map(lambda path: Artifact(path=path), executor.result))
+    result: List[Artifact] = list(map(lambda path: Artifact(path=path), executor.result or []))
 
     for artifact in result:
         artifact.step_id = step.id
@@ -135,6 +196,7 @@ def analyzer_step(self, artifact_id: int) -> int:
         runtime_info.error = executor.status.error
         db_session.add_all(result)
         db_session.commit()
+        reporter.update(status='FAILURE', error=executor.status.error)
         sleep(settings.SIMBAD_ANALYZER_POLLING_PERIOD)
         raise RevokeChainRequested('Analyzer step failed')
 
@@ -143,5 +205,6 @@ def analyzer_step(self, artifact_id: int) -> int:
     runtime_info.progress = 100
     db_session.add_all(result)
     db_session.commit()
+    reporter.update(status='SUCCESS', progress=100)
 
     return simulation.id
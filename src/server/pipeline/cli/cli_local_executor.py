@@ -1,14 +1,16 @@
 import datetime
 import os
 import subprocess
-import sys
 import threading
+from typing import Callable
 
-import psutil
-
+from config.settings import SIMBAD_CLI_LOG_BUFFER_KB, SIMBAD_CLI_OUTPUT_FORMAT, SIMBAD_PIPELINED
 from models.artifact import Artifact
 from models.cli_runtime_info import CliRuntimeInfo
 from server.executors.local_executor import LocalExecutor
+from server.pipeline.cli.output_stream import FAILURE_MARKER, SUCCESS_MARKER, is_sealed, mark_segments, \
+    segments_dir, stream_csv_to_parquet, stream_csv_to_segments
+from server.pipeline.cli.runtime_sampler import RuntimeSampler, Sample
 
 
 class CliLocalExecutor(LocalExecutor):
@@ -23,6 +25,8 @@ class CliLocalExecutor(LocalExecutor):
         self.result = None
         self.is_finished = False
         self.log = None
+        self.profile = None
+        self.sampler = None
 
     def execute(self, in_file: Artifact) -> None:
         """
@@ -36,57 +40,127 @@ class CliLocalExecutor(LocalExecutor):
         return
 
     def update_progress(self, workdir, process: subprocess.Popen):
-        simulator_log = open(workdir + '/logs/simulator.log', "a")
-        process_info = psutil.Process(process.pid)
-        for line in iter(lambda: process.stderr.readline(), b''):
-            simulator_log.write(line.decode('utf-8'))
-            try:
-                curr, target = line.decode('utf8').split('/')
-
-                # TODO The CPU reading may show above 100% - find out if this can be adjusted
-                memory = process_info.memory_info().rss
-                cpu = process_info.cpu_percent()
-                self.status.memory = memory
-                self.status.cpu = cpu
-                self.status.progress = int(float(int(curr) / int(target)) * 100.0)
-            except ValueError:
-                print('Error in simulator: \n {}'.format(line))
-                self.status.error = 'Unexpected stderr output in simulator'
-                simulator_log.close()
-                return
-        simulator_log.close()
+        """
+        Streams simulator stderr to buffered simulator.log and updates progress from its lines. Stderr is read
+        to the end even after unexpected output, so the simulator never blocks on full pipe
+        """
+        with open(workdir + '/logs/simulator.log', "a", buffering=SIMBAD_CLI_LOG_BUFFER_KB * 1024) as simulator_log:
+            for raw_line in iter(lambda: process.stderr.readline(), b''):
+                line = raw_line.decode('utf8', errors='replace')
+                simulator_log.write(line)
+                try:
+                    curr, target = line.split('/')
+                    self.status.progress = int(float(int(curr) / int(target)) * 100.0)
+                    self.report(progress=self.status.progress)
+                except ValueError:
+                    print('Error in simulator: \n {}'.format(line))
+                    if self.status.error is None:
+                        self.status.error = 'Unexpected stderr output in simulator'
+                        self.report(error=self.status.error)
         return
 
+    def monitor(self, workdir, process: subprocess.Popen) -> None:
+        """
+        Samples process resources and streams its stderr until it finishes, nonzero exit code is an error
+        """
+        self.sampler = RuntimeSampler(process.pid, on_sample=self.update_usage)
+        self.sampler.start()
+        progress = threading.Thread(target=self.update_progress, args=[workdir, process])
+        progress.start()
+        progress.join()
+        return_code = process.wait()
+        self.sampler.stop()
+        if return_code != 0:
+            print('Simulator exited with code {}'.format(return_code))
+            self.status.error = 'Simulator exited with code {}'.format(return_code)
+            self.report(error=self.status.error)
+
+    def stream_output(self, stream: Callable[..., int], process: subprocess.Popen, parquet_path: str,
+                      csv_path: str = None) -> None:
+        """
+        Converts process stdout with given stream function, see output_stream
+        """
+        try:
+            rows = stream(process.stdout, parquet_path, csv_path)
+            print('Simulator output converted to parquet, rows: {}'.format(rows))
+        except Exception as e:
+            print('Error converting simulator output: \n {}'.format(e))
+            self.status.error = 'Could not convert simulator output to parquet'
+        finally:
+            process.stdout.close()
+
+    def update_usage(self, sample: Sample) -> None:
+        self.status.memory = sample.rss
+        self.status.cpu = sample.cpu
+        self.report(memory=sample.rss, cpu=int(sample.cpu))
+
     def run_cli(self, conf: Artifact) -> None:
+        """
+        Runs the simulator, errors of the background thread fail the step instead of leaving it unfinished
+        """
+        try:
+            self.run_simulator(conf)
+        except Exception as e:
+            print('Error running simulator: \n {}'.format(e))
+            self.status.error = 'Could not run simulator: {}'.format(e)
+            self.report(error=self.status.error)
+        finally:
+            self.is_finished = True
+
+    def run_simulator(self, conf: Artifact) -> None:
         self.status.step_id = conf.step_id
         workdir = conf.get_workdir()
         out_path = '{}/cli_out.csv'.format(workdir)
         conf_path = conf.path
 
-        with open(out_path, 'w') as f:
+        if SIMBAD_CLI_OUTPUT_FORMAT == 'CSV' and not SIMBAD_PIPELINED:
+            with open(out_path, 'w') as f:
+                """
+                Run SIMBAD-CLI binary with configuration as argument, and pipe stdout to cli_out.csv file
+                Runtime info is sampled with psutil at fixed interval, independently of progress lines.
+                """
+                cli_out = open(out_path, "a")
+                process = subprocess.Popen((self.executable_path, conf_path, out_path), stdout=cli_out,
+                                           stderr=subprocess.PIPE)
+                self.monitor(workdir, process)
+                cli_out.close()
+            result_path, file_type = out_path, 'CSV'
+        else:
             """
-            Run SIMBAD-CLI binary with configuration as argument, and pipe stdout to cli_out.csv file
-            Periodically update runtime info with psutil. 
+            Run SIMBAD-CLI binary and convert its stdout to cli_out.parquet while it runs, the analyzer
+            then reads columnar data instead of parsing the text again. In pipelined mode the output is
+            published as sealed segments, which the analyzer consumes while the simulation runs.
             """
-            cli_out = open(out_path, "a")
-            process = subprocess.Popen((self.executable_path, conf_path, out_path), stdout=cli_out,
+            if SIMBAD_PIPELINED:
+                result_path = segments_dir(workdir)
+                stream = stream_csv_to_segments
+            else:
+                result_path = '{}/cli_out.parquet'.format(workdir)
+                stream = stream_csv_to_parquet
+            file_type = 'PARQUET'
+            process = subprocess.Popen((self.executable_path, conf_path, out_path), stdout=subprocess.PIPE,
                                        stderr=subprocess.PIPE)
-
-            progress = threading.Thread(target=self.update_progress, args=[workdir, process])
-            progress.start()
-            progress.join()
-            cli_out.close()
+            output = threading.Thread(target=self.stream_output, args=[
+                stream, process, result_path, out_path if SIMBAD_CLI_OUTPUT_FORMAT == 'BOTH' else None
+            ])
+            output.start()
+            self.monitor(workdir, process)
+            output.join()
+            if SIMBAD_PIPELINED and not is_sealed(result_path):
+                # Segments are sealed only after the simulator exited, so a crash is never reported as success.
+                # They are already sealed as failed when the analyzer timed out
+                mark_segments(result_path, FAILURE_MARKER if self.status.error is not None else SUCCESS_MARKER)
 
         end_timestamp = datetime.datetime.utcnow()
 
         self.result = Artifact(
             created_utc=end_timestamp,
-            size_kb=os.path.getsize(out_path),
-            path=out_path,
+            size_kb=os.path.getsize(result_path) if os.path.exists(result_path) else 0,
+            path=result_path,
             name='cli_out',
             step_id=conf.step_id,
             simulation_id=conf.simulation_id,
-            file_type='CSV'
+            file_type=file_type
         )
         log_path = workdir + '/logs/simulator.log'
 
@@ -99,5 +173,14 @@ class CliLocalExecutor(LocalExecutor):
             simulation_id=conf.simulation_id,
             file_type='LOG'
         )
-        self.is_finished = True
+        profile_path = self.sampler.write_csv(workdir + '/logs/simulator_profile.csv')
+        self.profile = Artifact(
+            created_utc=end_timestamp,
+            size_kb=os.path.getsize(profile_path),
+            path=profile_path,
+            name='simulator_profile.csv',
+            step_id=conf.step_id,
+            simulation_id=conf.simulation_id,
+            file_type='CSV'
+        )
         return
@@ -0,0 +1,155 @@
+"""
+Streaming conversion of simulator stdout to parquet.
+
+Simulator output is parsed while the simulation runs, in chunks of rows read directly from the stdout
+pipe, and every chunk is appended to the parquet file as one row group. Only one chunk is held in memory
+at a time, and the pipe itself is bounded, so a slow writer throttles the simulator instead of growing
+buffers. Optionally the raw text is copied to csv file on the way through.
+
+In pipelined mode every chunk is published as a separate sealed segment file instead, and a marker file
+is created when the simulator exited, so the analyzer can consume segments during the simulation.
+"""
+import os
+from typing import BinaryIO, Iterator, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config.settings import SIMBAD_CLI_OUTPUT_DELIMITER, SIMBAD_CLI_PARQUET_ROW_GROUP_ROWS
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Segments of pipelined mode, the markers follow hadoop convention and are ignored by parquet readers
+SEGMENTS_DIR_NAME = 'cli_out_segments'
+SUCCESS_MARKER = '_SUCCESS'
+FAILURE_MARKER = '_FAILURE'
+
+
+class TeeReader:
+    """
+    File-like reader copying everything it reads to another file
+    """
+    def __init__(self, stream: BinaryIO, copy: Optional[BinaryIO]):
+        self.stream = stream
+        self.copy = copy
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        if self.copy is not None and data:
+            self.copy.write(data)
+        return data
+
+    def drain(self) -> None:
+        """
+        Reads the stream to the end, so the writing process never blocks on full pipe
+        """
+        while self.read(COPY_CHUNK_SIZE):
+            pass
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        line = self.stream.readline()
+        if not line:
+            raise StopIteration
+        if self.copy is not None:
+            self.copy.write(line)
+        return line
+
+
+def read_tables(reader: TeeReader, chunk_rows: int) -> Iterator[pa.Table]:
+    """
+    Parses csv from reader in chunks of rows. The schema is taken from the first chunk, and the following
+    chunks are cast to it.
+    """
+    schema = None
+    for chunk in pd.read_csv(reader, sep=SIMBAD_CLI_OUTPUT_DELIMITER, chunksize=chunk_rows):
+        table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+        schema = table.schema
+        yield table
+
+
+def stream_csv_to_parquet(stream: BinaryIO, parquet_path: str, csv_path: str = None,
+                          chunk_rows: int = None) -> int:
+    """
+    Parses csv from stream in chunks of rows and appends every chunk to parquet file as a row group.
+    If parsing fails, the rest of the stream is still read (and copied to csv_path), then the error is raised
+    :param stream: binary stream with csv text, ex. stdout pipe of the simulator
+    :param parquet_path: the output parquet file
+    :param csv_path: optional path for copy of the raw csv text
+    :param chunk_rows: rows per row group, defaults to SIMBAD_CLI_PARQUET_ROW_GROUP_ROWS
+    :return: number of written rows
+    """
+    chunk_rows = chunk_rows or SIMBAD_CLI_PARQUET_ROW_GROUP_ROWS
+    csv_copy = open(csv_path, 'wb') if csv_path is not None else None
+    reader = TeeReader(stream, csv_copy)
+    writer = None
+    rows = 0
+    try:
+        for table in read_tables(reader, chunk_rows):
+            if writer is None:
+                writer = pq.ParquetWriter(parquet_path, table.schema)
+            writer.write_table(table)
+            rows += table.num_rows
+    except Exception:
+        reader.drain()
+        raise
+    finally:
+        if writer is not None:
+            writer.close()
+        if csv_copy is not None:
+            csv_copy.close()
+    return rows
+
+
+def segments_dir(workdir: str) -> str:
+    return os.path.join(workdir, SEGMENTS_DIR_NAME)
+
+
+def segment_path(path: str, index: int) -> str:
+    return os.path.join(path, 'part-{:05d}.parquet'.format(index))
+
+
+def mark_segments(path: str, marker: str) -> None:
+    open(os.path.join(path, marker), 'w').close()
+
+
+def is_sealed(path: str) -> bool:
+    return os.path.exists(os.path.join(path, SUCCESS_MARKER)) or os.path.exists(os.path.join(path, FAILURE_MARKER))
+
+
+def stream_csv_to_segments(stream: BinaryIO, path: str, csv_path: str = None, chunk_rows: int = None) -> int:
+    """
+    Parses csv from stream in chunks of rows and publishes every chunk as separate sealed parquet segment,
+    so that the analyzer can consume them while the simulation runs. Segment is written under hidden
+    temporary name and renamed when complete, so readers never see partial files. FAILURE_MARKER file is
+    created in the directory if parsing failed. The end of stream does not mean the simulation succeeded,
+    so the SUCCESS_MARKER is created by the caller, once the simulator exited with zero code.
+    :param stream: binary stream with csv text, ex. stdout pipe of the simulator
+    :param path: the segments directory, ex. workdir/cli_out_segments
+    :param csv_path: optional path for copy of the raw csv text
+    :param chunk_rows: rows per segment, defaults to SIMBAD_CLI_PARQUET_ROW_GROUP_ROWS
+    :return: number of written rows
+    """
+    chunk_rows = chunk_rows or SIMBAD_CLI_PARQUET_ROW_GROUP_ROWS
+    os.makedirs(path, exist_ok=True)
+    csv_copy = open(csv_path, 'wb') if csv_path is not None else None
+    reader = TeeReader(stream, csv_copy)
+    rows = 0
+    try:
+        for index, table in enumerate(read_tables(reader, chunk_rows)):
+            final_path = segment_path(path, index)
+            tmp_path = os.path.join(path, '.' + os.path.basename(final_path) + '.tmp')
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, final_path)
+            rows += table.num_rows
+    except Exception:
+        mark_segments(path, FAILURE_MARKER)
+        reader.drain()
+        raise
+    finally:
+        if csv_copy is not None:
+            csv_copy.close()
+    return rows
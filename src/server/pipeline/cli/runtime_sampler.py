@@ -0,0 +1,127 @@
+"""
+Fixed interval resource sampler for the simulator process.
+
+Sampling runs in its own thread, independently of how often the simulator reports progress. Every
+sample records RSS, CPU usage of the process and all its threads and child processes, and I/O bytes.
+Samples are kept in a bounded ring buffer, so memory stays constant for long runs, and the whole
+series can be saved as a resource profile of the run.
+"""
+import csv
+import threading
+import time
+from collections import deque, namedtuple
+from typing import Callable, List, Optional
+
+import psutil
+
+from config.settings import SIMBAD_CLI_SAMPLING_INTERVAL, SIMBAD_CLI_MAX_SAMPLES
+
+Sample = namedtuple('Sample', ['timestamp', 'rss', 'cpu', 'read_bytes', 'write_bytes', 'threads'])
+
+
+class RuntimeSampler:
+    def __init__(self, pid: int, interval: float = None, max_samples: int = None,
+                 on_sample: Callable[[Sample], None] = None):
+        """
+        Creates sampler of process resources
+        :param pid: the process to sample
+        :param interval: seconds between samples, defaults to SIMBAD_CLI_SAMPLING_INTERVAL
+        :param max_samples: ring buffer capacity, defaults to SIMBAD_CLI_MAX_SAMPLES
+        :param on_sample: optional function called with every new sample, from the sampler thread
+        """
+        self.process = psutil.Process(pid)
+        self.on_sample = on_sample
+        self.interval = interval or SIMBAD_CLI_SAMPLING_INTERVAL
+        self.samples = deque(maxlen=max_samples or SIMBAD_CLI_MAX_SAMPLES)
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_cpu_time = None
+        self._last_timestamp = None
+
+    @property
+    def latest(self) -> Optional[Sample]:
+        return self.samples[-1] if self.samples else None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run(self) -> None:
+        try:
+            self.sample()
+            while not self._stop.wait(self.interval):
+                self.sample()
+        except (psutil.NoSuchProcess, psutil.ZombieProcess, psutil.AccessDenied):
+            # The process finished between samples
+            return
+
+    def processes(self) -> List[psutil.Process]:
+        try:
+            return [self.process] + self.process.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return [self.process]
+
+    def sample(self) -> None:
+        """
+        Records one sample. CPU is the percentage of one core used since the previous sample, so processes
+        with many busy threads report above 100%
+        """
+        rss = cpu_time = read_bytes = write_bytes = threads = 0
+        io_available = True
+        for process in self.processes():
+            try:
+                with process.oneshot():
+                    times = process.cpu_times()
+                    rss += process.memory_info().rss
+                    cpu_time += times.user + times.system
+                    if process is self.process:
+                        # Children that already finished and were waited for
+                        cpu_time += times.children_user + times.children_system
+                    threads += process.num_threads()
+                    if io_available:
+                        try:
+                            io = process.io_counters()
+                            read_bytes += io.read_bytes
+                            write_bytes += io.write_bytes
+                        except (AttributeError, psutil.AccessDenied):
+                            # io_counters is not available on every platform
+                            io_available = False
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                if process is self.process:
+                    raise
+
+        timestamp = time.time()
+        cpu = 0.0
+        if self._last_timestamp is not None and timestamp > self._last_timestamp:
+            cpu = max(cpu_time - self._last_cpu_time, 0.0) / (timestamp - self._last_timestamp) * 100.0
+        self._last_cpu_time, self._last_timestamp = cpu_time, timestamp
+
+        sample = Sample(
+            timestamp=timestamp,
+            rss=rss,
+            cpu=cpu,
+            read_bytes=read_bytes if io_available else None,
+            write_bytes=write_bytes if io_available else None,
+            threads=threads,
+        )
+        self.samples.append(sample)
+        if self.on_sample is not None:
+            self.on_sample(sample)
+
+    def write_csv(self, path: str) -> str:
+        """
+        Saves recorded samples as csv resource profile
+        :param path: the output path
+        :return: the output path
+        """
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f, delimiter=';')
+            writer.writerow(Sample._fields)
+            writer.writerows(list(self.samples))
+        return path
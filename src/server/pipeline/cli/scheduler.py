@@ -0,0 +1,212 @@
+"""
+Local scheduler of simulator runs with cpu and memory admission control.
+
+Every cli step, in any celery worker process on the host, requests admission of its run in a shared ledger
+file, and is retried until the run is admitted, so queued runs do not hold workers. A run is admitted when
+its footprint fits into the cpu and memory budgets left by the running simulations. Runs are considered in
+submission order, and smaller runs may start ahead of a waiting one only within the resources left after
+reserving the first waiting run, so large runs are never starved. The ledger is a json file guarded by
+flock. Entries are keyed by step id, so retries in any worker keep the place in queue. Running entries of
+worker processes that no longer exist are dropped, so crashed workers never hold budget, and queued entries
+that were not requested again for SIMBAD_SCHEDULER_QUEUED_TTL are dropped too.
+"""
+import fcntl
+import json
+import os
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from typing import Iterator
+
+import psutil
+
+from config.settings import SIMBAD_SCHEDULER_PATH, SIMBAD_SCHEDULER_CPU_BUDGET, SIMBAD_SCHEDULER_MEMORY_BUDGET_MB, \
+    SIMBAD_SCHEDULER_RUN_CPU, SIMBAD_SCHEDULER_RUN_MEMORY_MB, SIMBAD_SCHEDULER_QUEUED_TTL
+
+LEDGER_NAME = 'scheduler_ledger.json'
+LOCK_NAME = 'scheduler_ledger.lock'
+# Declared footprint of simulation, placed in workdir by setup_workdir
+RESOURCES_NAME = 'resources.json'
+
+Footprint = namedtuple('Footprint', ['cpu', 'memory_mb'])
+
+
+def default_memory_budget_mb() -> int:
+    return int(psutil.virtual_memory().total * 0.8 / (1024 * 1024))
+
+
+def run_footprint(workdir: str) -> Footprint:
+    """
+    Returns footprint declared for the simulation in workdir resources.json, like {"cpu": 2, "memoryMb": 4096},
+    missing values are estimated with SIMBAD_SCHEDULER_RUN_CPU and SIMBAD_SCHEDULER_RUN_MEMORY_MB
+    :param workdir: the simulation workdir
+    :return:
+    """
+    declared = {}
+    path = os.path.join(workdir, RESOURCES_NAME)
+    if os.path.exists(path):
+        with open(path) as f:
+            declared = json.load(f) or {}
+    return Footprint(
+        cpu=float(declared.get('cpu') or SIMBAD_SCHEDULER_RUN_CPU),
+        memory_mb=int(declared.get('memoryMb') or SIMBAD_SCHEDULER_RUN_MEMORY_MB)
+    )
+
+
+class LocalScheduler:
+    def __init__(self, path: str = None, cpu_budget: float = None, memory_budget_mb: int = None):
+        """
+        Creates scheduler sharing the ledger with every other scheduler using the same path
+        :param path: directory of the ledger, defaults to SIMBAD_SCHEDULER_PATH
+        :param cpu_budget: cores for all simulations, defaults to SIMBAD_SCHEDULER_CPU_BUDGET
+        :param memory_budget_mb: memory for all simulations, defaults to SIMBAD_SCHEDULER_MEMORY_BUDGET_MB,
+        or 80% of host memory
+        """
+        self.path = path or SIMBAD_SCHEDULER_PATH
+        self.cpu_budget = float(cpu_budget or SIMBAD_SCHEDULER_CPU_BUDGET)
+        self.memory_budget_mb = int(memory_budget_mb or SIMBAD_SCHEDULER_MEMORY_BUDGET_MB or
+                                    default_memory_budget_mb())
+
+    @contextmanager
+    def ledger(self) -> Iterator[dict]:
+        """
+        Locks the ledger and yields its content, changes are saved on exit
+        """
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, LOCK_NAME), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                ledger_path = os.path.join(self.path, LEDGER_NAME)
+                ledger = {'running': [], 'queued': []}
+                if os.path.exists(ledger_path):
+                    with open(ledger_path) as f:
+                        ledger = json.load(f)
+                self.prune(ledger)
+                yield ledger
+                tmp_path = ledger_path + '.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump(ledger, f)
+                os.replace(tmp_path, ledger_path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def read_ledger(self) -> dict:
+        """
+        Returns the ledger content under shared lock, without saving it
+        """
+        ledger_path = os.path.join(self.path, LEDGER_NAME)
+        if not os.path.exists(ledger_path):
+            return {'running': [], 'queued': []}
+        with open(os.path.join(self.path, LOCK_NAME), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            try:
+                with open(ledger_path) as f:
+                    return json.load(f)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def prune(ledger: dict) -> None:
+        now = time.time()
+        ledger['running'] = [entry for entry in ledger['running'] if psutil.pid_exists(entry['pid'])]
+        ledger['queued'] = [entry for entry in ledger['queued']
+                            if now - entry.get('seenAt', 0) <= SIMBAD_SCHEDULER_QUEUED_TTL]
+
+    def clamp(self, footprint: Footprint) -> Footprint:
+        """
+        Runs larger than the budget are clamped to it, so they can still run alone
+        """
+        return Footprint(min(footprint.cpu, self.cpu_budget), min(footprint.memory_mb, self.memory_budget_mb))
+
+    def add_queued(self, ledger: dict, run_id: str, footprint: Footprint) -> None:
+        """
+        Appends the run to the queue of ledger, unless it is already queued or running
+        """
+        if any(entry['id'] == run_id for state in ('running', 'queued') for entry in ledger[state]):
+            return
+        footprint = self.clamp(footprint)
+        now = time.time()
+        ledger['queued'].append({
+            'id': run_id,
+            'cpu': footprint.cpu,
+            'memoryMb': footprint.memory_mb,
+            'queuedAt': now,
+            'seenAt': now
+        })
+
+    def admit_queued(self, ledger: dict, run_id: str) -> bool:
+        """
+        Moves the run from queue to running of ledger, if it can start now. The running entry belongs to the
+        current process
+        """
+        if any(entry['id'] == run_id for entry in ledger['running']):
+            return True
+        cpu = self.cpu_budget - sum(entry['cpu'] for entry in ledger['running'])
+        memory = self.memory_budget_mb - sum(entry['memoryMb'] for entry in ledger['running'])
+        reserved = False
+        for entry in ledger['queued']:
+            fits = entry['cpu'] <= cpu and entry['memoryMb'] <= memory
+            if entry['id'] == run_id:
+                entry['seenAt'] = time.time()
+                if fits:
+                    ledger['queued'].remove(entry)
+                    entry['pid'] = os.getpid()
+                    entry['startedAt'] = time.time()
+                    ledger['running'].append(entry)
+                return fits
+            if fits or not reserved:
+                # Resources of the first waiting run are reserved for it
+                reserved = reserved or not fits
+                cpu -= entry['cpu']
+                memory -= entry['memoryMb']
+        raise KeyError('Run {} is not in scheduler queue'.format(run_id))
+
+    def enqueue(self, run_id: str, footprint: Footprint) -> None:
+        with self.ledger() as ledger:
+            self.add_queued(ledger, run_id, footprint)
+
+    def try_admit(self, run_id: str) -> bool:
+        """
+        Moves the run from queue to running, if it can start now
+        :param run_id: id of enqueued run
+        :return: whether the run was admitted
+        """
+        with self.ledger() as ledger:
+            return self.admit_queued(ledger, run_id)
+
+    def request(self, run_id: str, footprint: Footprint) -> bool:
+        """
+        Enqueues the run, unless it is already queued, and admits it if it can start now. Callers that are
+        refused request again later, ex. by retrying the task, and keep their place in queue
+        :param run_id: unique id of the run, ex. step id
+        :param footprint: declared or estimated resources of the run
+        :return: whether the run was admitted, it must be released when it finishes
+        """
+        with self.ledger() as ledger:
+            self.add_queued(ledger, run_id, footprint)
+            return self.admit_queued(ledger, run_id)
+
+    def release(self, run_id: str) -> None:
+        with self.ledger() as ledger:
+            for state in ('running', 'queued'):
+                ledger[state] = [entry for entry in ledger[state] if entry['id'] != run_id]
+
+    def state(self) -> dict:
+        """
+        Returns budgets, usage and entries of running and queued runs. The ledger is only read, stale entries
+        are left out but removed by the next admission
+        """
+        ledger = self.read_ledger()
+        self.prune(ledger)
+        return {
+            'cpuBudget': self.cpu_budget,
+            'memoryBudgetMb': self.memory_budget_mb,
+            'cpuUsed': sum(entry['cpu'] for entry in ledger['running']),
+            'memoryUsedMb': sum(entry['memoryMb'] for entry in ledger['running']),
+            'running': ledger['running'],
+            'queued': ledger['queued']
+        }
+
+
+def get_scheduler() -> LocalScheduler:
+    return LocalScheduler()
@@ -1,18 +1,25 @@
 import datetime
 import enum
 import logging
+import os
 
-from celery import Celery
+from celery import Celery, chain
 from time import sleep
 
-from config.settings import SIMBAD_CLI_BINARY_PATH, SIMBAD_CLI_EXECUTOR, POLLING_PERIOD
+from config.settings import SIMBAD_CLI_BINARY_PATH, SIMBAD_CLI_EXECUTOR, SIMBAD_PIPELINED, POLLING_PERIOD, \
+    SIMBAD_SCHEDULER_POLLING_PERIOD
 from database import db_session
 from models.simulation import Simulation
 from models.simulation_step import SimulationStep
 from models.cli_runtime_info import CliRuntimeInfo
 from models.artifact import Artifact
 from server.executors import BaseExecutor
+from server.pipeline.analyzer.tasks import analyzer_pipelined_step
 from server.pipeline.cli.cli_local_executor import CliLocalExecutor
+from server.pipeline.cli.output_stream import FAILURE_MARKER, is_sealed, mark_segments, segments_dir
+from server.pipeline.cli.scheduler import get_scheduler, run_footprint
+from server.pipeline.reports.tasks import reports_step
+from server.pipeline.util.progress import ProgressReporter
 
 logger = logging.getLogger()
 celery = Celery(__name__, autofinalize=False)
@@ -40,6 +47,17 @@ def get_cli_executor():
     }.get(ExecutorType[SIMBAD_CLI_EXECUTOR])
 
 
+def start_pipelined_analyzer(conf: Artifact) -> None:
+    """
+    Sends the pipelined analyzer, and reports after it. Sent only when the simulator is admitted, so analyzers
+    never hold workers waiting for output of simulations that did not start
+    :param conf: the simulation configuration artifact
+    :return:
+    """
+    os.makedirs(segments_dir(conf.get_workdir()), exist_ok=True)
+    chain(analyzer_pipelined_step.si(conf.id), reports_step.si(conf.simulation_id)).apply_async()
+
+
 @celery.task(bind=True, name='SIMBAD-CLI')
 def cli_step(self, artifact_id: int) -> int:
     """
@@ -51,6 +69,10 @@ def cli_step(self, artifact_id: int) -> int:
     see:
         - https://stackoverflow.com/questions/21631878/celery-is-there-a-way-to-write-custom-json-encoder-decoder
 
+    The simulator starts when the local scheduler admits the run. Until then the step has status QUEUED, and
+    the task is retried every SIMBAD_SCHEDULER_POLLING_PERIOD, so queued runs do not hold workers.
+    In pipelined mode the analyzer is started when the run is admitted, see start_pipelined_analyzer.
+
     :param artifact_id:
     :param self:
     :return: the id of created cli artifact
@@ -58,51 +80,85 @@ def cli_step(self, artifact_id: int) -> int:
     conf: Artifact = db_session.query(Artifact).get(artifact_id)
     step: SimulationStep = db_session.query(SimulationStep).get(conf.step_id)
     simulation: Simulation = db_session.query(Simulation).get(conf.simulation_id)
-    step.celery_id = self.request.id
-    step.status = 'ONGOING'
-    db_session.begin()
-    runtime_info: CliRuntimeInfo = CliRuntimeInfo(
-        memory=0,
-        cpu=0,
-        step_id=step.id
-    )
-    db_session.add(runtime_info)
-    db_session.commit()
-
-    executor: BaseExecutor = get_cli_executor()
-    executor.execute(conf)
-
-    while executor.is_finished is not True:
-        # Setting runtime_info like: runtime_info = executor.status seems to cause executor info not updating in
-        # SimulationStep, when querying @simulation_api.route('/step/<step_id>') endpoint
-        # TODO - find out whether step id is assigned incorrectly to configuration Artifact, or assigning another
-        #  sqlalchemy object to runtime_info overrides some internal property that should not be overridden
-        #  (ex. _sa_instance_state)
+    reporter = ProgressReporter(simulation.id, step.id, 'CLI')
+
+    # The run is released when the simulator finishes, runs that do not fit into host budget wait in queue
+    scheduler = get_scheduler()
+    run_id = str(step.id)
+    if not scheduler.request(run_id, run_footprint(conf.get_workdir())):
+        if step.status != 'QUEUED':
+            db_session.begin()
+            step.celery_id = self.request.id
+            step.status = 'QUEUED'
+            db_session.commit()
+            reporter.update(status='QUEUED')
+        raise self.retry(countdown=SIMBAD_SCHEDULER_POLLING_PERIOD, max_retries=None)
+
+    try:
+        step.celery_id = self.request.id
+        step.status = 'ONGOING'
+        db_session.begin()
+        runtime_info: CliRuntimeInfo = CliRuntimeInfo(
+            memory=0,
+            cpu=0,
+            step_id=step.id
+        )
+        db_session.add(runtime_info)
+        db_session.commit()
+        reporter.update(status='ONGOING')
+        if SIMBAD_PIPELINED:
+            start_pipelined_analyzer(conf)
+
+        executor: BaseExecutor = get_cli_executor()
+        executor.reporter = reporter
+        executor.execute(conf)
+
+        while executor.is_finished is not True:
+            # Progress is pushed to clients by the executor, runtime info is written only when the reporter
+            # says it is due, see util.progress
+            if reporter.persist_due():
+                # Setting runtime_info like: runtime_info = executor.status seems to cause executor info not
+                # updating in SimulationStep, when querying @simulation_api.route('/step/<step_id>') endpoint
+                # TODO - find out whether step id is assigned incorrectly to configuration Artifact, or assigning
+                #  another sqlalchemy object to runtime_info overrides some internal property that should not be
+                #  overridden (ex. _sa_instance_state)
+                db_session.begin()
+                runtime_info.cpu = executor.status.cpu
+                runtime_info.memory = executor.status.memory
+                runtime_info.progress = executor.status.progress
+                db_session.commit()
+                reporter.persisted()
+            sleep(POLLING_PERIOD)
+
         db_session.begin()
-        runtime_info.cpu = executor.status.cpu
-        runtime_info.memory = executor.status.memory
-        runtime_info.progress = executor.status.progress
+        result: Artifact = executor.result
+        log: Artifact = executor.log
+        if executor.status.error is not None:
+            step.status = 'FAILURE'
+            simulation.status = 'FAILURE'
+            simulation.finished_utc = datetime.datetime.utcnow()
+            step.finished_utc = datetime.datetime.utcnow()
+        else:
+            step.status = 'SUCCESS'
+            step.finished_utc = datetime.datetime.utcnow()
+
+        runtime_info.memory = 0
+        runtime_info.cpu = 0
+        runtime_info.progress = 100
+        # Artifacts are missing when the simulator could not run at all
+        for artifact in [result, log, executor.profile]:
+            if artifact is not None:
+                artifact.simulation_id = step.simulation_id
+                db_session.add(artifact)
         db_session.commit()
-        sleep(POLLING_PERIOD)
-
-    db_session.begin()
-    result: Artifact = executor.result
-    log: Artifact = executor.log
-    if executor.status.error is not None:
-        step.status = 'FAILURE'
-        simulation.status = 'FAILURE'
-        simulation.finished_utc = datetime.datetime.utcnow()
-        step.finished_utc = datetime.datetime.utcnow()
-    else:
-        step.status = 'SUCCESS'
-        step.finished_utc = datetime.datetime.utcnow()
-
-    result.simulation_id = step.simulation_id
-    log.simulation_id = step.simulation_id
-    runtime_info.memory = 0
-    runtime_info.cpu = 0
-    runtime_info.progress = 100
-    db_session.add_all([result, log])
-    db_session.commit()
-
-    return result.id
+        reporter.update(status=step.status, progress=100, cpu=0, memory=0, error=executor.status.error)
+
+        return result.id if result is not None else None
+    finally:
+        scheduler.release(run_id)
+        if SIMBAD_PIPELINED:
+            # The pipelined analyzer waits for a marker, it must be written however the step ends
+            segments = segments_dir(conf.get_workdir())
+            if not is_sealed(segments):
+                os.makedirs(segments, exist_ok=True)
+                mark_segments(segments, FAILURE_MARKER)
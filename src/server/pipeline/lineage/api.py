@@ -0,0 +1,50 @@
+from flask import Blueprint, jsonify, request
+
+from database import db_session
+from models.simulation import Simulation
+from server.pipeline.lineage.index import LineageIndex, index_path, load_index
+
+lineage_api = Blueprint('lineage_api', __name__)
+
+
+def get_index(simulation_id) -> LineageIndex:
+    simulation = db_session.query(Simulation).get(simulation_id)
+    if simulation is None or simulation.workdir is None:
+        return None
+    try:
+        return load_index(index_path(simulation.workdir))
+    except FileNotFoundError:
+        return None
+
+
+def query(simulation_id, fn):
+    index = get_index(simulation_id)
+    if index is None:
+        return jsonify({"error": "Lineage index not found"}), 404
+    try:
+        return jsonify(fn(index))
+    except KeyError as e:
+        # The missing mutation id, is-ancestor queries look up two mutations
+        return jsonify({"error": "Mutation {} not found".format(e.args[0])}), 404
+
+
+@lineage_api.route('/<simulation_id>/mutation/<int:mutation_id>')
+def mutation_subtree(simulation_id, mutation_id: int):
+    return query(simulation_id, lambda index: index.subtree(mutation_id))
+
+
+@lineage_api.route('/<simulation_id>/mutation/<int:mutation_id>/descendants')
+def mutation_descendants(simulation_id, mutation_id: int):
+    offset = request.args.get('offset', default=0, type=int)
+    limit = request.args.get('limit', default=1000, type=int)
+    return query(simulation_id, lambda index: index.descendants(mutation_id, offset, limit))
+
+
+@lineage_api.route('/<simulation_id>/mutation/<int:mutation_id>/lineage')
+def mutation_lineage(simulation_id, mutation_id: int):
+    return query(simulation_id, lambda index: index.lineage(mutation_id))
+
+
+@lineage_api.route('/<simulation_id>/mutation/<int:ancestor_id>/is-ancestor/<int:mutation_id>')
+def mutation_is_ancestor(simulation_id, ancestor_id: int, mutation_id: int):
+    return query(simulation_id, lambda index: index.is_ancestor(ancestor_id, mutation_id))
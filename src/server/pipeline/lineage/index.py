@@ -0,0 +1,206 @@
+"""
+Interval encoding of the mutation tree, built once per simulation from large_final_mutations.parquet.
+
+Mutations are stored in preorder of the tree (children ordered by mutationId), so the subtree of every
+mutation is the contiguous range [position, position + size) - descendants are a slice, and "is A an
+ancestor of B" is a range check. Prefix sums of typeCount in preorder give the number of cells in any
+subtree with two lookups. Mutation ids are mapped to positions with binary search over sorted ids.
+
+The index is a single .npz file in the simulation workdir, so it outlives the cleanup of analyzer outputs.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+import pyarrow.parquet as pq
+
+from server.pipeline.util.arrow import column_values, list_parents
+
+INDEX_NAME = 'lineage_index.npz'
+MAX_LOADED_INDEXES = 4
+
+_lock = threading.Lock()
+_loaded: 'OrderedDict[tuple, LineageIndex]' = OrderedDict()
+
+
+def index_path(workdir: str) -> str:
+    return os.path.join(workdir, INDEX_NAME)
+
+
+def children_of(nodes: np.ndarray, child_order: np.ndarray, starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    Returns children of all nodes, grouped by parent in order of nodes
+    """
+    node_counts = counts[nodes]
+    total = node_counts.sum()
+    group_offsets = np.cumsum(node_counts) - node_counts
+    return child_order[np.repeat(starts[nodes] - group_offsets, node_counts) + np.arange(total)]
+
+
+def build_lineage_index(mutations_path: str, output_path: str) -> str:
+    """
+    Builds lineage index of mutations
+    :param mutations_path: path to large_final_mutations.parquet
+    :param output_path: path to output .npz file
+    :return: output_path
+    """
+    table = pq.read_table(mutations_path, columns=['mutationId', 'ancestors', 'typeCount', 'mutationCount'],
+                          memory_map=True)
+    mutation_ids = column_values(table, 'mutationId').astype(np.int64)
+    by_id = np.argsort(mutation_ids, kind='mergesort')
+    mutation_ids = mutation_ids[by_id]
+    parent_ids = list_parents(table.column('ancestors'))[0][by_id]
+    type_count = column_values(table, 'typeCount')[by_id].astype(np.int64)
+    mutation_count = column_values(table, 'mutationCount')[by_id].astype(np.int64)
+    n = mutation_ids.shape[0]
+
+    # Parent row, mutations whose parent is not in the table become roots
+    parent = np.minimum(np.searchsorted(mutation_ids, parent_ids), max(n - 1, 0))
+    parent = np.where((parent_ids >= 0) & (mutation_ids[parent] == parent_ids), parent, -1)
+
+    # Children of every row, ordered by mutationId
+    has_parent = np.flatnonzero(parent >= 0)
+    child_order = has_parent[np.argsort(parent[has_parent], kind='mergesort')]
+    counts = np.bincount(parent[has_parent], minlength=n)
+    starts = np.cumsum(counts) - counts
+
+    roots = np.flatnonzero(parent < 0)
+    levels: List[np.ndarray] = [roots]
+    while levels[-1].shape[0]:
+        levels.append(children_of(levels[-1], child_order, starts, counts))
+    levels.pop()
+    if sum(level.shape[0] for level in levels) != n:
+        raise ValueError('Mutation ancestors do not form a tree: {}'.format(mutations_path))
+
+    depth = np.empty(n, dtype=np.int32)
+    for level_depth, level in enumerate(levels):
+        depth[level] = level_depth
+
+    size = np.ones(n, dtype=np.int64)
+    for level in reversed(levels[1:]):
+        size += np.bincount(parent[level], weights=size[level], minlength=n).astype(np.int64)
+
+    # Preorder position: parent position + 1 + sizes of preceding siblings
+    position = np.empty(n, dtype=np.int64)
+    position[roots] = np.cumsum(size[roots]) - size[roots]
+    for level in levels[1:]:
+        level_parent = parent[level]
+        preceding = np.cumsum(size[level]) - size[level]
+        # level is grouped by parent, remove sizes of children of previous parents
+        group_start = np.r_[True, level_parent[1:] != level_parent[:-1]]
+        group_base = np.maximum.accumulate(np.where(group_start, preceding, 0))
+        position[level] = position[level_parent] + 1 + preceding - group_base
+
+    preorder = np.empty(n, dtype=np.int64)
+    preorder[position] = np.arange(n)
+
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f,
+            sorted_ids=mutation_ids,
+            sorted_position=position,
+            mutation_id=mutation_ids[preorder],
+            parent=np.where(parent[preorder] >= 0, position[parent[preorder]], -1),
+            size=size[preorder],
+            depth=depth[preorder],
+            mutation_count=mutation_count[preorder],
+            type_count_prefix=np.r_[0, np.cumsum(type_count[preorder])],
+        )
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+class LineageIndex:
+    def __init__(self, arrays):
+        self.sorted_ids: np.ndarray = arrays['sorted_ids']
+        self.sorted_position: np.ndarray = arrays['sorted_position']
+        self.mutation_id: np.ndarray = arrays['mutation_id']
+        self.parent: np.ndarray = arrays['parent']
+        self.size: np.ndarray = arrays['size']
+        self.depth: np.ndarray = arrays['depth']
+        self.mutation_count: np.ndarray = arrays['mutation_count']
+        self.type_count_prefix: np.ndarray = arrays['type_count_prefix']
+
+    def position(self, mutation_id: int) -> int:
+        """
+        Returns preorder position of mutation
+        :raises KeyError: when mutation is not in the index
+        """
+        idx = int(np.searchsorted(self.sorted_ids, mutation_id))
+        if idx == self.sorted_ids.shape[0] or self.sorted_ids[idx] != mutation_id:
+            raise KeyError(mutation_id)
+        return int(self.sorted_position[idx])
+
+    def subtree(self, mutation_id: int) -> dict:
+        """
+        Returns summary of mutation subtree, cells is the sum of typeCount over the mutation and its descendants
+        """
+        pos = self.position(mutation_id)
+        end = pos + int(self.size[pos])
+        return {
+            'mutationId': int(mutation_id),
+            'parentId': int(self.mutation_id[self.parent[pos]]) if self.parent[pos] >= 0 else None,
+            'depth': int(self.depth[pos]),
+            'mutationCount': int(self.mutation_count[pos]),
+            'descendants': end - pos - 1,
+            'cells': int(self.type_count_prefix[end] - self.type_count_prefix[pos]),
+        }
+
+    def descendants(self, mutation_id: int, offset: int = 0, limit: int = None) -> List[int]:
+        """
+        Returns ids of descendants of the mutation in preorder
+        :param mutation_id:
+        :param offset: number of descendants to skip
+        :param limit: maximum number of returned ids
+        :return:
+        """
+        pos = self.position(mutation_id)
+        start = pos + 1 + max(offset, 0)
+        end = pos + int(self.size[pos])
+        if limit is not None:
+            end = min(end, start + max(limit, 0))
+        return self.mutation_id[start:end].tolist()
+
+    def lineage(self, mutation_id: int) -> List[int]:
+        """
+        Returns ids of mutations from the root to the mutation, inclusive
+        """
+        pos = self.position(mutation_id)
+        path = np.empty(int(self.depth[pos]) + 1, dtype=np.int64)
+        for idx in range(path.shape[0] - 1, -1, -1):
+            path[idx] = pos
+            pos = self.parent[pos]
+        return self.mutation_id[path].tolist()
+
+    def is_ancestor(self, ancestor_id: int, mutation_id: int) -> bool:
+        ancestor = self.position(ancestor_id)
+        pos = self.position(mutation_id)
+        return ancestor <= pos < ancestor + int(self.size[ancestor])
+
+
+def load_index(path: str) -> LineageIndex:
+    """
+    Returns lineage index stored in path, loaded once per process while the file does not change
+    :param path: path to .npz file
+    :return:
+    """
+    key = (os.path.abspath(path), os.path.getmtime(path))
+    with _lock:
+        index = _loaded.get(key)
+        if index is not None:
+            _loaded.move_to_end(key)
+            return index
+
+    with np.load(path) as arrays:
+        index = LineageIndex(arrays)
+
+    with _lock:
+        for stale in [k for k in _loaded if k[0] == key[0] and k != key]:
+            del _loaded[stale]
+        _loaded[key] = index
+        while len(_loaded) > MAX_LOADED_INDEXES:
+            _loaded.popitem(last=False)
+    return index
@@ -4,7 +4,7 @@ from database import db_session
 from models.simulation import Simulation
 from models.simulation_step import SimulationStep
 from models.artifact import Artifact
-from server.pipeline.reports.tasks import reports_step, build_cell_model
+from server.pipeline.reports.tasks import reports_step, build_cell_model, build_preview_model
 
 reports_api = Blueprint('reports_api', __name__)
 
@@ -13,7 +13,8 @@ reports_api = Blueprint('reports_api', __name__)
 def generate_reports():
     simulation = db_session.query(Simulation).order_by(Simulation.id.desc()).first()
     if simulation is not None:
-        reports_step.delay(simulation.id)
+        force = request.args.get('force', default='false').lower() == 'true'
+        reports_step.delay(simulation.id, force)
         return "OK"
     return "FAILED"
 
@@ -25,3 +26,12 @@ def generate_model():
         build_cell_model.delay(simulation.workdir)
         return "OK"
     return "FAILED"
+
+
+@reports_api.route('/model/preview', methods=['GET'])
+def generate_preview_model():
+    simulation = db_session.query(Simulation).order_by(Simulation.id.desc()).first()
+    if simulation is not None:
+        build_preview_model.delay(simulation.workdir)
+        return "OK"
+    return "FAILED"
@@ -0,0 +1,120 @@
+"""
+Lookup table colormaps shared by point cloud models and plots.
+
+Every colormap is sampled once into a table of N colors (plus a last entry for NaN values), and values
+are colored by a single vectorized index into the table. Indexing follows matplotlib - normalized value x
+maps to color int(x * N), clipped to the table - so colors are the same as from Colormap(Normalize(...)),
+without the intermediate Nx4 float64 array. Integer colors are written into caller provided buffers,
+so point cloud chunks can reuse them.
+"""
+import threading
+import weakref
+from typing import Dict, Tuple, Union
+
+import matplotlib
+import numpy as np
+from matplotlib.colors import Colormap
+
+DEFAULT_LUT_SIZE = 256
+
+_lock = threading.Lock()
+# Tables of named colormaps are keyed on the name, and of Colormap objects on the object id - colormaps are not
+# hashable, so their entries are removed when the object is collected, before its id can be reused
+_luts: Dict[Tuple[Union[str, int], int, int], np.ndarray] = {}
+
+
+def get_colormap(cmap) -> Colormap:
+    return cmap if isinstance(cmap, Colormap) else matplotlib.colormaps[cmap]
+
+
+def sample_colormap(cmap, n: int) -> np.ndarray:
+    """
+    Returns n x 4 colors of colormap, like colors of the colormap resampled to n entries
+    """
+    if isinstance(cmap, Colormap):
+        if cmap.N == n:
+            return cmap(np.arange(n))
+        return cmap((np.arange(n) + 0.5) / n)
+    return matplotlib.colormaps[cmap].resampled(n)(np.arange(n))
+
+
+def lut(cmap, n: int = None, scale: int = None) -> np.ndarray:
+    """
+    Returns (n + 1) x 4 lookup table of colormap colors, the last row is the color for NaN values
+    :param cmap: colormap name or matplotlib Colormap
+    :param n: number of colors, the colormap size by default
+    :param scale: integer colors are truncated from color * scale to uint16, float colors in 0.0-1.0 if None
+    :return:
+    """
+    if n is None:
+        n = get_colormap(cmap).N
+    key = (id(cmap) if isinstance(cmap, Colormap) else cmap, n, scale or 0)
+    with _lock:
+        table = _luts.get(key)
+    if table is not None:
+        return table
+
+    table = np.empty((n + 1, 4), dtype=np.float64)
+    table[:n] = sample_colormap(cmap, n)
+    table[n] = get_colormap(cmap).get_bad()
+    if scale:
+        table = (table * scale).astype(np.uint16)
+    table.setflags(write=False)
+    with _lock:
+        if isinstance(cmap, Colormap) and key not in _luts:
+            weakref.finalize(cmap, forget_lut, key)
+        _luts[key] = table
+    return table
+
+
+def forget_lut(key: Tuple[Union[str, int], int, int]) -> None:
+    with _lock:
+        _luts.pop(key, None)
+
+
+def lut_indices(values: np.ndarray, vmin: float, vmax: float, n: int) -> np.ndarray:
+    """
+    Returns lookup table rows for values normalized from [vmin, vmax], NaN values map to the last row
+    """
+    values = np.asarray(values)
+    span = float(vmax) - float(vmin)
+    if span > 0:
+        x = (values - vmin) / span * n
+    else:
+        x = np.zeros(values.shape, dtype=np.float64)
+    nan = np.isnan(x)
+    indices = np.clip(np.nan_to_num(x), 0, n - 1).astype(np.intp)
+    indices[nan] = n
+    return indices
+
+
+def to_rgba(values: np.ndarray, cmap, vmin: float = None, vmax: float = None) -> np.ndarray:
+    """
+    Maps values to RGBA colors in 0.0-1.0 range, like cmap(Normalize(vmin, vmax)(values))
+    :param values:
+    :param cmap: colormap name or matplotlib Colormap
+    :param vmin: value of the first color, values minimum by default
+    :param vmax: value of the last color, values maximum by default
+    :return: len(values) x 4 float array
+    """
+    table = lut(cmap)
+    vmin = np.nanmin(values) if vmin is None else vmin
+    vmax = np.nanmax(values) if vmax is None else vmax
+    return table[lut_indices(values, vmin, vmax, table.shape[0] - 1)]
+
+
+def to_rgb16(values: np.ndarray, cmap, vmin: float, vmax: float, n: int = DEFAULT_LUT_SIZE, scale: int = 255,
+             out: np.ndarray = None) -> np.ndarray:
+    """
+    Maps values to integer RGB colors
+    :param values:
+    :param cmap: colormap name or matplotlib Colormap
+    :param vmin: value of the first color
+    :param vmax: value of the last color
+    :param n: number of colors in lookup table, ex. 256 or 65536
+    :param scale: maximum channel value, colors are truncated to integers like int(color * scale)
+    :param out: optional len(values) x 3 uint16 buffer for the result
+    :return: len(values) x 3 uint16 array
+    """
+    table = lut(cmap, n, scale)[:, :3]
+    return np.take(table, lut_indices(values, vmin, vmax, n), axis=0, out=out)
@@ -0,0 +1,111 @@
+"""
+Report-stage access layer for analyzer outputs.
+
+Within one reports step the same parquet inputs (time_points, *_stats_scalars...) are read by
+plot_stats, by every mullerplot histogram task and by muller_plots. Tables are memory mapped and
+decoded once per worker process, kept in a size bounded LRU keyed by (path, mtime), and handed out
+as arrow tables, numpy column views or fresh pandas frames.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config.settings import REPORTS_DATA_CACHE_SIZE_MB
+
+_lock = threading.Lock()
+_tables: 'OrderedDict[Tuple[str, float], pa.Table]' = OrderedDict()
+_cached_bytes = 0
+
+
+def modification_time(path: str) -> float:
+    """
+    Returns modification time of parquet file, or the latest modification time of files in
+    parquet dataset directory
+    :param path: path to parquet file or dataset directory
+    :return:
+    """
+    if not os.path.isdir(path):
+        return os.path.getmtime(path)
+    latest = os.path.getmtime(path)
+    for root, _, files in os.walk(path):
+        for name in files:
+            latest = max(latest, os.path.getmtime(os.path.join(root, name)))
+    return latest
+
+
+def _evict(max_bytes: int) -> None:
+    global _cached_bytes
+    while _tables and _cached_bytes > max_bytes:
+        _, table = _tables.popitem(last=False)
+        _cached_bytes -= table.nbytes
+
+
+def read_table(path: str) -> pa.Table:
+    """
+    Returns arrow table for parquet file, reading it from disk only if it is not cached yet
+    or was modified since it was cached
+    :param path: path to parquet file or dataset directory
+    :return:
+    """
+    global _cached_bytes
+    key = (os.path.abspath(path), modification_time(path))
+    max_bytes = REPORTS_DATA_CACHE_SIZE_MB * 1024 * 1024
+
+    with _lock:
+        table = _tables.get(key)
+        if table is not None:
+            _tables.move_to_end(key)
+            return table
+
+    table = pq.read_table(path, memory_map=True)
+
+    with _lock:
+        # Drop entries for older versions of the same file
+        for stale in [k for k in _tables if k[0] == key[0] and k != key]:
+            _cached_bytes -= _tables.pop(stale).nbytes
+        if key not in _tables and table.nbytes <= max_bytes:
+            _tables[key] = table
+            _cached_bytes += table.nbytes
+            _evict(max_bytes)
+    return table
+
+
+def read_column(path: str, column) -> np.ndarray:
+    """
+    Returns column of parquet file as numpy array. The array is a zero-copy view of the cached
+    arrow buffer whenever the column is a single chunk without nulls, so it must not be modified.
+    :param path: path to parquet file or dataset directory
+    :param column: name or index of the column
+    :return:
+    """
+    table = read_table(path)
+    chunked = table.column(column)
+    if chunked.num_chunks == 1:
+        return chunked.chunk(0).to_numpy(zero_copy_only=False)
+    return np.concatenate([chunk.to_numpy(zero_copy_only=False) for chunk in chunked.chunks])
+
+
+def read_frame(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Returns new pandas DataFrame built from cached arrow table, so the caller is free to modify it
+    :param path: path to parquet file or dataset directory
+    :param columns: optional subset of columns
+    :return:
+    """
+    table = read_table(path)
+    if columns is not None:
+        table = pa.Table.from_arrays([table.column(name) for name in columns], names=columns)
+    return table.to_pandas()
+
+
+def clear() -> None:
+    global _cached_bytes
+    with _lock:
+        _tables.clear()
+        _cached_bytes = 0
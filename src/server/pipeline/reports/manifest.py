@@ -0,0 +1,162 @@
+"""
+Manifest of rendered report outputs, used to skip rendering when inputs did not change.
+
+The manifest is stored as plots/.manifest.json in the simulation workdir. For every render task it keeps
+a digest of the task input files and parameters, and the list of produced outputs. File digests are
+cached in the manifest together with file size and modification time, so unchanged inputs are hashed
+only once. Analyzer outputs are removed after successful report, so inputs that no longer exist are
+considered unchanged since their recorded digests, and outputs of finished simulations are not rendered
+again. Report tasks run in parallel, so every read-modify-write of the manifest holds an exclusive
+lock on plots/.manifest.lock.
+
+Sizes of plot images are recorded in the manifest of their directory when plots are saved, so the report
+can lay out plots without opening the images.
+"""
+import fcntl
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple, Union
+
+MANIFEST_NAME = '.manifest.json'
+LOCK_NAME = '.manifest.lock'
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+@contextmanager
+def locked_manifest(plots_dir: str):
+    """
+    Yields manifest dict under exclusive lock, and saves it on exit
+    :param plots_dir:
+    :return:
+    """
+    with open(os.path.join(plots_dir, LOCK_NAME), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            manifest = read_manifest(plots_dir)
+            yield manifest
+            manifest_path = os.path.join(plots_dir, MANIFEST_NAME)
+            with open(manifest_path + '.tmp', 'w') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(manifest_path + '.tmp', manifest_path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def read_manifest(plots_dir: str) -> dict:
+    path = os.path.join(plots_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {'files': {}, 'outputs': {}, 'sizes': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def list_files(path: str, cached: dict) -> List[str]:
+    """
+    Returns the path itself for files, or all files in directory (ex. parquet datasets). Files recorded in the
+    cache are returned for paths that no longer exist
+    """
+    if not os.path.exists(path):
+        prefix = path.rstrip(os.sep) + os.sep
+        recorded = sorted(file for file in cached if file == path or file.startswith(prefix))
+        return recorded or [path]
+    if not os.path.isdir(path):
+        return [path]
+    files = []
+    for root, _, names in os.walk(path):
+        files.extend(os.path.join(root, name) for name in names)
+    return sorted(files)
+
+
+def file_digest(path: str, cached: dict) -> str:
+    """
+    Returns blake2b digest of file content, reusing cached digest if file size and mtime did not change,
+    or if the file was removed
+    :param path: path to file
+    :param cached: the manifest 'files' dict, updated in place
+    :return:
+    """
+    if not os.path.exists(path) and path in cached:
+        return cached[path]['digest']
+    stat = os.stat(path)
+    entry = cached.get(path)
+    if entry is not None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+        return entry['digest']
+
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    cached[path] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'digest': digest.hexdigest()}
+    return cached[path]['digest']
+
+
+def inputs_digest(inputs: List[str], params: dict, cached: dict) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode('utf8'))
+    for path in inputs:
+        for file in list_files(path, cached):
+            digest.update(file.encode('utf8'))
+            digest.update(file_digest(file, cached).encode('utf8'))
+    return digest.hexdigest()
+
+
+def render_cached(plots_dir: str, key: str, inputs: List[str], params: dict,
+                  render: Callable[[], Union[str, List[str]]]) -> List[str]:
+    """
+    Calls render, unless outputs recorded for the key exist and were rendered from the same inputs and params
+    :param plots_dir: directory with the manifest
+    :param key: unique name of rendered output in the report
+    :param inputs: paths to input files or directories
+    :param params: parameters that affect the output
+    :param render: function rendering the outputs and returning path or list of paths to them
+    :return: paths to outputs
+    """
+    with locked_manifest(plots_dir) as manifest:
+        cached = dict(manifest['files'])
+        entry = manifest['outputs'].get(key)
+
+    digest = inputs_digest(inputs, params, cached)
+    if entry is not None and entry['digest'] == digest and all(os.path.exists(o) for o in entry['outputs']):
+        print('Skipping {}, inputs did not change'.format(key))
+        return entry['outputs']
+
+    outputs = render()
+    outputs = [outputs] if isinstance(outputs, str) else list(outputs)
+
+    with locked_manifest(plots_dir) as manifest:
+        manifest['files'].update(cached)
+        manifest['outputs'][key] = {'digest': digest, 'outputs': outputs}
+    return outputs
+
+
+def clear_manifest(plots_dir: str) -> None:
+    """
+    Removes recorded outputs, so that every task renders again
+    """
+    with locked_manifest(plots_dir) as manifest:
+        manifest['outputs'] = {}
+
+
+def record_image_size(path: str, width: int, height: int) -> None:
+    """
+    Records size of image in the manifest of its directory
+    :param path: path to image
+    :param width: width in pixels
+    :param height: height in pixels
+    :return:
+    """
+    directory, name = os.path.split(path)
+    with locked_manifest(directory or '.') as manifest:
+        manifest.setdefault('sizes', {})[name] = [width, height]
+
+
+def image_sizes(plots_dir: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Returns recorded sizes of images in directory
+    :param plots_dir:
+    :return: image path -> (width, height)
+    """
+    sizes = read_manifest(plots_dir).get('sizes', {})
+    return {os.path.join(plots_dir, name): (size[0], size[1]) for name, size in sizes.items()}
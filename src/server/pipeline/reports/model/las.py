@@ -1,13 +1,16 @@
 import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Tuple
 
 import laspy
-import matplotlib as mpl
-import matplotlib.cm as cm
 import numpy as np
 import pandas as pd
 from pandas import DataFrame
 
+from config.settings import REPORTS_MODEL_PER_PARAMETER, REPORTS_MODEL_CHUNK_ROWS, REPORTS_MODEL_CPU_BUDGET
+from server.pipeline.reports import colormap
+
 # birth.efficiency       float64
 # birth.resistance       float64
 # death.efficiency       float64
@@ -18,127 +21,253 @@ from pandas import DataFrame
 parameter_names = ['birthEfficiency', 'birthResistance', 'successEfficiency',
                    'successResistance', 'mutationId', 'lifespanEfficiency', 'lifespanResistance']
 
+COORDINATES = ['x', 'y', 'z']
+LAS_SCALE = 0.00001
+COLORMAP = 'inferno'
+
+# Name of the point cloud carrying all parameters as extra dimensions
+CELL_MODEL_NAME = 'cell_model'
+
+
+class ModelBuildError(Exception):
+    pass
 
-def build_models(path: str) -> None:
+
+def build_models(path: str, per_parameter: bool = None, cpu_budget: int = None) -> List[str]:
+    """
+    Builds point cloud models of final snapshot cells. By default one model with every parameter as extra
+    dimension is built, so the viewer can color points by any of them. With per_parameter, one model with
+    parameter mapped to RGB is built for every parameter.
+    The snapshot is never loaded as a whole - the first pass computes bounds of every column, and the
+    second one streams chunks of rows to the .las output, so peak memory depends only on the chunk size.
+    Models are built concurrently, and the cpu budget is split between their entwine conversions.
+    :param path: simulation workdir
+    :param per_parameter: defaults to REPORTS_MODEL_PER_PARAMETER
+    :param cpu_budget: total number of threads for all conversions, defaults to REPORTS_MODEL_CPU_BUDGET
+    :raises ModelBuildError: when any conversion fails
+    :return: paths to entwine outputs of the models
+    """
+    if per_parameter is None:
+        per_parameter = REPORTS_MODEL_PER_PARAMETER
+    cpu_budget = max(cpu_budget or REPORTS_MODEL_CPU_BUDGET, 1)
     snapshot_path = os.path.join(path, 'output_data', 'final_snapshot.csv')
-    df = merge_final_snapshot(snapshot_path)
+    bounds = snapshot_bounds(snapshot_path)
     models_path = os.path.join(path, 'models')
 
     if not os.path.exists(models_path):
         os.mkdir(models_path)
 
-    for parameter in parameter_names:
-        print('Generating model for parameter: {}'.format(parameter))
-        las_out = os.path.join(models_path, "{}.las".format(parameter))
-        stream_to_las(df, parameter, las_out)
-        las_to_entwine(las_out, os.path.join(models_path, parameter))
+    if not per_parameter:
+        return [build_model(models_path, CELL_MODEL_NAME, cpu_budget,
+                            lambda las_out: stream_to_multi_attribute_las(snapshot_path, bounds, parameter_names,
+                                                                          las_out))]
+
+    parameters = [parameter for parameter in parameter_names if parameter in bounds]
+    workers = min(len(parameters), cpu_budget)
+    threads = max(cpu_budget // max(workers, 1), 1)
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = [
+            executor.submit(build_model, models_path, parameter, threads,
+                            lambda las_out, parameter=parameter: stream_to_las(snapshot_path, bounds, parameter, las_out))
+            for parameter in parameters
+        ]
+        return [future.result() for future in futures]
+
+
+def build_model(models_path: str, name: str, threads: int, write_las: Callable[[str], None]) -> str:
+    """
+    Writes .las file of model and converts it with entwine
+    :param models_path: the models directory
+    :param name: name of .las file and entwine output directory
+    :param threads: number of entwine threads
+    :param write_las: function writing the .las file to given path
+    :return: path to entwine output
+    """
+    print('Generating model: {}'.format(name))
+    las_out = os.path.join(models_path, "{}.las".format(name))
+    out_path = os.path.join(models_path, name)
+    write_las(las_out)
+    las_to_entwine(las_out, out_path, threads)
+    return out_path
+
+
+def snapshot_files(path: str) -> List[str]:
+    return sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith('.csv'))
+
+
+def snapshot_dtype(column: str) -> str:
+    return 'uint32' if column == 'mutationId' else 'float32'
+
+
+def snapshot_dtypes(file: str) -> Dict[str, str]:
+    columns = pd.read_csv(file, sep=';', nrows=0).columns
+    return {column: snapshot_dtype(column) for column in columns}
+
+
+def read_snapshot_chunks(path: str, columns: List[str] = None,
+                         chunk_rows: int = None) -> Iterator[pd.DataFrame]:
+    """
+    Reads final snapshot csv files in chunks of rows, with mutationId as uint32 and other columns as float32
+    :param path: path to final_snapshot.csv directory
+    :param columns: optional subset of columns
+    :param chunk_rows: maximum number of rows in chunk, defaults to REPORTS_MODEL_CHUNK_ROWS
+    :return:
+    """
+    chunk_rows = chunk_rows or REPORTS_MODEL_CHUNK_ROWS
+    for file in snapshot_files(path):
+        dtypes = snapshot_dtypes(file)
+        usecols = [column for column in columns if column in dtypes] if columns is not None else None
+        for chunk in pd.read_csv(file, sep=';', usecols=usecols, dtype=dtypes, chunksize=chunk_rows):
+            yield chunk
+
+
+def snapshot_bounds(path: str, columns: List[str] = None) -> Dict[str, Tuple[float, float]]:
+    """
+    Computes min and max of snapshot columns in one streaming pass
+    :param path: path to final_snapshot.csv directory
+    :param columns: optional subset of columns, all columns by default
+    :return: column name -> (min, max)
+    """
+    bounds = {}
+    for chunk in read_snapshot_chunks(path, columns):
+        mins, maxs = chunk.min(), chunk.max()
+        for column in chunk.columns:
+            if column in bounds:
+                bounds[column] = (min(bounds[column][0], mins[column]), max(bounds[column][1], maxs[column]))
+            else:
+                bounds[column] = (mins[column], maxs[column])
+    return bounds
 
 
-def stream_to_las(df: pd.DataFrame, parameter_name: str, out_path: str) -> None:
+def create_header(bounds: Dict[str, Tuple[float, float]], point_format: int) -> laspy.LasHeader:
     """
-    Create lidar .las file from simulation stream file, with cell X,Y,Z positions
-    and given parameter mapped to color
-    :param df:
+    In contrast to lidarview -> http://lidarview.com/ Potree seems to require additional data
+    in the header, mainly the offset and scale arrays, to display the .las files correctly.
+    More precisely, not the Potree, but the Entwine converter that generates files recognizable by Potree.
+    This change was made as the Entwine converter throws error "Bounds are too large for the selected scale "
+    if those values are not supplied.
+    The offset is the floor of coordinate minimum, known from the bounds pass before any point is written.
+    :param bounds: snapshot bounds
+    :param point_format: 0 for points without color, 2 for RGB colouring of points
+    :return:
+    """
+    header = laspy.LasHeader(point_format=point_format, version='1.2')
+    header.offsets = np.array([np.floor(bounds[c][0]) for c in COORDINATES], dtype=np.float64)
+    header.scales = np.array([LAS_SCALE] * len(COORDINATES))
+    return header
+
+
+def new_points(header: laspy.LasHeader, chunk: pd.DataFrame) -> laspy.ScaleAwarePointRecord:
+    points = laspy.ScaleAwarePointRecord.zeros(chunk.shape[0], header=header)
+    points.x = chunk['x'].values
+    points.y = chunk['y'].values
+    points.z = chunk['z'].values
+    return points
+
+
+def stream_to_multi_attribute_las(snapshot_path: str, bounds: Dict[str, Tuple[float, float]],
+                                  parameters: List[str], out_path: str) -> None:
+    """
+    Create lidar .las file with cell X,Y,Z positions and given parameters stored as extra bytes dimensions,
+    appending snapshot chunks to the output
+    :param snapshot_path: path to final_snapshot.csv directory
+    :param bounds: snapshot bounds
+    :param parameters: names of parameter columns, missing ones are skipped
     :param out_path:
-    :param parameter_name:
     :return:
     """
-    print('Generating .las for {}, out: {}'.format(parameter_name, out_path))
-    if parameter_name in df.columns:
-        x = df['x']
-        y = df['y']
-        z = df['z']
-
-        """
-        In contrast to lidarview -> http://lidarview.com/ Potree seems to require additional data
-        in the header, mainly the offset and scale arrays, to display the .las files correctly.
-        More precisely, not the Potree, but the Entwine converter that generates files recognizable by Potree.
-        This change was made as the Entwine converter throws error "Bounds are too large for the selected scale "
-        if those values are not supplied.
-        There's little documentation from laspy how to create new .las file and fill it with data, and the values in
-        header may need to be adjusted later, as i have no idea what they really do.
-        Example -> https://github.com/laspy/laspy/commit/4dba4c846eacf119b5e99ccf8ccae73735ef1944
-        The point_format=2 is needed for RGB colouring of points.
-        """
-        header = laspy.header.Header(point_format=2)
-        outfile = laspy.file.File(out_path, mode="w", header=header)
-
-        for dim in outfile.point_format:
-            print(dim.__dict__)
-
-        x_min = np.floor(np.min(x))
-        y_min = np.floor(np.min(y))
-        z_min = np.floor(np.min(z))
-
-        outfile.header.offset = [x_min, y_min, z_min]
-        outfile.header.scale = [0.00001, 0.00001, 0.00001]
-
-        outfile.x = x
-        outfile.y = y
-        outfile.z = z
-
-        parameter_series = df[parameter_name]
-
-        r, g, b = map_to_colors(parameter_series)
-
-        outfile.red = r
-        outfile.green = g
-        outfile.blue = b
-        outfile.close()
-    else:
-        print('Parameter {} does not exist in file'.format(parameter_name))
-    return
+    print('Generating .las for {}, out: {}'.format(parameters, out_path))
+    present = [parameter for parameter in parameters if parameter in bounds]
+    for parameter in parameters:
+        if parameter not in present:
+            print('Parameter {} does not exist in file'.format(parameter))
 
+    chunks = read_snapshot_chunks(snapshot_path, COORDINATES + present)
+    write_multi_attribute_las(chunks, bounds, {parameter: snapshot_dtype(parameter) for parameter in present}, out_path)
 
-def map_to_colors(series: DataFrame) -> (DataFrame, DataFrame, DataFrame):
+
+def write_multi_attribute_las(chunks: Iterator[pd.DataFrame], bounds: Dict[str, Tuple[float, float]],
+                              dimensions: Dict[str, str], out_path: str) -> None:
     """
-    Map series of parameter values to RGB colors
-    :param series:
-    :return: the tuple of (R, G, B) DataFrame values
+    Writes chunks of points to .las file, with given columns stored as extra bytes dimensions
+    :param chunks: frames with x, y, z and dimensions columns
+    :param bounds: coordinate bounds
+    :param dimensions: extra dimension name -> numpy type name
+    :param out_path:
+    :return:
     """
-    mapper = build_color_mapper(series)
+    header = create_header(bounds, point_format=0)
+    header.add_extra_dims([
+        laspy.ExtraBytesParams(name=name, type=dtype, description=name) for name, dtype in dimensions.items()
+    ])
 
-    # list comprehension is not used here so that numpy can vectorize the mapper calls
-    colors = mapper.to_rgba(series)
-    r, g, b, a = colors.T
+    with laspy.open(out_path, mode='w', header=header) as writer:
+        for chunk in chunks:
+            points = new_points(header, chunk)
+            for name in dimensions:
+                points[name] = chunk[name].values
+            writer.write_points(points)
 
-    # matplotlib mapper returns RGBA values in 0.0-1.0 range format, and .las files (or maybe potree viewer)
-    # seem to require color in 0-255 range, so map the rgb values here
-    # TODO check whether this mapping can be avoided by generating values already in 0-255 through matplotlib
-    #      or maybe potree viewer can also adjust for 0.0-1.0 values
-    r *= 255.0
-    g *= 255.0
-    b *= 255.0
-    return r, g, b
+
+def stream_to_las(snapshot_path: str, bounds: Dict[str, Tuple[float, float]], parameter_name: str,
+                  out_path: str) -> None:
+    """
+    Create lidar .las file from simulation snapshot, with cell X,Y,Z positions
+    and given parameter mapped to color, appending snapshot chunks to the output
+    :param snapshot_path: path to final_snapshot.csv directory
+    :param bounds: snapshot bounds, the parameter range is used to normalize colors
+    :param parameter_name:
+    :param out_path:
+    :return:
+    """
+    print('Generating .las for {}, out: {}'.format(parameter_name, out_path))
+    if parameter_name not in bounds:
+        print('Parameter {} does not exist in file'.format(parameter_name))
+        return
+
+    header = create_header(bounds, point_format=2)
+    vmin, vmax = bounds[parameter_name]
+    rgb = np.empty((REPORTS_MODEL_CHUNK_ROWS, 3), dtype=np.uint16)
+    with laspy.open(out_path, mode='w', header=header) as writer:
+        for chunk in read_snapshot_chunks(snapshot_path, COORDINATES + [parameter_name]):
+            points = new_points(header, chunk)
+            r, g, b = map_to_colors(chunk[parameter_name], vmin, vmax, out=rgb[:chunk.shape[0]])
+            points.red = r
+            points.green = g
+            points.blue = b
+            writer.write_points(points)
 
 
-def build_color_mapper(series: DataFrame) -> cm.ScalarMappable:
+def map_to_colors(series: DataFrame, vmin: float = None, vmax: float = None,
+                  out: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
-    Build color mapper for parameter value series
-    :param series: the series of some parameter value from simulation stream
-    :return: the ScalarMappable color mapper
+    Map series of parameter values to RGB colors in 0-255 range, which .las files (or maybe potree viewer)
+    seem to require
+    :param series:
+    :param vmin: value mapped to the lowest color, series minimum by default
+    :param vmax: value mapped to the highest color, series maximum by default
+    :param out: optional len(series) x 3 uint16 buffer for the colors
+    :return: the tuple of (R, G, B) uint16 arrays, views of the output buffer
     """
-    min_val = series.min()
-    max_val = series.max()
-    norm = mpl.colors.Normalize(vmin=min_val, vmax=max_val)
-    return cm.ScalarMappable(norm=norm, cmap=cm.inferno)
+    values = np.asarray(series)
+    vmin = np.nanmin(values) if vmin is None else vmin
+    vmax = np.nanmax(values) if vmax is None else vmax
+    rgb = colormap.to_rgb16(values, COLORMAP, vmin, vmax, out=out)
+    return rgb[:, 0], rgb[:, 1], rgb[:, 2]
 
 
-def las_to_entwine(las_path: str, out_path: str) -> None:
+def las_to_entwine(las_path: str, out_path: str, threads: int = 4) -> None:
     """
     Converts .las file to format recognizable by potree viewer
     :param las_path:
     :param out_path:
+    :param threads: number of entwine threads
+    :raises ModelBuildError: when entwine exits with non zero code
     :return:
     """
-    process = subprocess.Popen(('entwine', 'build', '-i', las_path, '-o', out_path, '-t', '4'))
-    process.wait()
-
-
-def merge_final_snapshot(path: str) -> pd.DataFrame:
-    filenames = [f for f in os.listdir(path) if f.endswith('.csv')]
-    merged: pd.DataFrame = pd.concat([pd.read_csv(os.path.join(path, f), sep=';').astype('float32') for f in filenames])
-    print(merged)
-    merged['mutationId'] = merged['mutationId'].astype('uint32')
-    print('final_snapshot df: ', merged)
-    return merged
+    result = subprocess.run(('entwine', 'build', '-i', las_path, '-o', out_path, '-t', str(threads)),
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    print(result.stdout)
+    if result.returncode != 0:
+        raise ModelBuildError('entwine build of {} failed with exit code {}: {}'.format(
+            las_path, result.returncode, result.stdout[-2000:]))
@@ -0,0 +1,210 @@
+"""
+Preview cell model, voxel grid downsampled from the final snapshot.
+
+Cells are binned into a fine voxel grid while the snapshot is streamed, keeping per voxel only sums of
+positions and parameters, cell count and the mutationId of the first cell. The snapshot is read only once -
+voxel size is estimated from the first chunk so the fine grid has about FINE_GRID_FACTOR times more voxels
+than the point budget, and coordinate bounds of the las header are collected on the way. When more voxels
+are occupied than the budget allows, neighbouring voxels are merged by coarsening the grid by integer
+factors - sums and counts merge exactly, so nothing is read again. Every voxel becomes one point at the
+centroid of its cells, with mean parameter values and the number of cells as extra dimensions. Cells
+outside of the first chunk extend the grid - it is coarsened the same way whenever the running bounds no longer
+fit the voxel keys.
+
+The preview is built while the full model is built, so its entwine conversion uses only
+REPORTS_PREVIEW_MODEL_CPU_SHARE of the model cpu budget, and the full model the rest.
+"""
+import math
+import os
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.settings import REPORTS_PREVIEW_MODEL_POINTS, REPORTS_MODEL_CPU_BUDGET, REPORTS_PREVIEW_MODEL_CPU_SHARE
+from server.pipeline.reports.model.las import COORDINATES, build_model, parameter_names, read_snapshot_chunks, \
+    write_multi_attribute_las
+
+PREVIEW_MODEL_NAME = 'cell_model_preview'
+FINE_GRID_FACTOR = 8
+# Voxel coordinates are packed into int64 keys, KEY_BITS per axis
+KEY_BITS = 21
+KEY_OFFSET = 1 << (KEY_BITS - 1)
+
+
+def preview_cpu_budget(cpu_budget: int = None) -> int:
+    """
+    Returns number of entwine threads of the preview model
+    :param cpu_budget: cpu budget of all models, defaults to REPORTS_MODEL_CPU_BUDGET
+    :return:
+    """
+    cpu_budget = max(cpu_budget or REPORTS_MODEL_CPU_BUDGET, 1)
+    return max(int(cpu_budget * REPORTS_PREVIEW_MODEL_CPU_SHARE), 1)
+
+
+def full_model_cpu_budget(cpu_budget: int = None) -> int:
+    """
+    Returns cpu budget left for the full models while the preview model is built
+    :param cpu_budget: cpu budget of all models, defaults to REPORTS_MODEL_CPU_BUDGET
+    :return:
+    """
+    cpu_budget = max(cpu_budget or REPORTS_MODEL_CPU_BUDGET, 1)
+    return max(cpu_budget - preview_cpu_budget(cpu_budget), 1)
+
+
+def build_preview_model(path: str, max_points: int = None, cpu_budget: int = None) -> List[str]:
+    """
+    Builds downsampled point cloud model of final snapshot cells, viewable long before the full model
+    :param path: simulation workdir
+    :param max_points: maximum number of points, defaults to REPORTS_PREVIEW_MODEL_POINTS
+    :param cpu_budget: cpu budget of all models, the preview uses its share, see preview_cpu_budget
+    :return: path to entwine output of the model, or no paths when the snapshot has no cells
+    """
+    max_points = max_points or REPORTS_PREVIEW_MODEL_POINTS
+    snapshot_path = os.path.join(path, 'output_data', 'final_snapshot.csv')
+    preview, bounds = voxel_downsample(read_snapshot_chunks(snapshot_path), max_points)
+    if preview.shape[0] == 0:
+        print('Final snapshot has no cells, skipping preview model')
+        return []
+    models_path = os.path.join(path, 'models')
+
+    if not os.path.exists(models_path):
+        os.mkdir(models_path)
+
+    dimensions = {column: 'uint32' if preview[column].dtype == np.uint32 else 'float32'
+                  for column in preview.columns if column not in COORDINATES}
+    return [build_model(models_path, PREVIEW_MODEL_NAME, preview_cpu_budget(cpu_budget),
+                        lambda las_out: write_multi_attribute_las(iter([preview]), bounds, dimensions, las_out))]
+
+
+class VoxelGrid:
+    def __init__(self, sample: np.ndarray, max_points: int):
+        """
+        Creates grid with voxel size estimated from sample positions
+        :param sample: n x 3 positions, ex. of the first snapshot chunk
+        :param max_points: maximum number of output points
+        """
+        self.origin = sample.min(axis=0).astype(np.float64)
+        extent = sample.max(axis=0).astype(np.float64) - self.origin
+        # Flat snapshots (ex. 2D simulations) have zero extent along some axes
+        self.axes = max(int(np.count_nonzero(extent > 0)), 1)
+        volume = np.prod(extent[extent > 0]) if np.any(extent > 0) else 1.0
+        self.size = (volume / (max_points * FINE_GRID_FACTOR)) ** (1.0 / self.axes) or 1.0
+        # Voxels of the grid are factor x factor x factor fine voxels
+        self.factor = 1
+
+    @staticmethod
+    def pack(cells: np.ndarray) -> np.ndarray:
+        cells = cells + KEY_OFFSET
+        return (cells[:, 0] << (2 * KEY_BITS)) | (cells[:, 1] << KEY_BITS) | cells[:, 2]
+
+    @staticmethod
+    def unpack(keys: np.ndarray) -> np.ndarray:
+        mask = (1 << KEY_BITS) - 1
+        cells = np.stack([keys >> (2 * KEY_BITS), (keys >> KEY_BITS) & mask, keys & mask], axis=1)
+        return cells - KEY_OFFSET
+
+    def cells(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Returns fine voxel coordinates of positions
+        """
+        return np.floor((positions - self.origin) / self.size).astype(np.int64)
+
+    def fits(self, cells: np.ndarray) -> bool:
+        """
+        Checks if voxels of fine cells can be packed into keys at the current grid factor
+        """
+        return cells.min() // self.factor >= -KEY_OFFSET and cells.max() // self.factor < KEY_OFFSET
+
+    def keys(self, cells: np.ndarray) -> np.ndarray:
+        """
+        Returns keys of voxels of fine cells, the cells must fit the grid
+        """
+        return self.pack(cells // self.factor)
+
+    def coarsen(self, keys: np.ndarray, factor: int) -> np.ndarray:
+        """
+        Returns keys of voxels merging factor x factor x factor voxels of keys
+        """
+        return self.pack(self.unpack(keys) // factor)
+
+
+def reduce_voxels(keys: np.ndarray, sums: np.ndarray, counts: np.ndarray,
+                  ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Merges rows with the same voxel key, summing sums and counts, and keeping the first id
+    :return: unique keys, and merged sums, counts and ids
+    """
+    unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    merged = np.empty((unique.shape[0], sums.shape[1]), dtype=np.float64)
+    for column in range(sums.shape[1]):
+        merged[:, column] = np.bincount(inverse, weights=sums[:, column], minlength=unique.shape[0])
+    merged_counts = np.bincount(inverse, weights=counts, minlength=unique.shape[0]).astype(np.int64)
+    return unique, merged, merged_counts, ids[first]
+
+
+def voxel_downsample(chunks: Iterator[pd.DataFrame],
+                     max_points: int) -> Tuple[pd.DataFrame, Dict[str, Tuple[float, float]]]:
+    """
+    Downsamples snapshot chunks to at most max_points voxel centroids, in a single pass over chunks
+    :param chunks: snapshot frames with x, y, z, parameters and mutationId columns
+    :param max_points: maximum number of output points
+    :return: frame with x, y, z, mean parameters, mutationId of first cell and cellCount, and bounds of
+    snapshot coordinates
+    """
+    grid: VoxelGrid = None
+    bounds: Dict[str, Tuple[float, float]] = {}
+    columns: List[str] = None
+    keys = counts = ids = sums = None
+    for chunk in chunks:
+        if chunk.shape[0] == 0:
+            continue
+        if columns is None:
+            columns = COORDINATES + [p for p in parameter_names if p in chunk.columns and p != 'mutationId']
+        chunk_sums = chunk[columns].values.astype(np.float64)
+        positions = chunk_sums[:, :len(COORDINATES)]
+        if grid is None:
+            grid = VoxelGrid(positions, max_points)
+        for idx, column in enumerate(COORDINATES):
+            low, high = positions[:, idx].min(), positions[:, idx].max()
+            bounds[column] = (min(bounds[column][0], low), max(bounds[column][1], high)) \
+                if column in bounds else (low, high)
+        chunk_cells = grid.cells(positions)
+        # Cells far outside of the first chunk do not fit the keys, voxels are merged until they do
+        while not grid.fits(chunk_cells):
+            grid.factor *= 2
+            if keys is not None:
+                keys, sums, counts, ids = reduce_voxels(grid.coarsen(keys, 2), sums, counts, ids)
+        chunk_keys = grid.keys(chunk_cells)
+        chunk_ids = chunk['mutationId'].values if 'mutationId' in chunk.columns \
+            else np.zeros(chunk.shape[0], dtype=np.uint32)
+        chunk_counts = np.ones(chunk.shape[0], dtype=np.int64)
+        if keys is not None:
+            chunk_keys = np.concatenate([keys, chunk_keys])
+            chunk_sums = np.concatenate([sums, chunk_sums])
+            chunk_counts = np.concatenate([counts, chunk_counts])
+            chunk_ids = np.concatenate([ids, chunk_ids])
+        keys, sums, counts, ids = reduce_voxels(chunk_keys, chunk_sums, chunk_counts, chunk_ids)
+        # Voxel size was estimated from the first chunk, memory stays bounded when it was too small
+        while keys.shape[0] > max_points * FINE_GRID_FACTOR:
+            grid.factor *= 2
+            keys, sums, counts, ids = reduce_voxels(grid.coarsen(keys, 2), sums, counts, ids)
+
+    if keys is None:
+        return pd.DataFrame(columns=COORDINATES + ['cellCount']), bounds
+
+    factor = 1
+    coarse = (keys, sums, counts, ids)
+    while coarse[0].shape[0] > max_points:
+        ratio = (coarse[0].shape[0] / max_points) ** (1.0 / grid.axes)
+        factor = max(factor + 1, int(math.ceil(factor * ratio)))
+        coarse = reduce_voxels(grid.coarsen(keys, factor), sums, counts, ids)
+    _, sums, counts, ids = coarse
+
+    means = sums / counts[:, np.newaxis]
+    preview = pd.DataFrame({column: means[:, idx] for idx, column in enumerate(columns)})
+    for column in columns[len(COORDINATES):]:
+        preview[column] = preview[column].astype(np.float32)
+    preview['mutationId'] = ids.astype(np.uint32)
+    preview['cellCount'] = counts.astype(np.uint32)
+    return preview, bounds
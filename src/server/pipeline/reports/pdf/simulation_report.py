@@ -1,29 +1,42 @@
 import ntpath
 import os
-from typing import List
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
 
+from PIL import Image as PILImage
 from reportlab.lib import utils
 from reportlab.lib.enums import TA_CENTER
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
+from reportlab.lib.units import cm, inch
+from reportlab.pdfgen import canvas
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
 
+from config.settings import REPORTS_PDF_STREAMING, REPORTS_PDF_WORKERS
 from models.artifact import Artifact
+from server.pipeline.reports.manifest import image_sizes
+from server.pipeline.reports.plots.pyramid import RESOLUTIONS, variant_path
 
 IMAGE_WIDTH_CM = 13 * cm
 LABEL_FONT_SIZE = 10
 SUMMARY_REPORT_NAME = "simulation_report.pdf"
 
+# Images are downscaled to IMAGE_WIDTH_CM printed at PRINT_DPI
+PRINT_DPI = 200
+IMAGE_WIDTH_PX = int(IMAGE_WIDTH_CM / inch * PRINT_DPI)
+JPEG_QUALITY = 85
+PAGE_MARGINS = (30, 30, 18, 18)
+
 
 def path_leaf(path):
     head, tail = ntpath.split(path)
     return tail or ntpath.basename(head)
 
 
-def get_image(path: str, width=1 * cm) -> Image:
-    img = utils.ImageReader(path)
-    iw, ih = img.getSize()
+def get_image(path: str, width=1 * cm, size: Tuple[int, int] = None) -> Image:
+    iw, ih = size or utils.ImageReader(path).getSize()
     aspect = ih / float(iw)
     return Image(path, width=width, height=(width * aspect))
 
@@ -37,8 +50,8 @@ def build_label(text: str, styles) -> list:
     return story
 
 
-def build_labeled_plot(path: str, styles) -> list:
-    plot = get_image(path, IMAGE_WIDTH_CM)
+def build_labeled_plot(path: str, styles, size: Tuple[int, int] = None) -> list:
+    plot = get_image(path, IMAGE_WIDTH_CM, size)
     plot_name = get_plot_name(path)
     label = build_label(plot_name, styles)
     return [plot] + label + [Spacer(1, 12)]
@@ -55,13 +68,118 @@ def build_report_styles():
     return styles
 
 
-def build_summary_report(plots: List[Artifact], workdir: str) -> None:
+def recorded_sizes(plots: List[Artifact]) -> Dict[str, Tuple[int, int]]:
+    """
+    Returns image sizes of plots recorded when the plots were saved
+    :param plots: the plot artifacts
+    :return: plot path -> (width, height), plots without recorded size are missing
+    """
+    sizes = {}
+    for directory in set(os.path.dirname(plot.path) for plot in plots):
+        sizes.update(image_sizes(directory))
+    return sizes
+
+
+def build_summary_report(plots: List[Artifact], workdir: str, streaming: bool = None) -> str:
+    """
+    Builds pdf report with all plots
+    :param plots: the plot artifacts
+    :param workdir: the output directory
+    :param streaming: downscale images in parallel and write the report page by page,
+        REPORTS_PDF_STREAMING if None
+    :return: path to the report
+    """
+    streaming = REPORTS_PDF_STREAMING if streaming is None else streaming
+    if streaming:
+        return build_streaming_summary_report(plots, workdir)
+
     report_path = os.path.join(workdir, SUMMARY_REPORT_NAME)
     report = SimpleDocTemplate(report_path, pagesize=letter,
                                rightMargin=30, leftMargin=30,
                                topMargin=18, bottomMargin=18)
     styles = build_report_styles()
+    sizes = recorded_sizes(plots)
     story = []
     for plot in plots:
-        story.extend(build_labeled_plot(plot.path, styles))
+        story.extend(build_labeled_plot(plot.path, styles, sizes.get(plot.path)))
     report.build(story)
+    return report_path
+
+
+def downscale_image(path: str, out_dir: str, index: int, size: Tuple[int, int] = None) -> Tuple[str, int, int]:
+    """
+    Downscales plot image to print width and recompresses it as jpeg. The preview variant of the plot
+    is used as the source when it is large enough, so the full resolution image is not decoded
+    :param path: path to plot image
+    :param out_dir: directory for downscaled image
+    :param index: position of the plot in report, plots in different directories may have the same name
+    :param size: recorded (width, height) of the plot image, the preview is then used without opening it first
+    :return: tuple of (path, width, height) of downscaled image
+    """
+    source = path
+    preview_path = variant_path(path, 'preview')
+    if size is not None:
+        if size[0] > IMAGE_WIDTH_PX and RESOLUTIONS['preview'] >= IMAGE_WIDTH_PX and os.path.isfile(preview_path):
+            source = preview_path
+    elif os.path.isfile(preview_path):
+        with PILImage.open(preview_path) as preview:
+            if preview.width >= IMAGE_WIDTH_PX:
+                source = preview_path
+
+    with PILImage.open(source) as original:
+        image = original
+        width, height = size or image.size
+        if width > IMAGE_WIDTH_PX:
+            scaled = (IMAGE_WIDTH_PX, max(int(height * IMAGE_WIDTH_PX / float(width)), 1))
+            image = image.resize(scaled, PILImage.LANCZOS)
+        if image.mode != 'RGB':
+            background = PILImage.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
+            image = background
+
+        out_path = os.path.join(out_dir, '{:04d}-{}.jpg'.format(index, get_plot_name(path)))
+        image.save(out_path, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+        return out_path, image.width, image.height
+
+
+def build_streaming_summary_report(plots: List[Artifact], workdir: str) -> str:
+    """
+    Builds pdf report from images downscaled in parallel, drawing the plots page by page on the canvas.
+    Image sizes recorded when plots were saved select the downscaling source, and sizes of downscaled images
+    are known from downscaling, so images are not opened again while building the report
+    :param plots: the plot artifacts
+    :param workdir: the output directory
+    :return: path to the report
+    """
+    report_path = os.path.join(workdir, SUMMARY_REPORT_NAME)
+    images_dir = tempfile.mkdtemp(prefix='report-images-', dir=workdir)
+    sizes = recorded_sizes(plots)
+    try:
+        with ThreadPoolExecutor(max_workers=REPORTS_PDF_WORKERS) as pool:
+            images = list(pool.map(
+                lambda indexed: downscale_image(indexed[1].path, images_dir, indexed[0], sizes.get(indexed[1].path)),
+                enumerate(plots)))
+
+        page_width, page_height = letter
+        left, right, top, bottom = PAGE_MARGINS
+        spacing = 12
+        report = canvas.Canvas(report_path, pagesize=letter)
+        y = page_height - top
+        for plot, (image_path, width, height) in zip(plots, images):
+            image_height = IMAGE_WIDTH_CM * height / float(width)
+            block_height = image_height + LABEL_FONT_SIZE + 3 * spacing
+            if y - block_height < bottom and y < page_height - top:
+                report.showPage()
+                y = page_height - top
+
+            x = left + (page_width - left - right - IMAGE_WIDTH_CM) / 2.0
+            y -= image_height
+            report.drawImage(image_path, x, y, width=IMAGE_WIDTH_CM, height=image_height)
+            y -= spacing + LABEL_FONT_SIZE
+            report.setFont('Helvetica', LABEL_FONT_SIZE)
+            report.drawCentredString(page_width / 2.0, y, get_plot_name(plot.path))
+            y -= 2 * spacing
+        report.save()
+    finally:
+        shutil.rmtree(images_dir, ignore_errors=True)
+    return report_path
@@ -0,0 +1,52 @@
+"""
+Time-axis decimation for stack plots.
+
+Stack plots of long simulations are rendered from every time point, although the output image is
+at most a few thousand pixels wide. The time axis is split into buckets and from every bucket only
+its first row and the row deviating the most from it are kept, so spikes survive the downsampling.
+All layers are sampled at the same time points, which preserves the stack structure.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+
+from config.settings import REPORTS_PLOT_MAX_POINTS
+
+
+def max_points_for(figsize: Tuple[float, float], dpi: int) -> int:
+    """
+    Returns the number of time points worth plotting on figure of given size
+    :param figsize: figure (width, height) in inches
+    :param dpi: output resolution
+    :return: REPORTS_PLOT_MAX_POINTS if set, otherwise the figure width in pixels
+    """
+    if REPORTS_PLOT_MAX_POINTS > 0:
+        return REPORTS_PLOT_MAX_POINTS
+    return int(figsize[0] * dpi)
+
+
+def decimate_stack(time: np.ndarray, layers: np.ndarray, max_points: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Downsamples stack plot data along time axis to at most max_points time points
+    :param time: the time points, shape (n,)
+    :param layers: the layer values, shape (n, layers)
+    :param max_points: maximum number of points to keep, None or 0 to disable decimation
+    :return: the tuple of (time, layers) sampled at the kept time points
+    """
+    n = time.shape[0]
+    if not max_points or n <= max_points:
+        return time, layers
+
+    buckets = max(max_points // 2 - 1, 1)
+    edges = np.linspace(0, n, buckets + 1).astype(int)
+    keep = [0, n - 1]
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end <= start:
+            continue
+        block = layers[start:end]
+        deviation = np.abs(block - block[0]).sum(axis=1)
+        keep.append(start)
+        keep.append(start + int(np.argmax(deviation)))
+
+    keep = np.unique(keep)
+    return time[keep], layers[keep]
@@ -5,24 +5,40 @@ import fire
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from matplotlib import colors
 from matplotlib.colorbar import Colorbar
 
+from config.settings import REPORTS_PLOT_RENDERER
+from server.pipeline.reports import colormap, data_cache
+from server.pipeline.reports.plots.decimation import decimate_stack, max_points_for
+from server.pipeline.reports.plots.pyramid import save_figure
+from server.pipeline.reports.plots.stack_raster import RASTER_RENDERER, raster_stackplot
+
+FIGURE_SIZE = (25, 20)
+DPI = 150
+
 
 def build_colors_list(data, cmap):
-    normalize = colors.Normalize(vmax=data.max(), vmin=data.min())
-    colorList = cmap(normalize(data))
+    colorList = colormap.to_rgba(data, cmap)
     return colorList
 
 
-def histogram_plots(input_csv_file, param_name, time_parquet, stats_parquet, output_file):
+def histogram_plots(input_csv_file, param_name, time_parquet, stats_parquet, output_file, max_points=None,
+                    renderer=None):
+    """
+    Plots fractions of clones over time, with clones colored by their param_name histogram bin
+    :param max_points: maximum number of time points to plot, derived from figure size if None, 0 disables
+        decimation
+    :param renderer: 'path' for matplotlib stackplot, 'raster' for numpy rasterized stack, REPORTS_PLOT_RENDERER
+        if None
+    :return: path to saved plot
+    """
+    renderer = renderer or REPORTS_PLOT_RENDERER
     data = pd.read_csv(input_csv_file, sep=";", header=None)
     # data = pd.read_parquet(input_file)
 
-    time = pd.read_parquet(time_parquet)
-    statsData = pd.read_parquet(stats_parquet)
+    time = data_cache.read_column(time_parquet, 0)
+    system_size = data_cache.read_column(stats_parquet, 'systemSize')
 
-    time = time.iloc[0:, 0].values
     # time = np.append([0], time, axis=0)
     sumAll = np.sum(data.iloc[:, :], axis=1)
     dataNorm = data.iloc[:, :].div(sumAll, axis=0).values
@@ -38,10 +54,17 @@ def histogram_plots(input_csv_file, param_name, time_parquet, stats_parquet, out
     # plt.style.use('dark_background')
     colorsIds = np.arange(0, data.shape[1], 1)
     colors = build_colors_list(colorsIds, cmap)
-    fig = plt.figure(figsize=(25, 20))
-    sp = plt.stackplot(time, dataNorm.T, edgecolor='white', colors=colors)
-
+    fig = plt.figure(figsize=FIGURE_SIZE)
     ax1 = fig.add_subplot(111)
+
+    if renderer == RASTER_RENDERER:
+        raster_stackplot(ax1, time, dataNorm, colors, y_max=dataNorm.T.max())
+    else:
+        if max_points is None:
+            max_points = max_points_for(FIGURE_SIZE, DPI)
+        plot_time, plot_data = decimate_stack(time, dataNorm, max_points)
+        ax1.stackplot(plot_time, plot_data.T, edgecolor='white', colors=colors)
+
     ax1.set_xlim([0.0, time.max()])
     ax1.set_ylim([0.0, dataNorm.T.max()])
     ax2 = ax1.twiny()
@@ -55,8 +78,8 @@ def histogram_plots(input_csv_file, param_name, time_parquet, stats_parquet, out
     ax2.set_xticks(ax2Ticks)
     ax2.set_xbound(ax1.get_xbound())
     ticks = ax2Ticks[(np.where(ax2Ticks.astype(int) <
-                               statsData['systemSize'].values.shape[0]))]
-    ax2.set_xticklabels(np.take(statsData['systemSize'].values,
+                               system_size.shape[0]))]
+    ax2.set_xticklabels(np.take(system_size,
                                 ticks.astype(int), axis=0))
     # plt.xlabel('time [sytem]', fontsize='xx-large')
     ax1.set_ylabel(
@@ -70,14 +93,15 @@ def histogram_plots(input_csv_file, param_name, time_parquet, stats_parquet, out
                                norm=plt.Normalize(vmin=dataNorm.min(),
                                                   vmax=dataNorm.max()))
     sm._A = []
-    colorbar: Colorbar = plt.colorbar(sm)
+    colorbar: Colorbar = plt.colorbar(sm, ax=ax1)
     colorbar.set_label(param_name, size='xx-large')
 
-    plt.savefig(output_file, bbox_inches='tight', dpi=150)
+    output_file = save_figure(fig, output_file, dpi=DPI)
     # plt.show()
     plt.cla()
     plt.clf()
     plt.close('all')
+    return output_file
 
 
 if __name__ == '__main__':
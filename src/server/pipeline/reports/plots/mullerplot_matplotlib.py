@@ -6,28 +6,127 @@
 import fire
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 import pyarrow.parquet as pq
-from matplotlib import colors
+
+from config.settings import REPORTS_PLOT_RENDERER
+from server.pipeline.reports import colormap, data_cache
+from server.pipeline.reports.plots.decimation import decimate_stack, max_points_for
+from server.pipeline.reports.plots.pyramid import save_figure
+from server.pipeline.reports.plots.stack_raster import RASTER_RENDERER, raster_stackplot
+
+FIGURE_SIZE = (25, 20)
+DPI = 150
 
 
 def getData(fileName):
-    df = pd.read_parquet(fileName)
+    df = data_cache.read_frame(fileName)
 
     return df
 
 
 def buildColorsList(data, cmap):
-    normalize = colors.Normalize(vmax=1.0, vmin=0.0)
-    color_list = cmap(normalize(data))
+    color_list = colormap.to_rgba(data, cmap, vmin=0.0, vmax=1.0)
 
     return color_list
 
 
+def draw_axes(fig, time, data_norm, system_size):
+    ax1 = fig.add_subplot(111)
+    ax1.set_xlim([0.0, time.max()])
+    ax1.set_ylim([0.0, data_norm.T.max()])
+    ax2 = ax1.twiny()
+    ax1Ticks = ax1.get_xticks()
+    ax2Ticks = ax1Ticks
+
+    ax2.set_xticks(ax2Ticks)
+    ax2.set_xbound(ax1.get_xbound())
+    ticks = ax2Ticks[(np.where(ax2Ticks.astype(int) <
+                               system_size.shape[0]))]
+    ax2.set_xticklabels(np.take(system_size,
+                                ticks.astype(int), axis=0))
+    ax1.set_ylabel(
+        'fractions of cell clones', fontsize='xx-large')
+    ax1.set_xlabel('time [sytem]', fontsize='xx-large')
+    ax2.set_xlabel('number of cells in system', fontsize='xx-large')
+    return ax1
+
+
+def draw_colorbar(ax, cmap, label):
+    sm = plt.cm.ScalarMappable(cmap=cmap,
+                               norm=plt.Normalize(vmin=0.0,
+                                                  vmax=1.0))
+    sm._A = []
+    # The mappable is not drawn, so the colorbar takes its space from the stack axes
+    colorbar = plt.colorbar(sm, ax=ax)
+    colorbar.set_label(label, size='xx-large')
+    return colorbar
+
+
+def param_colors(params_data, param, cmap):
+    stat = params_data[param].values
+    # first row = param value for mutation_id=0
+    stat = np.append(0, stat)
+    return buildColorsList(stat, cmap)
+
+
+def draw_stack(ax1, time, data_norm, clist, renderer):
+    if renderer == RASTER_RENDERER:
+        return raster_stackplot(ax1, time, data_norm, clist, y_max=data_norm.T.max())
+    return ax1.stackplot(time, data_norm.T, colors=clist)
+
+
+def recolor_stack(stack, clist, renderer):
+    if renderer == RASTER_RENDERER:
+        stack.set_colors(clist)
+        return
+    # stackplot cycles through colors when there are more layers than colors
+    for idx, polygon in enumerate(stack):
+        polygon.set_facecolor(clist[idx % len(clist)])
+
+
+def render_param(time, data_norm, system_size, clist, cmap, param, output_file_name, renderer):
+    """
+    Builds the whole figure, including stack geometry, for a single parameter
+    """
+    fig = plt.figure(figsize=FIGURE_SIZE)
+    ax1 = draw_axes(fig, time, data_norm, system_size)
+    draw_stack(ax1, time, data_norm, clist, renderer)
+    draw_colorbar(ax1, cmap, param)
+    save_figure(fig, output_file_name, dpi=DPI)
+    plt.close(fig)
+
+
+def render_recolored(time, data_norm, system_size, params_data, params, cmap, output_prefix, renderer):
+    """
+    Builds the stack geometry once, and renders every parameter by only swapping face colors
+    of the stack polygons (or stack image) and the colorbar label
+    """
+    fig = plt.figure(figsize=FIGURE_SIZE)
+    ax1 = draw_axes(fig, time, data_norm, system_size)
+    stack = draw_stack(ax1, time, data_norm, param_colors(params_data, params[0], cmap), renderer)
+    colorbar = draw_colorbar(ax1, cmap, params[0])
+
+    for param in params:
+        recolor_stack(stack, param_colors(params_data, param, cmap), renderer)
+        colorbar.set_label(param, size='xx-large')
+        save_figure(fig, output_prefix + param + '.png', dpi=DPI)
+    plt.close(fig)
+
+
 def muller_plots(input_file, stats_file, params_file, large_muller_order,
-                 output_prefix):
+                 output_prefix, recolor_only=True, max_points=None, renderer=None):
+    """
+    Plots fractions of large clones over time, one plot per clone parameter, with clones colored by parameter value
+    :param recolor_only: build stack geometry once and only swap colors between parameters
+    :param max_points: maximum number of time points to plot, derived from figure size if None, 0 disables
+        decimation
+    :param renderer: 'path' for matplotlib stackplot, 'raster' for numpy rasterized stack, REPORTS_PLOT_RENDERER
+        if None
+    :return: paths to saved plots
+    """
+    renderer = renderer or REPORTS_PLOT_RENDERER
     data = getData(input_file)
-    stats_data = getData(stats_file)
+    system_size = data_cache.read_column(stats_file, 'systemSize')
     params_data = pq.read_table(params_file).flatten().to_pandas()
     order = getData(large_muller_order)
     params_data = order.join(
@@ -38,63 +137,25 @@ def muller_plots(input_file, stats_file, params_file, large_muller_order,
     cmap = plt.get_cmap('nipy_spectral', data.shape[1])
     # cmap = plt.cm.get_cmap('RdYlBu')
 
-    params = iter(params_data.columns.values[1:, ])
-    next(params)
-    for idx, val in enumerate(params):
-        stat = params_data[val].values
-        stat = np.append(0, stat)
-        # first row = param value for mutation_id=0
-        # stat = np.column_stack((np.zeros(np.shape(stat)[0]), stat))
-        clist = buildColorsList(stat, cmap)
-        # cmap = colors.LinearSegmentedColormap.from_list('my_cmap',clist)
-
-        time = data.iloc[:, 0].values
-        sum_all = np.sum(data.iloc[:, 1:], axis=1)
-        data_norm = data.iloc[:, 1:].div(sum_all, axis=0).values
-        fig = plt.figure(figsize=(25, 20))
-
-        sp = plt.stackplot(time, data_norm.T, cmap=cmap, colors=clist)
-        ax1 = fig.add_subplot(111)
-        ax1.set_xlim([0.0, time.max()])
-        ax1.set_ylim([0.0, data_norm.T.max()])
-        ax2 = ax1.twiny()
-        ax1Ticks = ax1.get_xticks()
-        ax2Ticks = ax1Ticks
-
-        # plt.xlim([0.0, time.max()])
-        # plt.ylim([0.0, dataNorm.T.max()])
-
-        def tick_function(X):
-            V = X
-            return ["%.3f" % z for z in V]
-
-        ax2.set_xticks(ax2Ticks)
-        ax2.set_xbound(ax1.get_xbound())
-        ticks = ax2Ticks[(np.where(ax2Ticks.astype(int) <
-                                   stats_data['systemSize'].values.shape[0]))]
-        ax2.set_xticklabels(np.take(stats_data['systemSize'].values,
-                                    ticks.astype(int), axis=0))
-        # plt.xlabel('time [sytem]', fontsize='xx-large')
-        ax1.set_ylabel(
-            'fractions of cell clones', fontsize='xx-large')
-        # plt.xticks(fontsize='xx-large')
-        # plt.yticks(fontsize='xx-large')
-        ax1.set_xlabel('time [sytem]', fontsize='xx-large')
-        ax2.set_xlabel('number of cells in system', fontsize='xx-large')
-        sm = plt.cm.ScalarMappable(cmap=cmap,
-                                   norm=plt.Normalize(vmin=0.0,
-                                                      vmax=1.0))
-        sm._A = []
-        colorbar = plt.colorbar(sm)
-        colorbar.set_label(val, size='xx-large')
-
-        output_file_name = output_prefix + val + '.png'
-        plt.savefig(output_file_name, bbox_inches='tight', dpi=150)
-
-        # plt.show()
-        plt.cla()
-        plt.clf()
-        plt.close(fig)
+    # the first two columns come from the muller order frame
+    params = list(params_data.columns.values[2:])
+
+    time = data.iloc[:, 0].values
+    sum_all = np.sum(data.iloc[:, 1:], axis=1)
+    data_norm = data.iloc[:, 1:].div(sum_all, axis=0).values
+    if renderer != RASTER_RENDERER:
+        if max_points is None:
+            max_points = max_points_for(FIGURE_SIZE, DPI)
+        time, data_norm = decimate_stack(time, data_norm, max_points)
+
+    if recolor_only:
+        render_recolored(time, data_norm, system_size, params_data, params, cmap, output_prefix, renderer)
+        return [output_prefix + param + '.png' for param in params]
+
+    for param in params:
+        clist = param_colors(params_data, param, cmap)
+        render_param(time, data_norm, system_size, clist, cmap, param, output_prefix + param + '.png', renderer)
+    return [output_prefix + param + '.png' for param in params]
 
 
 if __name__ == "__main__":
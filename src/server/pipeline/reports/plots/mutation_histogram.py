@@ -7,16 +7,12 @@ Muller like plots with params values as color decoded...
 import fire
 import matplotlib.pyplot as plt
 import numpy as np
-import pyarrow.parquet as pq
+from server.pipeline.reports.plots.pyramid import save_figure
+from server.pipeline.reports.top_k import top_k
 
 
 def histogram_plot(input_file, threshold, output_file):
-    data = pq.read_table(
-        input_file,
-        columns=['mutationId', 'mutationCount']
-    ).to_pandas()
-    sorted_data = data.sort_values(by=['mutationCount'], ascending=False)
-    sorted_data = sorted_data.iloc[:threshold, :threshold]
+    sorted_data = top_k(input_file, 'mutationCount', threshold, columns=['mutationId', 'mutationCount'])
     data = np.array(sorted_data)
 
     # data = np.delete(data, 0, axis=0)
@@ -41,7 +37,9 @@ def histogram_plot(input_file, threshold, output_file):
         plt.text(x=idx, y=val, s=f"{val}", fontdict=dict(fontsize=12))
 
     # plt.show()
-    plt.savefig(output_file, bbox_inches='tight', dpi=150)
+    output_file = save_figure(fig, output_file, dpi=150)
+    plt.close(fig)
+    return output_file
 
 
 if __name__ == '__main__':
@@ -1,25 +1,54 @@
 import fire
-import igraph
 import numpy as np
-import pandas as pd
-
-
-def arrow_to_graph(path):
-    df = pd.read_parquet(path)# .sort_values("mutationId")
-    vertex_mapping = dict((mutationId, vertexId) for vertexId, mutationId in enumerate(df["mutationId"]))
-    is_root = np.array(df["ancestors"].map(lambda x: len(x))) == 1
-    graph = igraph.Graph()
-    graph.add_vertices(len(vertex_mapping))
-    links = list(zip(
-        (vertex_mapping[x[-2]] for x in df["ancestors"][~is_root]),
-        (vertex_mapping[x] for x in df["mutationId"][~is_root])
-    ))
-    graph.add_edges(links)
-    graph.vs["mutationId"] = df["mutationId"]
-    graph.vs["type_count"] = df["typeCount"]
-    graph.vs["mutation_count"] = df["mutationCount"]
-    roots = np.where(is_root)
-    return graph, roots[0]
+import pyarrow.parquet as pq
+
+from server.pipeline.util.arrow import column_values, list_parents
+
+
+# Only mutations present in more cells than this are plotted
+MIN_MUTATION_COUNT = 100000
+
+
+def tree_edges(path, mutation_count_gt=None):
+    """
+    Reads mutation tree vertices and edges, optionally only for mutations with mutationCount above threshold
+    :param path: path to mutations parquet
+    :param mutation_count_gt: optional mutationCount threshold, applied before the edges are built
+    :return: table columns of kept vertices, (parent, child) vertex index pairs and indices of root vertices
+    """
+    table = pq.read_table(path, columns=['mutationId', 'ancestors', 'typeCount', 'mutationCount'], memory_map=True)
+    mutation_ids = column_values(table, 'mutationId')
+    type_count = column_values(table, 'typeCount')
+    mutation_count = column_values(table, 'mutationCount')
+    parents, is_root = list_parents(table.column('ancestors'))
+
+    if mutation_count_gt is not None:
+        keep = mutation_count > mutation_count_gt
+        mutation_ids, type_count, mutation_count = mutation_ids[keep], type_count[keep], mutation_count[keep]
+        parents, is_root = parents[keep], is_root[keep]
+
+    # Vertex of parent mutation, parents filtered out by the threshold have no edge
+    sorter = np.argsort(mutation_ids, kind='mergesort')
+    sorted_ids = mutation_ids[sorter]
+    positions = np.minimum(np.searchsorted(sorted_ids, parents), max(len(sorted_ids) - 1, 0))
+    has_parent = ~is_root
+    if len(sorted_ids):
+        has_parent &= sorted_ids[positions] == parents
+    children = np.flatnonzero(has_parent)
+    edges = np.column_stack([sorter[positions[children]], children])
+
+    vertices = {'mutationId': mutation_ids, 'type_count': type_count, 'mutation_count': mutation_count}
+    return vertices, edges, np.flatnonzero(is_root)
+
+
+def arrow_to_graph(path, mutation_count_gt=None):
+    import igraph
+    vertices, edges, roots = tree_edges(path, mutation_count_gt)
+    graph = igraph.Graph(n=len(vertices['mutationId']), edges=edges.tolist())
+    graph.vs["mutationId"] = vertices['mutationId'].tolist()
+    graph.vs["type_count"] = vertices['type_count'].tolist()
+    graph.vs["mutation_count"] = vertices['mutation_count'].tolist()
+    return graph, roots
 
 
 def make_visual_style(graph):
@@ -31,7 +60,8 @@ def make_visual_style(graph):
 
 
 def mutation_tree_plot(data_path, output_path):
-    g, roots = arrow_to_graph(data_path)
+    import igraph
+    h, roots = arrow_to_graph(data_path, mutation_count_gt=MIN_MUTATION_COUNT)
 
     # g_layout = g.layout_reingold_tilford(root=[int(x) for x in roots])
     # visual_style = make_visual_style(g)
@@ -43,7 +73,6 @@ def mutation_tree_plot(data_path, output_path):
     #            bbox=(3840,1080), 
     #            **visual_style)
 
-    h = g.subgraph(g.vs.select(mutation_count_gt=100000))
     h_visual_style = make_visual_style(h)
     h_layout = h.layout_reingold_tilford("OUT")
 
@@ -53,6 +82,7 @@ def mutation_tree_plot(data_path, output_path):
                     inline=False,
                     bbox=(3840, 1080),
                     **h_visual_style)
+    return output_path
 
 
 if __name__ == "__main__":
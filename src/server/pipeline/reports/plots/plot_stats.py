@@ -4,7 +4,11 @@
 import fire
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
+
+from config.settings import REPORTS_PLOT_STATS_WORKERS
+from server.pipeline.reports import data_cache
+from server.pipeline.reports.plots import render_pool
+from server.pipeline.reports.plots.pyramid import save_figure
 
 plans = [
     {'columns': ['normalized_entropy']},
@@ -22,33 +26,57 @@ plans = [
 ]
 
 
-def plot_stats(input_file: str, time_file: str, output_path: str):
-    time = pd.read_parquet(time_file)
-    data = pd.read_parquet(input_file)
-
-    def plot_separately(columns, logy=False, unit=None):
-        fig = plt.figure()
-
-        if logy:
-            my_plot = plt.semilogy
-        else:
-            my_plot = plt.plot
-        for column in columns:
-            my_plot(data['time'], data[column], '-+', label=column)
-        if unit is not None:
-            plt.ylabel('[%s]' % unit, fontsize='small')
-        plt.grid(True)
-        plt.xlabel('time [in system]', fontsize='small')
-        # plt.ylim(0,2)
-        plt.legend()
-        out_file_name = output_path + '-'.join(columns) + '.png'
-        plt.savefig(out_file_name, bbox_inches='tight', dpi=150)
-        plt.close(fig)
+def plot_separately(data, output_path: str, columns, logy=False, unit=None) -> str:
+    """
+    Plots given columns against time and saves the plot
+    :param data: DataFrame or dict of arrays with 'time' and plotted columns
+    :param output_path: the output file prefix
+    :param columns: the plotted columns
+    :param logy: use logarithmic y axis
+    :param unit: the y axis unit
+    :return: path to saved plot
+    """
+    fig = plt.figure()
+
+    if logy:
+        my_plot = plt.semilogy
+    else:
+        my_plot = plt.plot
+    for column in columns:
+        my_plot(data['time'], data[column], '-+', label=column)
+    if unit is not None:
+        plt.ylabel('[%s]' % unit, fontsize='small')
+    plt.grid(True)
+    plt.xlabel('time [in system]', fontsize='small')
+    # plt.ylim(0,2)
+    plt.legend()
+    out_file_name = output_path + '-'.join(columns) + '.png'
+    save_figure(fig, out_file_name, dpi=150)
+    plt.close(fig)
+    return out_file_name
+
+
+def plot_stats(input_file: str, time_file: str, output_path: str, workers: int = None):
+    """
+    Plots simulation statistics, one plot per plan
+    :param input_file: the *_stats_scalars.parquet file
+    :param time_file: the time_points.parquet file
+    :param output_path: the output file prefix
+    :param workers: number of processes rendering plans concurrently, REPORTS_PLOT_STATS_WORKERS if None,
+        plans are rendered in current process if 0 or 1
+    :return: paths to saved plots
+    """
+    time = data_cache.read_frame(time_file)
+    data = data_cache.read_frame(input_file)
 
     data.insert(0, "normalized_entropy", data['entropy'] / np.log2(data['cloneCount']))
     data.insert(0, "time", time)
-    for plan in plans:
-        plot_separately(**plan)
+
+    workers = REPORTS_PLOT_STATS_WORKERS if workers is None else workers
+    if workers > 1:
+        return render_pool.render_plans(data, plans, output_path, workers)
+
+    return [plot_separately(data, output_path, **plan) for plan in plans]
 
 
 if __name__ == '__main__':
@@ -0,0 +1,79 @@
+"""
+Saving plots together with downscaled variants.
+
+The figure is drawn once on Agg canvas at the target dpi. The full resolution image is cropped from the
+canvas to the tight bounding box (like savefig with bbox_inches='tight'), and the preview and thumbnail
+are downscaled from the same in-memory image, so no second render pass is needed. Variants are saved
+under the same file name in sibling directories of the plot, ex. plots/thumbnails/muller_plot_x.png.
+Size of the full resolution image is recorded in the manifest, see manifest.record_image_size.
+"""
+import math
+import os
+from collections import OrderedDict
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL import Image
+
+from server.pipeline.reports.manifest import record_image_size
+
+# resolution name -> maximum width in pixels, from largest
+RESOLUTIONS = OrderedDict([
+    ('preview', 1280),
+    ('thumbnail', 320),
+])
+
+
+def variant_dir(plot_dir: str, resolution: str) -> str:
+    return os.path.join(plot_dir, resolution + 's')
+
+
+def variant_path(plot_path: str, resolution: str) -> str:
+    """
+    Returns path to downscaled variant of the plot
+    :param plot_path: path to full resolution plot
+    :param resolution: one of RESOLUTIONS
+    :return:
+    """
+    plot_dir, name = os.path.split(plot_path)
+    return os.path.join(variant_dir(plot_dir, resolution), name)
+
+
+def save_figure(fig, output_file: str, dpi: int = 150, pad_inches: float = 0.1) -> str:
+    """
+    Saves figure as png with tight bounding box, and its downscaled variants
+    :param fig: the matplotlib figure
+    :param output_file: the output path, .png is appended if it has no extension
+    :param dpi: the resolution of full size plot
+    :param pad_inches: padding around tight bounding box
+    :return: path to full resolution plot
+    """
+    if not os.path.splitext(output_file)[1]:
+        output_file += '.png'
+
+    fig.set_dpi(dpi)
+    canvas = fig.canvas if isinstance(fig.canvas, FigureCanvasAgg) else FigureCanvasAgg(fig)
+    canvas.draw()
+    width, height = canvas.get_width_height()
+    bbox = fig.get_tightbbox(canvas.get_renderer()).padded(pad_inches)
+
+    # bbox is in inches from the bottom left corner, image rows start at the top
+    left = max(int(math.floor(bbox.x0 * dpi)), 0)
+    right = min(int(math.ceil(bbox.x1 * dpi)), width)
+    top = max(height - int(math.ceil(bbox.y1 * dpi)), 0)
+    bottom = min(height - int(math.floor(bbox.y0 * dpi)), height)
+
+    image = Image.frombuffer('RGBA', (width, height), canvas.buffer_rgba(), 'raw', 'RGBA', 0, 1)
+    image = image.crop((left, top, right, bottom))
+    image.save(output_file)
+    record_image_size(output_file, image.width, image.height)
+
+    # Resolutions are ordered from largest, each variant is downscaled from the previous one
+    for resolution, max_width in RESOLUTIONS.items():
+        scale = min(max_width / float(image.width), 1.0)
+        size = (max(int(image.width * scale), 1), max(int(image.height * scale), 1))
+        image = image.resize(size, Image.LANCZOS)
+        path = variant_path(output_file, resolution)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        image.save(path)
+
+    return output_file
@@ -0,0 +1,78 @@
+"""
+Bounded process pool for rendering independent matplotlib plots concurrently.
+
+Report tasks run in daemonic celery prefork workers, which multiprocessing does not allow to have
+children, so the pool is billiard's - the celery fork of multiprocessing without this restriction. Worker
+processes are started with headless Agg backend and pyplot already imported, and live only for one render
+call, so no pool outlives the task. Input frame is not pickled for every job - its columns are written once
+to a memory mapped file in shared memory (/dev/shm when available), which the workers map read-only.
+"""
+import os
+import shutil
+import tempfile
+from typing import List
+
+import numpy as np
+import pandas as pd
+from billiard.pool import Pool
+
+SHARED_MEMORY_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def init_worker() -> None:
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot  # noqa: F401
+
+
+def share_frame(data: pd.DataFrame, columns: List[str], shared_dir: str) -> str:
+    """
+    Writes columns of the frame as float64 matrix to memory mapped file
+    :return: path to the file
+    """
+    path = os.path.join(shared_dir, 'frame.bin')
+    values = np.memmap(path, dtype=np.float64, mode='w+', shape=(data.shape[0], len(columns)))
+    for idx, column in enumerate(columns):
+        values[:, idx] = data[column].values
+    values.flush()
+    del values
+    return path
+
+
+def render_shared_plan(path: str, rows: int, columns: List[str], output_path: str, plan: dict) -> str:
+    from server.pipeline.reports.plots.plot_stats import plot_separately
+
+    values = np.memmap(path, dtype=np.float64, mode='r', shape=(rows, len(columns)))
+    data = {column: values[:, idx] for idx, column in enumerate(columns)}
+    return plot_separately(data, output_path, **plan)
+
+
+def render_plans(data: pd.DataFrame, plans: List[dict], output_path: str, workers: int) -> List[str]:
+    """
+    Renders plot_stats plans concurrently
+    :param data: the frame with 'time' column and all columns used by plans
+    :param plans: the plot_separately keyword arguments
+    :param output_path: the output file prefix
+    :param workers: maximum number of worker processes
+    :return: paths to rendered plots
+    """
+    columns = ['time'] + sorted({column for plan in plans for column in plan['columns']})
+    shared_dir = tempfile.mkdtemp(prefix='simbad-plots-', dir=SHARED_MEMORY_DIR)
+    try:
+        path = share_frame(data, columns, shared_dir)
+        pool = Pool(processes=min(workers, len(plans)), initializer=init_worker)
+        try:
+            results = [
+                pool.apply_async(render_shared_plan, (path, data.shape[0], columns, output_path, plan))
+                for plan in plans
+            ]
+            rendered = [result.get() for result in results]
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+        return rendered
+    finally:
+        shutil.rmtree(shared_dir, ignore_errors=True)
@@ -0,0 +1,134 @@
+"""
+Raster renderer for stack plots with thousands of layers.
+
+Instead of building one matplotlib polygon per layer, the stack is computed directly as a pixel grid:
+for every output column the cumulative layer fractions at that time are searched for the height
+of every pixel row, which gives the index of the layer covering the pixel. The layer indices are
+mapped through the layer colors and the resulting image is drawn with a single imshow call, so
+the axes and colorbar are the only vector elements left on the figure.
+"""
+import numpy as np
+from matplotlib.image import AxesImage
+
+PATH_RENDERER = 'path'
+RASTER_RENDERER = 'raster'
+
+# Number of image columns processed at once, bounds memory used by the band search
+COLUMN_CHUNK = 256
+
+
+def band_image(time: np.ndarray, fractions: np.ndarray, width: int, height: int, x_max: float,
+               y_max: float) -> np.ndarray:
+    """
+    Computes index of the stack layer covering each pixel
+    :param time: the time points, shape (n,)
+    :param fractions: the layer values, shape (n, layers)
+    :param width: image width in pixels
+    :param height: image height in pixels
+    :param x_max: time at the right edge of the image, left edge is 0
+    :param y_max: value at the top edge of the image, bottom edge is 0
+    :return: array of shape (height, width) with the layer index for every pixel, top row first. Pixels
+        above the stack get index equal to the number of layers
+    """
+    layers = fractions.shape[1]
+    xs = (np.arange(width) + 0.5) * (x_max / width)
+    ys = (np.arange(height) + 0.5) * (y_max / height)
+
+    # time point shown in every column - the last one at or before column center
+    columns = np.clip(np.searchsorted(time, xs, side='right') - 1, 0, time.shape[0] - 1)
+
+    bands = np.empty((width, height), dtype=np.int32)
+    for start in range(0, width, COLUMN_CHUNK):
+        end = min(start + COLUMN_CHUNK, width)
+        cumulative = np.cumsum(fractions[columns[start:end]], axis=1)
+        # Offset every column, so that one sorted search over flattened array answers all columns
+        span = max(float(cumulative[:, -1].max()), y_max) + 1.0
+        offsets = np.arange(end - start, dtype=np.float64)[:, None] * span
+        flat = (cumulative + offsets).ravel()
+        queries = (ys[None, :] + offsets).ravel()
+        found = np.searchsorted(flat, queries, side='right').reshape(end - start, height)
+        bands[start:end] = found - np.arange(end - start)[:, None] * layers
+
+    return bands.T[::-1]
+
+
+class StackImage(AxesImage):
+    """
+    Image of RasterStack, rasterized at the size the axes have when the figure is drawn. The axes can still
+    shrink after the stack is added, ex. when the colorbar takes part of the figure, and the image is
+    never resampled to the final axes size
+    """
+    def __init__(self, stack: 'RasterStack', ax, **kwargs):
+        super().__init__(ax, **kwargs)
+        self.stack = stack
+
+    def draw(self, renderer, *args, **kwargs):
+        # The axes bbox is in pixels of the output, during savefig the figure has the saved dpi
+        width = max(int(round(self.axes.bbox.width)), 1)
+        height = max(int(round(self.axes.bbox.height)), 1)
+        self.set_data(self.stack.rgba(width, height))
+        super().draw(renderer, *args, **kwargs)
+
+
+class RasterStack:
+    """
+    Stack plot drawn as a single image on given axes. Layer colors can be swapped without
+    recomputing the layer geometry.
+    """
+    def __init__(self, ax, time: np.ndarray, fractions: np.ndarray, y_max: float = None):
+        self.time = time
+        self.fractions = fractions
+        self.x_max = float(time.max())
+        self.y_max = float(fractions.max()) if y_max is None else y_max
+        self.layers = fractions.shape[1]
+        self.bands = None
+        self.palette = None
+        self.image = None
+        self.ax = ax
+
+    def layer_bands(self, width: int, height: int) -> np.ndarray:
+        """
+        Returns layer index of every pixel, computed again only when the size changes
+        """
+        if self.bands is None or self.bands.shape != (height, width):
+            self.bands = band_image(self.time, self.fractions, width, height, self.x_max, self.y_max)
+        return self.bands
+
+    def rgba(self, width: int, height: int) -> np.ndarray:
+        return self.palette[self.layer_bands(width, height)]
+
+    def set_colors(self, colors, background=(1.0, 1.0, 1.0, 0.0)) -> None:
+        """
+        Colors image by layer colors, cycling through colors if there are fewer colors than layers
+        :param colors: sequence of RGBA colors in 0.0-1.0 range
+        :param background: color of pixels above the stack
+        """
+        colors = np.asarray(colors, dtype=np.float64)
+        palette = np.empty((self.layers + 1, 4), dtype=np.uint8)
+        palette[:-1] = np.round(colors[np.arange(self.layers) % colors.shape[0]] * 255.0)
+        palette[-1] = np.round(np.asarray(background) * 255.0)
+        self.palette = palette
+
+        if self.image is None:
+            self.image = StackImage(self, self.ax, interpolation='nearest', origin='upper')
+            self.image.set_data(self.rgba(max(int(self.ax.bbox.width), 1), max(int(self.ax.bbox.height), 1)))
+            self.ax.add_image(self.image)
+            self.image.set_extent((0.0, self.x_max, 0.0, self.y_max))
+            self.ax.set_aspect('auto')
+        else:
+            self.image.stale = True
+
+
+def raster_stackplot(ax, time: np.ndarray, fractions: np.ndarray, colors, y_max: float = None) -> RasterStack:
+    """
+    Raster counterpart of matplotlib stackplot, the image has one pixel per output pixel of the axes
+    :param ax: the axes to draw on
+    :param time: the time points, shape (n,)
+    :param fractions: the layer values, shape (n, layers)
+    :param colors: the layer colors
+    :param y_max: value at the top of the axes, max of fractions if None
+    :return:
+    """
+    stack = RasterStack(ax, time, fractions, y_max)
+    stack.set_colors(colors)
+    return stack
@@ -0,0 +1,95 @@
+"""
+Render worker mode for celery workers executing report tasks.
+
+When SIMBAD_RENDER_WORKER is enabled, every worker process imports and warms up the plotting stack once
+on startup - selects the Agg backend, loads the font cache, builds the used colormaps and draws a
+throwaway figure - and keeps it across tasks. After each render task only the figure state is reset.
+When SIMBAD_RENDER_QUEUE is set, render tasks are routed to that queue, so they can be consumed by
+dedicated render workers, ex:
+    SIMBAD_RENDER_WORKER=1 celery worker -A entrypoint_celery.celery -Q render
+"""
+import logging
+from typing import List
+
+from celery import Celery
+from celery.signals import worker_process_init, task_postrun
+
+from config.settings import SIMBAD_RENDER_WORKER, SIMBAD_RENDER_QUEUE
+
+logger = logging.getLogger()
+
+WARM_COLORMAPS = ['nipy_spectral', 'inferno']
+
+_render_task_names = set()
+_rc_params = None
+
+
+def warm_up() -> None:
+    """
+    Imports plotting stack and initializes the state that is otherwise built lazily on first plot
+    :return:
+    """
+    global _rc_params
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib import font_manager
+
+    font_manager.findfont(font_manager.FontProperties(family=matplotlib.rcParams['font.family']))
+    for name in WARM_COLORMAPS:
+        plt.get_cmap(name)(0.5)
+
+    # Drawing initializes renderer, text layout and tick formatting caches
+    fig = plt.figure()
+    plt.plot([0, 1], [0, 1], label='warm up')
+    plt.xlabel('warm up', fontsize='xx-large')
+    plt.legend()
+    fig.canvas.draw()
+    plt.close(fig)
+
+    # Import report modules, so tasks only pay for the actual drawing
+    from server.pipeline.reports.plots import mullerplot_histogram_matplotlib, mullerplot_matplotlib, \
+        mutation_histogram, mutation_tree_plot, plot_stats  # noqa: F401
+    from server.pipeline.reports.pdf import simulation_report  # noqa: F401
+    from server.pipeline.reports.model import las  # noqa: F401
+
+    _rc_params = matplotlib.rcParams.copy()
+    logger.info('render worker warmed up')
+
+
+def reset_figure_state() -> None:
+    """
+    Closes figures left by previous task and restores rcParams from warm up
+    :return:
+    """
+    import matplotlib
+    import matplotlib.pyplot as plt
+    plt.close('all')
+    if _rc_params is not None:
+        matplotlib.rcParams.update(_rc_params)
+
+
+def on_worker_process_init(**kwargs) -> None:
+    warm_up()
+
+
+def on_task_postrun(sender=None, **kwargs) -> None:
+    if sender is not None and sender.name in _render_task_names:
+        reset_figure_state()
+
+
+def configure(celery: Celery, task_names: List[str]) -> None:
+    """
+    Routes render tasks to SIMBAD_RENDER_QUEUE and, in render worker mode, connects warm up and reset handlers
+    :param celery: the reports celery app
+    :param task_names: names of tasks rendering plots
+    :return:
+    """
+    _render_task_names.update(task_names)
+
+    if SIMBAD_RENDER_QUEUE:
+        celery.conf.task_routes = {name: {'queue': SIMBAD_RENDER_QUEUE} for name in task_names}
+
+    if SIMBAD_RENDER_WORKER:
+        worker_process_init.connect(on_worker_process_init, weak=False)
+        task_postrun.connect(on_task_postrun, weak=False)
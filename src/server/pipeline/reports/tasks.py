@@ -3,59 +3,118 @@ import logging
 import os
 import shutil
 from os.path import join, isfile
-from typing import List
+from typing import List, Set
 
-from celery import Celery, chain, chord
+from celery import Celery, chord, group
 
+from config.settings import REPORTS_PLOT_RENDERER, REPORTS_PLOT_MAX_POINTS, REPORTS_MODEL_PER_PARAMETER, \
+    REPORTS_PREVIEW_MODEL_POINTS, SIMBAD_RESULT_CACHE
 from database import db_session
 from models.artifact import Artifact
 from models.simulation import Simulation
 from models.simulation_step import SimulationStep
-from server.pipeline.reports.model.las import build_models
-from server.pipeline.reports.pdf.simulation_report import build_summary_report, SUMMARY_REPORT_NAME
-from server.pipeline.reports.plots.mullerplot_histogram_matplotlib import histogram_plots
-from server.pipeline.reports.plots.mullerplot_matplotlib import muller_plots
-from server.pipeline.reports.plots.mutation_histogram import histogram_plot as mutation_histogram_plot
-from server.pipeline.reports.plots.mutation_tree_plot import mutation_tree_plot
-from server.pipeline.reports.plots.plot_stats import plot_stats
+from server.artifacts.utils import path_leaf
+from server.pipeline.reports.manifest import render_cached, clear_manifest
+from server.pipeline.simulation.result_cache import store_result, unshare_tree
+from server.pipeline.util.progress import ProgressReporter
+
+# Plotting, pdf and model modules (matplotlib, reportlab, laspy, igraph) are imported inside the tasks,
+# so that the api process, which only sends these tasks, does not pay for importing them. Render workers
+# import them once on startup, see render_worker.warm_up
 
 logger = logging.getLogger()
 celery = Celery(__name__, autofinalize=False)
 
-
-def index_plots(out_dir: str, simulation_id: int, step_id: int) -> List[Artifact]:
+HISTOGRAM_PARAM_NAMES = [
+    'birthEfficiency',
+    'birthResistance',
+    'lifespanEfficiency',
+    'lifespanResistance',
+    'successEfficiency',
+    'successResistance',
+]
+
+# Tasks drawing plots, routed to render workers when SIMBAD_RENDER_QUEUE is set
+RENDER_TASK_NAMES = [
+    'SIMBAD-ALL-CLONES-PLOTS-STATS',
+    'ALL-CLONES-MULLERPLOT-HISTOGRAM',
+    'SIMBAD-NOISE-PLOTS-STATS',
+    'NOISE-MULLERPLOT-HISTOGRAM',
+    'SIMBAD-MAJOR-CLONES-PLOTS-STATS',
+    'MAJOR-CLONES-MULLERPLOT-HISTOGRAM',
+    'MULLERPLOT',
+    'MUTATION-HISTOGRAM',
+    'MUTATION-TREE',
+]
+
+
+def index_plots(out_dir: str, simulation_id: int, step_id: int, skip: Set[str] = None) -> List[Artifact]:
     """
     Get paths and file sizes of all plot images in directory
     :param simulation_id:
     :param step_id:
     :param out_dir:
+    :param skip: paths of plots that are already indexed, see indexed_paths
     :return:
     """
-    artifact_file_names: List[str] = [f for f in os.listdir(out_dir) if isfile(join(out_dir, f))]
+    skip = skip or set()
+    artifact_file_names: List[str] = [
+        f for f in os.listdir(out_dir) if isfile(join(out_dir, f)) and f.endswith('.png')
+    ]
     plot_artifacts: list = []
     for plot_name in artifact_file_names:
         plot_path = out_dir + "/" + plot_name
-        if os.path.exists(plot_path):
-            plot_artifacts.append(
+        if os.path.exists(plot_path) and plot_path not in skip:
+            plot = Artifact(
+                path=plot_path,
+                name=plot_name,
+                size_kb=os.path.getsize(plot_path),
+                simulation_id=simulation_id,
+                step_id=step_id,
+                created_utc=datetime.datetime.fromtimestamp(os.path.getmtime(plot_path)),
+                file_type="PNG",
+                resolution="full"
+            )
+            plot.variants = index_plot_variants(plot_path, simulation_id)
+            plot_artifacts.append(plot)
+    return plot_artifacts
+
+
+def index_plot_variants(plot_path: str, simulation_id: int) -> List[Artifact]:
+    """
+    Get downscaled variants of plot image. Variants are not attached to step, so that they are not listed
+    with step artifacts, and are reachable through the full resolution plot artifact
+    :param plot_path:
+    :param simulation_id:
+    :return:
+    """
+    from server.pipeline.reports.plots.pyramid import RESOLUTIONS, variant_path
+    variants = []
+    for resolution in RESOLUTIONS:
+        path = variant_path(plot_path, resolution)
+        if isfile(path):
+            variants.append(
                 Artifact(
-                    path=plot_path,
-                    name=plot_name,
-                    size_kb=os.path.getsize(plot_path),
+                    path=path,
+                    name=path_leaf(path),
+                    size_kb=os.path.getsize(path),
                     simulation_id=simulation_id,
-                    step_id=step_id,
-                    created_utc=datetime.datetime.fromtimestamp(os.path.getmtime(plot_path)),
-                    file_type="PNG"
+                    created_utc=datetime.datetime.fromtimestamp(os.path.getmtime(path)),
+                    file_type="PNG",
+                    resolution=resolution
                 )
             )
-    return plot_artifacts
+    return variants
 
 
-def index_reports(out_dir: str, simulation_id: int, step_id: int) -> List[Artifact]:
+def index_reports(out_dir: str, simulation_id: int, step_id: int, skip: Set[str] = None) -> List[Artifact]:
+    from server.pipeline.reports.pdf.simulation_report import SUMMARY_REPORT_NAME
+    skip = skip or set()
     report_artifacts = []
     report_names = [SUMMARY_REPORT_NAME]
     for report in report_names:
         path = join(out_dir, report)
-        if isfile(path):
+        if isfile(path) and path not in skip:
             report_artifacts.append(
                 Artifact(
                     path=path,
@@ -71,8 +130,46 @@ def index_reports(out_dir: str, simulation_id: int, step_id: int) -> List[Artifa
     return report_artifacts
 
 
+def indexed_paths(simulation_id: int) -> Set[str]:
+    """
+    Returns paths of artifacts of simulation, outputs of reports run again are not indexed twice
+    """
+    return {path for path, in db_session.query(Artifact.path).filter(Artifact.simulation_id == simulation_id)}
+
+
+def plots_dir(workdir: str) -> str:
+    return join(workdir, 'plots')
+
+
+def snapshot_path(workdir: str) -> str:
+    return join(workdir, 'output_data', 'final_snapshot.csv')
+
+
+def plot_params(renderer: str) -> dict:
+    """
+    Returns settings that affect the output of stack plots, recorded in plots manifest
+    """
+    return {'renderer': renderer or REPORTS_PLOT_RENDERER, 'max_points': REPORTS_PLOT_MAX_POINTS}
+
+
+def histogram_signatures(histogram_task, workdir: str) -> list:
+    """
+    Returns immutable signatures of mullerplot histogram task, one for each histogram parameter
+    :param histogram_task: one of *_mullerplot_histogram tasks
+    :param workdir:
+    :return:
+    """
+    return [histogram_task.si(workdir, name) for name in HISTOGRAM_PARAM_NAMES]
+
+
 @celery.task(bind=True, name='SIMBAD-PLOTS-MAIN')
-def reports_step(self, simulation_id: int) -> None:
+def reports_step(self, simulation_id: int, force: bool = False) -> None:
+    """
+    Starts all report tasks for simulation
+    :param simulation_id:
+    :param force: render all outputs, even those whose inputs did not change since last run
+    :return:
+    """
     start_time = datetime.datetime.utcnow()
 
     simulation: Simulation = db_session.query(Simulation).get(simulation_id)
@@ -86,6 +183,10 @@ def reports_step(self, simulation_id: int) -> None:
 
     if not os.path.exists(output_path):
         os.makedirs(output_path)
+    if force:
+        clear_manifest(output_path)
+    # Outputs are written in place, files shared with result cache must not change
+    unshare_tree(workdir)
 
     simulation.current_step = "REPORT"
     simulation.current_step_id = step.id
@@ -93,183 +194,194 @@ def reports_step(self, simulation_id: int) -> None:
     db_session.begin()
     db_session.add_all([simulation, step])
     db_session.commit()
-
-    result = chain(
-        all_clones_plot_stats.s(workdir),
-        all_clones_mullerplot.s(),
-        noise_plot_stats.s(),
-        major_clones_plot_stats.s(),
-        major_clones_mullerplot.s(),
-        mullerplot.s(),
-        mutation_histogram.s(),
-        simulation_report.s(),
-        build_cell_model.s(),
-        save_results_and_cleanup.s(simulation_id, step.id, workdir),
-    ).apply_async()
+    ProgressReporter(simulation.id, step.id, 'REPORT').update(status='ONGOING')
+
+    # Plots and models are independent of each other and run in parallel in a single chord. The summary
+    # report needs all plots, so it runs in the chord callback, and results are saved after it. The
+    # downsampled preview model is sent first, so it can be viewed while the full model is built. Failure of any
+    # task fails the chord body, and its error callback marks the step failed
+    header = group(
+        build_preview_model.si(workdir),
+        all_clones_plot_stats.si(workdir),
+        noise_plot_stats.si(workdir),
+        major_clones_plot_stats.si(workdir),
+        *histogram_signatures(all_clones_mullerplot_histogram, workdir),
+        *histogram_signatures(major_clones_mullerplot_histogram, workdir),
+        mullerplot.si(workdir),
+        mutation_histogram.si(workdir),
+        build_cell_model.si(workdir, with_preview=True),
+        lineage_index.si(workdir),
+    )
+    body = simulation_report.si(workdir) | save_results_and_cleanup.s(simulation_id, step.id, workdir)
+    body.link_error(report_failed.s(simulation_id, step.id))
+    result = chord(header, body).apply_async()
     return result
 
 
 @celery.task(bind=True, name='SIMBAD-ALL-CLONES-PLOTS-STATS')
 def all_clones_plot_stats(self, workdir: str):
+    from server.pipeline.reports.plots.plot_stats import plot_stats
     print(workdir)
     input_file: str = workdir + "/output_data/clone_stats_scalars.parquet"
     time_file: str = workdir + "/output_data/time_points.parquet"
 
     output_path: str = workdir + "/plots/"
 
-    plot_stats(input_file, time_file, output_path)
-    return workdir
-
-
-@celery.task(bind=True, name='SIMBAD-ALL-CLONES-MULLERPLOT-STATS')
-def all_clones_mullerplot(self, workdir: str):
-    param_names = [
-        'birthEfficiency',
-        'birthResistance',
-        'lifespanEfficiency',
-        'lifespanResistance',
-        'successEfficiency',
-        'successResistance',
-    ]
-    tasks = []
-    for name in param_names:
-        tasks.append(all_clones_mullerplot_histogram.s(workdir, name))
-    chord(tasks, chordfinisher.si()).apply_async()
+    render_cached(plots_dir(workdir), output_path, [input_file, time_file], {},
+                  lambda: plot_stats(input_file, time_file, output_path))
     return workdir
 
 
 @celery.task(bind=True, name='ALL-CLONES-MULLERPLOT-HISTOGRAM')
-def all_clones_mullerplot_histogram(self, workdir: str, param_name: str):
+def all_clones_mullerplot_histogram(self, workdir: str, param_name: str, renderer: str = None):
+    from server.pipeline.reports.plots.mullerplot_histogram_matplotlib import histogram_plots
     input_csv_file = "{}/output_data/histogram_{}.csv".format(workdir, param_name)
     time_parquet = "{}/output_data/time_points.parquet".format(workdir)
     stats_parquet = "{}/output_data/clone_stats_scalars.parquet".format(workdir)
     output_file = "{}/plots/histogram-{}".format(workdir, param_name)
-    histogram_plots(input_csv_file, param_name, time_parquet, stats_parquet, output_file)
+    render_cached(
+        plots_dir(workdir), output_file, [input_csv_file, time_parquet, stats_parquet], plot_params(renderer),
+        lambda: histogram_plots(input_csv_file, param_name, time_parquet, stats_parquet, output_file, renderer=renderer)
+    )
 
 
 @celery.task(bind=True, name='SIMBAD-NOISE-PLOTS-STATS')
 def noise_plot_stats(self, workdir: str):
+    from server.pipeline.reports.plots.plot_stats import plot_stats
     input_file: str = workdir + "/output_data/noise_stats_scalars.parquet"
     time_file: str = workdir + "/output_data/time_points.parquet"
     output_path: str = workdir + "/plots/noise-"
-    plot_stats(input_file, time_file, output_path)
-    return workdir
-
-
-@celery.task(bind=True, name='SIMBAD-NOISE-MULLERPLOT-STATS')
-def noise_mullerplot(self, workdir: str):
-    param_names = [
-        'birthEfficiency',
-        'birthResistance',
-        'lifespanEfficiency',
-        'lifespanResistance',
-        'successEfficiency',
-        'successResistance',
-    ]
-
-    tasks = []
-    for name in param_names:
-        tasks.append(noise_mullerplot_histogram.s(workdir, name))
-    chord(tasks, chordfinisher.si()).apply_async()
+    render_cached(plots_dir(workdir), output_path, [input_file, time_file], {},
+                  lambda: plot_stats(input_file, time_file, output_path))
     return workdir
 
 
 @celery.task(bind=True, name='NOISE-MULLERPLOT-HISTOGRAM')
-def noise_mullerplot_histogram(self, workdir: str, param_name: str):
+def noise_mullerplot_histogram(self, workdir: str, param_name: str, renderer: str = None):
+    from server.pipeline.reports.plots.mullerplot_histogram_matplotlib import histogram_plots
     input_csv_file = "{}/output_data/noise_histogram_{}.csv".format(workdir, param_name)
     time_parquet = "{}/output_data/time_points.parquet".format(workdir)
     stats_parquet = "{}/output_data/noise_stats_scalars.parquet".format(workdir)
     output_file = "{}/plots/noise-histogram-{}".format(workdir, param_name)
-    histogram_plots(input_csv_file, param_name, time_parquet, stats_parquet, output_file)
+    render_cached(
+        plots_dir(workdir), output_file, [input_csv_file, time_parquet, stats_parquet], plot_params(renderer),
+        lambda: histogram_plots(input_csv_file, param_name, time_parquet, stats_parquet, output_file, renderer=renderer)
+    )
 
 
 @celery.task(bind=True, name='SIMBAD-MAJOR-CLONES-PLOTS-STATS')
 def major_clones_plot_stats(self, workdir: str):
+    from server.pipeline.reports.plots.plot_stats import plot_stats
     input_file: str = workdir + "/output_data/major_stats_scalars.parquet"
     time_file: str = workdir + "/output_data/time_points.parquet"
     output_path: str = workdir + "/plots/major-"
-    plot_stats(input_file, time_file, output_path)
-    return workdir
-
-
-@celery.task(bind=True, name='SIMBAD-MAJOR-CLONES-MULLERPLOT-STATS')
-def major_clones_mullerplot(self, workdir: str):
-    param_names = [
-        'birthEfficiency',
-        'birthResistance',
-        'lifespanEfficiency',
-        'lifespanResistance',
-        'successEfficiency',
-        'successResistance',
-    ]
-
-    tasks = []
-    for name in param_names:
-        tasks.append(major_clones_mullerplot_histogram.s(workdir, name))
-    chord(tasks, chordfinisher.si()).apply_async()
+    render_cached(plots_dir(workdir), output_path, [input_file, time_file], {},
+                  lambda: plot_stats(input_file, time_file, output_path))
     return workdir
 
 
 @celery.task(bind=True, name='MAJOR-CLONES-MULLERPLOT-HISTOGRAM')
-def major_clones_mullerplot_histogram(self, workdir: str, param_name: str):
+def major_clones_mullerplot_histogram(self, workdir: str, param_name: str, renderer: str = None):
+    from server.pipeline.reports.plots.mullerplot_histogram_matplotlib import histogram_plots
     input_csv_file = "{}/output_data/major_histogram_{}.csv".format(workdir, param_name)
     time_parquet = "{}/output_data/time_points.parquet".format(workdir)
     stats_parquet = "{}/output_data/major_stats_scalars.parquet".format(workdir)
     output_file = "{}/plots/major-histogram-{}".format(workdir, param_name)
-    histogram_plots(input_csv_file, param_name, time_parquet, stats_parquet, output_file)
+    render_cached(
+        plots_dir(workdir), output_file, [input_csv_file, time_parquet, stats_parquet], plot_params(renderer),
+        lambda: histogram_plots(input_csv_file, param_name, time_parquet, stats_parquet, output_file, renderer=renderer)
+    )
     return output_file
 
 
 @celery.task(bind=True, name='MULLERPLOT')
-def mullerplot(self, workdir: str):
+def mullerplot(self, workdir: str, renderer: str = None):
+    from server.pipeline.reports.plots.mullerplot_matplotlib import muller_plots
     input_file = "{}/output_data/muller_data.parquet".format(workdir)
     stats_file = "{}/output_data/clone_stats_scalars.parquet".format(workdir)
     params_file = "{}/output_data/large_clones.parquet".format(workdir)
     large_muller_order = "{}/output_data/large_muller_order.parquet".format(workdir)
     output_prefix: str = workdir + "/plots/muller_plot_"
-    muller_plots(input_file, stats_file, params_file, large_muller_order, output_prefix)
+    render_cached(
+        plots_dir(workdir), output_prefix, [input_file, stats_file, params_file, large_muller_order],
+        plot_params(renderer),
+        lambda: muller_plots(input_file, stats_file, params_file, large_muller_order, output_prefix, renderer=renderer)
+    )
     return workdir
 
 
 @celery.task(bind=True, name='MUTATION-HISTOGRAM')
 def mutation_histogram(self, workdir: str):
+    from server.pipeline.reports.plots.mutation_histogram import histogram_plot as mutation_histogram_plot
     input_file = "{}/output_data/large_final_mutations.parquet".format(workdir)
     threshold = 11
     output_file: str = workdir + "/plots/mutation_histogram.png"
-    mutation_histogram_plot(input_file, threshold, output_file)
+    render_cached(plots_dir(workdir), output_file, [input_file], {'threshold': threshold},
+                  lambda: mutation_histogram_plot(input_file, threshold, output_file))
     return workdir
 
 
 @celery.task(bind=True, name='SIMULATION-SUMMARY-REPORT')
 def simulation_report(self, workdir: str):
+    from server.pipeline.reports.pdf.simulation_report import build_summary_report, SUMMARY_REPORT_NAME
     output_path: str = join(workdir, 'reports')
     plot_path: str = join(workdir, 'plots')
     if not os.path.exists(output_path):
         os.mkdir(output_path)
     plots: List[Artifact] = index_plots(plot_path, -1, -1)
-    build_summary_report(plots, output_path)
+    render_cached(plot_path, SUMMARY_REPORT_NAME, [plot.path for plot in plots], {},
+                  lambda: build_summary_report(plots, output_path))
+    return workdir
+
+
+@celery.task(bind=True, name='CELL-MODEL-PREVIEW')
+def build_preview_model(self, workdir: str):
+    from server.pipeline.reports.model.preview import build_preview_model as build_preview, PREVIEW_MODEL_NAME
+    unshare_tree(os.path.join(workdir, 'models'))
+    output = os.path.join(workdir, 'models', PREVIEW_MODEL_NAME)
+    render_cached(plots_dir(workdir), output, [snapshot_path(workdir)], {'points': REPORTS_PREVIEW_MODEL_POINTS},
+                  lambda: build_preview(workdir))
     return workdir
 
 
 @celery.task(bind=True, name='CELL-MODEL')
-def build_cell_model(self, workdir: str):
-    build_models(workdir)
+def build_cell_model(self, workdir: str, with_preview: bool = False):
+    from server.pipeline.reports.model.las import build_models, CELL_MODEL_NAME
+    from server.pipeline.reports.model.preview import full_model_cpu_budget
+    unshare_tree(os.path.join(workdir, 'models'))
+    output = os.path.join(workdir, 'models', CELL_MODEL_NAME)
+    # The preview model built at the same time takes its share of the cpu budget
+    render_cached(plots_dir(workdir), output, [snapshot_path(workdir)], {'perParameter': REPORTS_MODEL_PER_PARAMETER},
+                  lambda: build_models(workdir, cpu_budget=full_model_cpu_budget() if with_preview else None))
+    return workdir
+
+
+@celery.task(bind=True, name='LINEAGE-INDEX')
+def lineage_index(self, workdir: str):
+    from server.pipeline.lineage.index import build_lineage_index, index_path
+    data_path = "{}/output_data/large_final_mutations.parquet".format(workdir)
+    output_file = index_path(workdir)
+    render_cached(plots_dir(workdir), output_file, [data_path], {},
+                  lambda: build_lineage_index(data_path, output_file))
     return workdir
 
 
 @celery.task(bind=True, name='MUTATION-TREE')
 def mutation_tree(self, workdir: str):
+    from server.pipeline.reports.plots.mutation_tree_plot import mutation_tree_plot
     data_path = "{}/output_data/large_final_mutations.parquet".format(workdir)
     output_file: str = workdir + "/plots/mutation-tree.png"
-    mutation_tree_plot(data_path, output_file)
+    render_cached(plots_dir(workdir), output_file, [data_path], {},
+                  lambda: mutation_tree_plot(data_path, output_file))
     return workdir
 
 
 @celery.task(name='SAVE-RESULT')
 def save_results_and_cleanup(plots, simulation_id: int, step_id: int, workdir: str):
     output_path: str = workdir + "/plots/"
-    plots: List[Artifact] = index_plots(output_path, simulation_id, step_id)
-    reports: List[Artifact] = index_reports(workdir + "/reports/", simulation_id, step_id)
+    indexed = indexed_paths(simulation_id)
+    plots: List[Artifact] = index_plots(output_path, simulation_id, step_id, skip=indexed)
+    reports: List[Artifact] = index_reports(workdir + "/reports/", simulation_id, step_id, skip=indexed)
 
     simulation: Simulation = db_session.query(Simulation).get(simulation_id)
     step: SimulationStep = db_session.query(SimulationStep).get(step_id)
@@ -286,23 +398,66 @@ def save_results_and_cleanup(plots, simulation_id: int, step_id: int, workdir: s
     db_session.add_all([simulation, step])
     db_session.commit()
     cleanup(workdir)
+    ProgressReporter(simulation_id, step_id, 'REPORT').update(status='SUCCESS', progress=100)
+    if SIMBAD_RESULT_CACHE:
+        try:
+            store_result(simulation)
+        except OSError as e:
+            # The simulation succeeded, only later identical submissions will not reuse it
+            print('Could not cache results of simulation {}: {}'.format(simulation_id, e))
     return workdir
 
 
-def cleanup(workdir: str):
-    # cli output
-    cli_output = os.path.join(workdir, 'cli_out.csv')
-    os.remove(cli_output)
+@celery.task(name='REPORT-FAILED')
+def report_failed(request, exc, traceback, simulation_id: int, step_id: int):
+    """
+    Error callback of report chord, marks the step and simulation failed and publishes the final event
+    :param request: request of the failed task
+    :param exc: the task exception
+    :param traceback:
+    :param simulation_id:
+    :param step_id: the report step
+    :return:
+    """
+    logger.error('Report task {} of simulation {} failed: {}'.format(request.id if request else None,
+                                                                   simulation_id, exc))
+    simulation: Simulation = db_session.query(Simulation).get(simulation_id)
+    step: SimulationStep = db_session.query(SimulationStep).get(step_id)
+    db_session.flush()
 
-    # analyzer files
-    analyzer_output = os.path.join(workdir, 'output_data')
-    shutil.rmtree(analyzer_output)
-    analyzer_stream = os.path.join(workdir, 'stream.parquet')
-    shutil.rmtree(analyzer_stream)
+    db_session.begin()
+    end_time = datetime.datetime.utcnow()
+    simulation.finished_utc = end_time
+    simulation.status = 'FAILURE'
+    step.finished_utc = end_time
+    step.status = 'FAILURE'
+    db_session.add_all([simulation, step])
+    db_session.commit()
+    ProgressReporter(simulation_id, step_id, 'REPORT').update(status='FAILURE', error=str(exc))
+
+
+def cleanup(workdir: str):
+    # cli output, csv and/or parquet depending on SIMBAD_CLI_OUTPUT_FORMAT
+    for name in ['cli_out.csv', 'cli_out.parquet']:
+        cli_output = os.path.join(workdir, name)
+        if os.path.exists(cli_output):
+            os.remove(cli_output)
+
+    # cli output segments of pipelined mode
+    segments = os.path.join(workdir, 'cli_out_segments')
+    if os.path.exists(segments):
+        shutil.rmtree(segments)
+
+    # analyzer files, already removed when reports run again
+    for name in ['output_data', 'stream.parquet']:
+        analyzer_output = os.path.join(workdir, name)
+        if os.path.exists(analyzer_output):
+            shutil.rmtree(analyzer_output)
 
     # .las Models
     models_root_path = os.path.join(workdir, 'models')
-    remove_by_extension(models_root_path, '.las')
+    if os.path.exists(models_root_path):
+        remove_by_extension(models_root_path, '.las')
     return
 
 
@@ -314,9 +469,3 @@ def remove_by_extension(path: str, extension: str) -> None:
             os.remove(os.path.join(path, file))
     return
 
-
-@celery.task
-def chordfinisher(*args, **kwargs):
-    print(args)
-    print(kwargs)
-    return "OK"
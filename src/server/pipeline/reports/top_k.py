@@ -0,0 +1,125 @@
+"""
+Bounded-memory top-K queries over parquet outputs.
+
+Parquet file (or every file of a dataset directory) is streamed row group by row group, reading only
+the queried columns. At most K candidate rows are kept between row groups, selected with argpartition
+instead of a full sort. Row groups are visited from the one with the largest max statistic of the sort
+column, so once the smallest candidate is larger than the max of next row group, the remaining groups
+are skipped without being read. Memory and time scale with K and row group size, not with table size.
+
+Ties are resolved like a stable descending sort - the row earlier in the file wins.
+"""
+import os
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+
+def parquet_files(path: str) -> List[str]:
+    """
+    Returns the path itself for parquet file, or parquet files of dataset directory in read order
+    """
+    if not os.path.isdir(path):
+        return [path]
+    files = []
+    for root, dirs, names in os.walk(path):
+        dirs.sort()
+        files.extend(
+            os.path.join(root, name) for name in sorted(names) if not name.startswith(('.', '_'))
+        )
+    return files
+
+
+def column_max(metadata, row_group: int, column: str):
+    """
+    Returns max statistic of the column in row group, or None when statistics were not written
+    """
+    group = metadata.row_group(row_group)
+    for idx in range(group.num_columns):
+        chunk = group.column(idx)
+        if chunk.path_in_schema == column:
+            stats = chunk.statistics
+            if stats is not None and stats.has_min_max:
+                return stats.max
+            return None
+    raise KeyError(column)
+
+
+def top_indices(values: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns indices of k largest values, preferring lower indices among equal values
+    :param values: 1D array
+    :param k:
+    :return: indices in ascending order
+    """
+    if values.shape[0] <= k:
+        return np.arange(values.shape[0])
+    kth = np.partition(values, values.shape[0] - k)[values.shape[0] - k]
+    above = np.flatnonzero(values > kth)
+    equal = np.flatnonzero(values == kth)[:k - above.shape[0]]
+    return np.sort(np.concatenate([above, equal]))
+
+
+def top_k(path: str, sort_column: str, k: int, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Returns k rows with the largest values of sort_column, sorted descending
+    :param path: path to parquet file or dataset directory
+    :param sort_column: numeric column to rank rows by, null values are ignored
+    :param k: number of rows to return
+    :param columns: columns of the result, all columns by default
+    :return:
+    """
+    files = [pq.ParquetFile(file, memory_map=True) for file in parquet_files(path)]
+    if columns is None:
+        columns = files[0].schema.names if files else [sort_column]
+    read_columns = list(columns) if sort_column in columns else list(columns) + [sort_column]
+
+    # (max statistic, file, row group, offset of its first row) - offsets keep ties in file order
+    groups = []
+    offset = 0
+    for file in files:
+        metadata = file.metadata
+        for row_group in range(metadata.num_row_groups):
+            groups.append((column_max(metadata, row_group, sort_column), file, row_group, offset))
+            offset += metadata.row_group(row_group).num_rows
+    # Groups without statistics can not be skipped, so they are read last
+    groups.sort(key=lambda group: (group[0] is None, -group[0] if group[0] is not None else 0, group[3]))
+
+    rows = np.empty(0, dtype=np.int64)
+    candidates = None
+    for group_max, file, row_group, offset in groups:
+        if k <= 0:
+            break
+        if group_max is not None and rows.shape[0] == k:
+            threshold = candidates[sort_column].min()
+            if group_max < threshold:
+                continue
+
+        table = file.read_row_group(row_group, columns=read_columns)
+        data = {name: table.column(name).to_pandas().values for name in read_columns}
+        valid = ~pd.isnull(data[sort_column])
+        group_rows = offset + np.flatnonzero(valid)
+        if not valid.all():
+            data = {name: values[valid] for name, values in data.items()}
+
+        selected = top_indices(data[sort_column], k)
+        group_rows = group_rows[selected]
+        data = {name: values[selected] for name, values in data.items()}
+
+        if candidates is None:
+            rows, candidates = group_rows, data
+            continue
+        rows = np.concatenate([rows, group_rows])
+        candidates = {name: np.concatenate([candidates[name], data[name]]) for name in read_columns}
+        order = np.argsort(rows, kind='mergesort')
+        selected = order[top_indices(candidates[sort_column][order], k)]
+        rows = rows[selected]
+        candidates = {name: values[selected] for name, values in candidates.items()}
+
+    if candidates is None:
+        return pd.DataFrame({name: [] for name in columns}, columns=columns)
+    # Values are not negated, that would wrap around for unsigned columns
+    order = np.lexsort((-rows, candidates[sort_column]))[::-1]
+    return pd.DataFrame({name: candidates[name][order] for name in columns}, columns=columns)
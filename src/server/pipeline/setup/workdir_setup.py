@@ -1,12 +1,16 @@
 import datetime
 import json
 import os
+from typing import List, Tuple
 
 from config.settings import SIMBAD_DATA_PATH
 from database import db_session
 from models.artifact import Artifact
 from models.simulation import Simulation
 from models.simulation_step import SimulationStep
+from models.sweep import Sweep
+from server.pipeline.cli.scheduler import RESOURCES_NAME
+from server.pipeline.simulation.result_cache import config_hash
 
 
 def get_conf_name(name: str) -> str:
@@ -31,10 +35,26 @@ def create_workdir(simulation_id: int) -> str:
     return work_dir_path
 
 
+def write_configuration(workdir_path: str, conf_name: str, conf: dict, resources: dict = None) -> str:
+    """
+    Saves simulation configuration, and declared resources if any, in workdir
+    :return: path to the configuration file
+    """
+    conf_path = '{}/{}'.format(workdir_path, conf_name)
+    with open(conf_path, 'w+') as f:
+        json.dump(conf, f, indent=2)
+
+    if resources is not None:
+        # Declared footprint used by the local scheduler, see scheduler.run_footprint
+        with open(os.path.join(workdir_path, RESOURCES_NAME), 'w+') as f:
+            json.dump(resources, f)
+    return conf_path
+
+
 def setup_workdir(request_data: dict) -> Artifact:
     """
     Creates new dir for simulation and places simulation configuration file in it
-    :param request_data: Flask request with configuration
+    :param request_data: Flask request with configuration, and optional resources like {"cpu": 2, "memoryMb": 4096}
     :return: tuple with path to workdir and saved configuration
     """
     conf_name = get_conf_name(request_data['configurationName'])
@@ -42,7 +62,8 @@ def setup_workdir(request_data: dict) -> Artifact:
 
     start_time = datetime.datetime.utcnow()
 
-    simulation = Simulation(started_utc=start_time, name="test_simulation", current_step="CLI", status='ONGOING')
+    simulation = Simulation(started_utc=start_time, name="test_simulation", current_step="CLI", status='ONGOING',
+                            config_hash=config_hash(conf))
     db_session.add(simulation)
     db_session.flush()
     step = SimulationStep(started_utc=start_time, origin="CLI", simulation_id=simulation.id, status='ONGOING')
@@ -50,14 +71,11 @@ def setup_workdir(request_data: dict) -> Artifact:
     db_session.flush()
 
     workdir_path = create_workdir(simulation.id)
-    conf_path = '{}/{}'.format(workdir_path, conf_name)
+    conf_path = write_configuration(workdir_path, conf_name, conf, request_data.get('resources'))
 
     simulation.workdir = workdir_path
     simulation.current_step_id = step.id
 
-    with open(conf_path, 'w+') as f:
-        json.dump(conf, f, indent=2)
-
     configuration = Artifact(
         size_kb=os.path.getsize(conf_path),
         path=conf_path,
@@ -79,3 +97,57 @@ def setup_workdir(request_data: dict) -> Artifact:
     return configuration
 
 
+def setup_workdirs(configurations: List[Tuple[str, dict]], resources: dict = None,
+                   sweep: Sweep = None) -> List[Artifact]:
+    """
+    Creates dirs for many simulations at once, like setup_workdir. All rows are inserted in one transaction,
+    and every table is flushed once, instead of once per simulation
+    :param configurations: list of (configuration name, configuration)
+    :param resources: optional resources declared for every simulation
+    :param sweep: optional sweep the simulations belong to
+    :return: saved configurations, in order of configurations
+    """
+    start_time = datetime.datetime.utcnow()
+    db_session.begin()
+    try:
+        if sweep is not None:
+            db_session.add(sweep)
+        simulations = [
+            Simulation(started_utc=start_time, name="test_simulation", current_step="CLI", status='ONGOING',
+                       sweep=sweep, config_hash=config_hash(conf))
+            for _, conf in configurations
+        ]
+        db_session.add_all(simulations)
+        db_session.flush()
+
+        steps = [
+            SimulationStep(started_utc=start_time, origin="CLI", simulation_id=simulation.id, status='ONGOING')
+            for simulation in simulations
+        ]
+        db_session.add_all(steps)
+        db_session.flush()
+
+        artifacts = []
+        for (name, conf), simulation, step in zip(configurations, simulations, steps):
+            conf_name = get_conf_name(name)
+            workdir_path = create_workdir(simulation.id)
+            conf_path = write_configuration(workdir_path, conf_name, conf, resources)
+            simulation.workdir = workdir_path
+            simulation.current_step_id = step.id
+            artifacts.append(Artifact(
+                size_kb=os.path.getsize(conf_path),
+                path=conf_path,
+                created_utc=start_time,
+                step_id=step.id,
+                name=conf_name,
+                file_type='JSON',
+                simulation_id=simulation.id
+            ))
+        db_session.add_all(artifacts)
+        db_session.flush()
+        db_session.commit()
+    except Exception:
+        db_session.rollback()
+        raise
+
+    return artifacts
@@ -1,47 +1,194 @@
-from flask import Blueprint, jsonify, request
-from sqlalchemy import and_
+import datetime
+import json
+from typing import Dict, Iterator, List
 
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from sqlalchemy import and_, case
+
+from config.settings import SIMBAD_RESULT_CACHE, SIMBAD_PROGRESS_KEEPALIVE
 from database import db_session
 from models.artifact import Artifact
 from models.simulation import Simulation
 from models.simulation_step import SimulationStep
-from server.pipeline.setup.workdir_setup import setup_workdir
+from models.sweep import Sweep
+from server.pipeline.cli.scheduler import get_scheduler
+from server.pipeline.setup.workdir_setup import setup_workdir, setup_workdirs
+from server.pipeline.simulation.result_cache import cached_keys
+from server.pipeline.simulation.sweep import SweepError, expand_sweep, sweep_progress
+from server.pipeline.util.progress import channel_name, get_channel, is_final
 from server.pipeline.util.request import request_to_json
-from .tasks import run_simulation
+from .tasks import enqueue_restores, enqueue_simulations, restore_simulation, run_simulation
 
 simulation_api = Blueprint('simulation_api', __name__)
 
 
+def cached_confs(request_data: dict, confs: List[Artifact]) -> Dict[int, str]:
+    """
+    Finds configurations with cached results, unless the cache is disabled with SIMBAD_RESULT_CACHE or "noCache"
+    in request. Cached simulations are completed by restore_simulation task, instead of the pipeline
+    :return: configuration artifact id -> config hash, for configurations with cached results
+    """
+    if not SIMBAD_RESULT_CACHE or request_data.get('noCache'):
+        return {}
+    keys = cached_keys([conf.simulation_id for conf in confs])
+    return {conf.id: keys[conf.simulation_id] for conf in confs if conf.simulation_id in keys}
+
+
 @simulation_api.route('/start', methods=['POST'])
 def start():
     request_data: dict = request_to_json(request)
     conf: Artifact = setup_workdir(request_data)
+    cached = cached_confs(request_data, [conf])
     db_session.begin()
     db_session.flush()
     step = db_session.query(SimulationStep).get(conf.step_id)
-    task = run_simulation.delay(conf.id)
+    task = restore_simulation.delay(conf.id, cached[conf.id]) if cached else run_simulation.delay(conf.id)
     step.celery_id = task.id
     db_session.commit()
     return jsonify(step)
 
 
-def get_current_simulation() -> Simulation:
+@simulation_api.route('/sweep', methods=['POST'])
+def start_sweep():
+    """
+    Starts simulations of parameter sweep, see sweep.expand_sweep. The request has configurationName and base
+    configuration like /start, and "grid" and/or "lists" of values for dotted configuration paths
+    """
+    request_data: dict = request_to_json(request)
+    name = request_data['configurationName']
+    try:
+        configurations = expand_sweep(name, request_data['configuration'], request_data.get('grid'),
+                                      request_data.get('lists'))
+    except SweepError as e:
+        return jsonify({"error": str(e)}), 400
+
+    sweep = Sweep(created_utc=datetime.datetime.utcnow(), name=name, size=len(configurations))
+    confs = setup_workdirs(configurations, request_data.get('resources'), sweep)
+    cached = cached_confs(request_data, confs)
+    confs_to_run = [conf for conf in confs if conf.id not in cached]
+    confs_to_restore = [conf for conf in confs if conf.id in cached]
+    tasks = []
+    if confs_to_run:
+        tasks.extend(zip(confs_to_run, enqueue_simulations([conf.id for conf in confs_to_run]).results))
+    if confs_to_restore:
+        result = enqueue_restores({conf.id: cached[conf.id] for conf in confs_to_restore})
+        tasks.extend(zip(confs_to_restore, result.results))
+    db_session.begin()
+    db_session.query(SimulationStep).filter(SimulationStep.id.in_([conf.step_id for conf, _ in tasks])).update(
+        {SimulationStep.celery_id: case(
+            {conf.step_id: task.id for conf, task in tasks}, value=SimulationStep.id
+        )},
+        synchronize_session=False
+    )
+    db_session.commit()
+    return jsonify({
+        "sweepId": sweep.id,
+        "size": sweep.size,
+        "simulationIds": [conf.simulation_id for conf in confs],
+        "cached": len(confs_to_restore)
+    })
+
+
+@simulation_api.route('/sweep/<int:sweep_id>')
+def sweep_status(sweep_id: int):
+    sweep = db_session.query(Sweep).get(sweep_id)
+    if sweep is None:
+        return jsonify({"error": "Sweep not found"}), 404
+    return jsonify(sweep_progress(sweep))
+
+
+def get_ongoing_simulations() -> List[Simulation]:
     return db_session.query(Simulation).filter(
-        Simulation.started_utc is not None and Simulation.finished_utc is None
-    ).first()
+        and_(Simulation.started_utc.isnot(None), Simulation.finished_utc.is_(None), Simulation.status == 'ONGOING')
+    ).order_by(Simulation.id).all()
+
+
+def get_current_simulation() -> Simulation:
+    simulations = get_ongoing_simulations()
+    return simulations[0] if simulations else None
+
+
+def get_step_status(simulation: Simulation):
+    step = db_session.query(SimulationStep).get(simulation.current_step_id) \
+        if simulation.current_step_id is not None else None
+    return step.status if step is not None else None
 
 
 @simulation_api.route('/status')
 def current_simulation_status():
-    simulation = get_current_simulation()
-    if simulation is not None:
+    """
+    Returns BUSY with every ongoing simulation, or IDLE. For compatibility, the currentStep and simulationId
+    are of the oldest ongoing simulation
+    """
+    simulations = get_ongoing_simulations()
+    scheduler = get_scheduler().state()
+    if simulations:
         return jsonify({
             "status": 'BUSY',
-            "currentStep": simulation.current_step,
-            "simulationId": simulation.id
+            "currentStep": simulations[0].current_step,
+            "simulationId": simulations[0].id,
+            "simulations": [{
+                "simulationId": simulation.id,
+                "currentStep": simulation.current_step,
+                "stepStatus": get_step_status(simulation)
+            } for simulation in simulations],
+            "scheduler": scheduler
         })
     else:
-        return jsonify({"status": "IDLE"})
+        return jsonify({"status": "IDLE", "simulations": [], "scheduler": scheduler})
+
+
+def event_stream(subscription, snapshot: dict = None, until_final: bool = False) -> Iterator[str]:
+    """
+    Yields server-sent events, the snapshot first, then progress events of subscription. Idle streams get
+    keepalive comments, so proxies do not close them
+    :param subscription: progress channel subscription, closed when the stream ends
+    :param snapshot: optional state sent as the first event
+    :param until_final: end the stream after the last event of simulation
+    :return:
+    """
+    try:
+        if snapshot is not None:
+            yield 'event: snapshot\ndata: {}\n\n'.format(json.dumps(snapshot, default=str))
+            if until_final and snapshot['status'] != 'ONGOING':
+                return
+        while True:
+            event = subscription.get(timeout=SIMBAD_PROGRESS_KEEPALIVE)
+            if event is None:
+                yield ': keepalive\n\n'
+                continue
+            yield 'event: progress\ndata: {}\n\n'.format(json.dumps(event))
+            if until_final and is_final(event):
+                return
+    finally:
+        subscription.close()
+
+
+def event_response(events: Iterator[str]) -> Response:
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@simulation_api.route('/<int:simulation_id>/events')
+def simulation_events(simulation_id: int):
+    """
+    Streams progress of simulation steps as server-sent events, until the simulation finishes
+    """
+    # Subscribed before reading the snapshot, so no event between them is lost
+    subscription = get_channel().subscribe(channel_name(simulation_id))
+    simulation = db_session.query(Simulation).get(simulation_id)
+    if simulation is None:
+        subscription.close()
+        return jsonify({"error": "Simulation not found"}), 404
+    return event_response(event_stream(subscription, to_simple_simulation_info(simulation), until_final=True))
+
+
+@simulation_api.route('/events')
+def all_simulation_events():
+    """
+    Streams progress of steps of all simulations as server-sent events
+    """
+    return event_response(event_stream(get_channel().subscribe(channel_name())))
 
 
 @simulation_api.route('/latest')
@@ -128,7 +275,8 @@ def get_cli_status(simulation):
         and_(SimulationStep.simulation_id == simulation.id, SimulationStep.origin == 'CLI')
     ).first()
     if step is not None:
-        progress = step.cli_runtime_info.progress
+        # Runtime info is created when the cli task starts
+        progress = step.cli_runtime_info.progress if step.cli_runtime_info is not None else 0
         return {"status": step.status, "progress": progress}
     return None
 
@@ -138,7 +286,7 @@ def get_analyzer_status(simulation):
         and_(SimulationStep.simulation_id == simulation.id, SimulationStep.origin == 'ANALYZER')
     ).first()
     if step is not None:
-        progress = step.analyzer_runtime_info.progress
+        progress = step.analyzer_runtime_info.progress if step.analyzer_runtime_info is not None else 0
         return {"status": step.status, "progress": progress}
     return None
 
@@ -0,0 +1,372 @@
+"""
+Content addressed cache of simulation results.
+
+Results are keyed by hash of the canonical configuration json, its random seed (at
+SIMBAD_RESULT_CACHE_SEED_PATH), digest of the simulator binary and the analyzer version, so a simulation with
+the same key would produce the same output. Configurations without the seed are stochastic and never cached.
+When a simulation finishes, its workdir is hardlinked into the cache entry directory, together with manifest
+of its artifacts. Submissions are matched with finished simulations in one query, and a matching submission
+is completed by a task linking the entry files into its own workdir and recreating the artifacts, instead of
+running the pipeline. Links do not copy data, and the files stay available when either
+the source simulation or the cache entry is removed. Files are linked across filesystems by copying.
+Entries are evicted when they were not used for SIMBAD_RESULT_CACHE_MAX_AGE_DAYS, and the least recently
+used ones when total size exceeds SIMBAD_RESULT_CACHE_MAX_SIZE_MB. Eviction holds exclusive flock of the
+cache directory, and restores hold shared one, so entries are never removed while being linked.
+"""
+import datetime
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import SIMBAD_CLI_BINARY_PATH, SIMBAD_ANALYZER_VERSION, SIMBAD_RESULT_CACHE_PATH, \
+    SIMBAD_RESULT_CACHE_MAX_AGE_DAYS, SIMBAD_RESULT_CACHE_MAX_SIZE_MB, SIMBAD_RESULT_CACHE_SEED_PATH
+from database import db_session
+from models.analyzer_runtime_info import AnalyzerRuntimeInfo
+from models.artifact import Artifact
+from models.cli_runtime_info import CliRuntimeInfo
+from models.simulation import Simulation
+from models.simulation_step import SimulationStep
+from server.pipeline.cli.scheduler import RESOURCES_NAME
+
+# Bump when layout of cached results changes, so old entries are never matched
+CACHE_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+LOCK_NAME = '.cache.lock'
+PIPELINE_STEPS = ['CLI', 'ANALYZER', 'REPORT']
+
+logger = logging.getLogger()
+
+_lock = threading.Lock()
+_binary_digests: Dict[Tuple[str, float, int], str] = {}
+
+
+def binary_digest(path: str = None) -> str:
+    """
+    Returns sha256 of simulator binary, cached until the file changes
+    :param path: defaults to SIMBAD_CLI_BINARY_PATH
+    :return: hex digest, or 'missing' when there is no binary
+    """
+    path = path or SIMBAD_CLI_BINARY_PATH
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return 'missing'
+    key = (path, stat.st_mtime, stat.st_size)
+    with _lock:
+        digest = _binary_digests.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(block)
+        digest = sha.hexdigest()
+        with _lock:
+            _binary_digests[key] = digest
+    return digest
+
+
+def configuration_seed(conf: dict, path: str = None) -> Any:
+    """
+    Returns random seed of simulation configuration
+    :param conf: the configuration
+    :param path: dotted path of the seed, defaults to SIMBAD_RESULT_CACHE_SEED_PATH
+    :return: the seed, or None when configuration has no seed
+    """
+    value = conf
+    for key in (path or SIMBAD_RESULT_CACHE_SEED_PATH).split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def config_hash(conf: dict) -> Optional[str]:
+    """
+    Returns cache key of simulation configuration
+    :return: the key, or None when configuration has no seed, as results of seedless runs differ
+    """
+    seed = configuration_seed(conf)
+    if seed is None:
+        return None
+    key = {
+        'version': CACHE_VERSION,
+        'configuration': conf,
+        'seed': seed,
+        'binary': binary_digest(),
+        'analyzer': SIMBAD_ANALYZER_VERSION,
+    }
+    canonical = json.dumps(key, sort_keys=True, separators=(',', ':'), ensure_ascii=True)
+    return hashlib.sha256(canonical.encode('utf8')).hexdigest()
+
+
+def entry_path(key: str) -> str:
+    return os.path.join(SIMBAD_RESULT_CACHE_PATH, key)
+
+
+@contextmanager
+def cache_lock(exclusive: bool):
+    """
+    Holds flock of the cache directory, exclusive for eviction and shared for restores
+    """
+    os.makedirs(SIMBAD_RESULT_CACHE_PATH, exist_ok=True)
+    with open(os.path.join(SIMBAD_RESULT_CACHE_PATH, LOCK_NAME), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def lookup(key: str) -> Optional[dict]:
+    """
+    Returns manifest of cache entry, and marks the entry as recently used
+    :param key: the config hash
+    :return: the manifest, or None when there is no entry
+    """
+    manifest_path = os.path.join(entry_path(key), MANIFEST_NAME)
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        os.utime(manifest_path)
+    except (OSError, ValueError):
+        return None
+    return manifest
+
+
+def cached_keys(simulation_ids: List[int]) -> Dict[int, str]:
+    """
+    Returns cache keys of simulations, which have results of an identical configuration in the cache. Keys of
+    all simulations are matched with successful simulations in one query, and only the matches are looked up
+    in the cache directory
+    :param simulation_ids: ids of new simulations
+    :return: simulation id -> config hash, for simulations with cached results
+    """
+    keys = dict(db_session.query(Simulation.id, Simulation.config_hash)
+                .filter(Simulation.id.in_(simulation_ids), Simulation.config_hash.isnot(None)).all())
+    if not keys:
+        return {}
+    finished = set(key for key, in db_session.query(Simulation.config_hash).filter(
+        Simulation.config_hash.in_(set(keys.values())), Simulation.status == 'SUCCESS').distinct())
+    return {simulation_id: key for simulation_id, key in keys.items()
+            if key in finished and os.path.exists(os.path.join(entry_path(key), MANIFEST_NAME))}
+
+
+def link_tree(src: str, dst: str, skip: List[str] = None) -> int:
+    """
+    Hardlinks every file of src directory into dst, copying files that can not be linked
+    :param src: the source directory
+    :param dst: the destination directory, created if missing
+    :param skip: paths relative to src that are not linked
+    :return: total size of linked files in bytes
+    """
+    skip = set(skip or [])
+    size = 0
+    for root, dirs, files in os.walk(src):
+        target_root = os.path.join(dst, os.path.relpath(root, src))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            source = os.path.join(root, name)
+            if os.path.relpath(source, src) in skip:
+                continue
+            target = os.path.join(target_root, name)
+            if os.path.exists(target):
+                os.remove(target)
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copy2(source, target)
+            size += os.path.getsize(target)
+    return size
+
+
+def unshare_tree(path: str) -> None:
+    """
+    Replaces files linked with cache entries by private copies, so files written in place (ex. re-rendered
+    plots) never change results of other simulations
+    """
+    if not os.path.exists(path):
+        return
+    for root, _, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            if os.lstat(file_path).st_nlink > 1:
+                tmp_path = os.path.join(root, '.{}.unshare'.format(name))
+                shutil.copy2(file_path, tmp_path)
+                os.replace(tmp_path, file_path)
+
+
+def artifact_manifest(simulation: Simulation) -> Tuple[List[dict], List[str]]:
+    """
+    Returns manifest entries of simulation artifacts in its workdir, and paths of configuration files
+    that are not cached, relative to workdir
+    """
+    steps = {step.id: step.origin for step in
+             db_session.query(SimulationStep).filter(SimulationStep.simulation_id == simulation.id).all()}
+    artifacts = db_session.query(Artifact).filter(Artifact.simulation_id == simulation.id) \
+        .order_by(Artifact.id).all()
+    paths = {artifact.id: artifact.path for artifact in artifacts}
+    workdir = os.path.abspath(simulation.workdir)
+
+    entries = []
+    configurations = [RESOURCES_NAME]
+    for artifact in artifacts:
+        if artifact.path is None:
+            continue
+        path = os.path.abspath(artifact.path)
+        relative = os.path.relpath(path, workdir)
+        if relative.startswith('..') or not os.path.exists(path):
+            continue
+        origin = steps.get(artifact.step_id)
+        if origin == 'CLI' and artifact.file_type == 'JSON':
+            configurations.append(relative)
+            continue
+        parent = paths.get(artifact.parent_id)
+        entries.append({
+            'path': relative,
+            'name': artifact.name,
+            'fileType': artifact.file_type,
+            'resolution': artifact.resolution,
+            'parent': os.path.relpath(os.path.abspath(parent), workdir) if parent is not None else None,
+            'origin': origin,
+        })
+    return entries, configurations
+
+
+def store_result(simulation: Simulation) -> None:
+    """
+    Adds results of successful simulation to the cache, and evicts old entries
+    :param simulation: finished simulation with config_hash
+    :return:
+    """
+    if simulation.config_hash is None or simulation.status != 'SUCCESS':
+        return
+    final_path = entry_path(simulation.config_hash)
+    if os.path.exists(final_path):
+        return
+
+    os.makedirs(SIMBAD_RESULT_CACHE_PATH, exist_ok=True)
+    artifacts, configurations = artifact_manifest(simulation)
+    tmp_path = tempfile.mkdtemp(prefix='.tmp_', dir=SIMBAD_RESULT_CACHE_PATH)
+    try:
+        size = link_tree(simulation.workdir, os.path.join(tmp_path, 'files'), configurations)
+        manifest = {
+            'configHash': simulation.config_hash,
+            'simulationId': simulation.id,
+            'createdUtc': datetime.datetime.utcnow().isoformat(),
+            'sizeKb': size // 1024,
+            'artifacts': artifacts,
+        }
+        with open(os.path.join(tmp_path, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(tmp_path, final_path)
+    except OSError:
+        # Entry stored concurrently by another worker, or the workdir is incomplete
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not os.path.exists(final_path):
+            raise
+    evict()
+
+
+def restore_result(conf: Artifact, manifest: dict) -> Optional[SimulationStep]:
+    """
+    Completes new simulation with cached results, linking entry files into its workdir and creating
+    artifacts and finished steps, like the pipeline would
+    :param conf: configuration artifact of the simulation, see setup_workdir
+    :param manifest: the cache entry manifest, see lookup
+    :return: the last step of simulation, or None when the entry was evicted since lookup
+    """
+    simulation: Simulation = db_session.query(Simulation).get(conf.simulation_id)
+    cli_step: SimulationStep = db_session.query(SimulationStep).get(conf.step_id)
+    workdir = simulation.workdir
+    files_path = os.path.join(entry_path(manifest['configHash']), 'files')
+    with cache_lock(exclusive=False):
+        if not os.path.exists(os.path.join(entry_path(manifest['configHash']), MANIFEST_NAME)):
+            return None
+        link_tree(files_path, workdir)
+
+    end_time = datetime.datetime.utcnow()
+    db_session.begin()
+    cli_step.status = 'SUCCESS'
+    cli_step.finished_utc = end_time
+    steps = {'CLI': cli_step}
+    for origin in PIPELINE_STEPS[1:]:
+        steps[origin] = SimulationStep(started_utc=end_time, finished_utc=end_time, origin=origin,
+                                       simulation_id=simulation.id, status='SUCCESS')
+    db_session.add_all(list(steps.values()))
+    db_session.flush()
+    db_session.add(CliRuntimeInfo(memory=0, cpu=0, progress=100, step_id=cli_step.id))
+    db_session.add(AnalyzerRuntimeInfo(progress=100, is_finished=True, step_id=steps['ANALYZER'].id))
+
+    artifacts = {}
+    for entry in manifest['artifacts']:
+        path = os.path.join(workdir, entry['path'])
+        step = steps.get(entry['origin'])
+        artifacts[entry['path']] = Artifact(
+            path=path,
+            name=entry['name'],
+            size_kb=os.path.getsize(path),
+            created_utc=end_time,
+            file_type=entry['fileType'],
+            resolution=entry['resolution'],
+            step_id=step.id if step is not None else None,
+            simulation_id=simulation.id
+        )
+    for entry in manifest['artifacts']:
+        if entry['parent'] in artifacts:
+            artifacts[entry['path']].parent = artifacts[entry['parent']]
+    db_session.add_all(list(artifacts.values()))
+
+    simulation.status = 'SUCCESS'
+    simulation.finished_utc = end_time
+    simulation.current_step = 'REPORT'
+    simulation.current_step_id = steps['REPORT'].id
+    db_session.add(simulation)
+    db_session.commit()
+    logger.info('Simulation {} restored from cached results of simulation {}'.format(
+        simulation.id, manifest['simulationId']))
+    return steps['REPORT']
+
+
+def evict(max_age_days: float = None, max_size_mb: int = None) -> List[str]:
+    """
+    Removes entries not used for max_age_days, then least recently used entries until total size
+    is below max_size_mb
+    :param max_age_days: defaults to SIMBAD_RESULT_CACHE_MAX_AGE_DAYS
+    :param max_size_mb: defaults to SIMBAD_RESULT_CACHE_MAX_SIZE_MB
+    :return: keys of removed entries
+    """
+    max_age_days = SIMBAD_RESULT_CACHE_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    max_size_mb = SIMBAD_RESULT_CACHE_MAX_SIZE_MB if max_size_mb is None else max_size_mb
+    if not os.path.exists(SIMBAD_RESULT_CACHE_PATH):
+        return []
+
+    removed = []
+    with cache_lock(exclusive=True):
+        entries = []
+        for key in os.listdir(SIMBAD_RESULT_CACHE_PATH):
+            manifest_path = os.path.join(entry_path(key), MANIFEST_NAME)
+            try:
+                with open(manifest_path) as f:
+                    size_kb = json.load(f)['sizeKb']
+                entries.append((os.path.getmtime(manifest_path), key, size_kb))
+            except (OSError, ValueError, KeyError):
+                continue
+        entries.sort()
+
+        now = time.time()
+        total_kb = sum(size_kb for _, _, size_kb in entries)
+        for last_used, key, size_kb in entries:
+            if now - last_used <= max_age_days * 86400 and total_kb <= max_size_mb * 1024:
+                break
+            shutil.rmtree(entry_path(key), ignore_errors=True)
+            total_kb -= size_kb
+            removed.append(key)
+    return removed
@@ -0,0 +1,149 @@
+"""
+Parameter sweeps, many simulations of one base configuration with some of its values replaced.
+
+Replaced values are addressed by dotted paths into the configuration, ex. "parameters.birthEfficiency" or
+"mutations.0.probability". Values of "grid" are combined as cartesian product, and values of "lists" are
+taken together, like zip, so {"grid": {"a": [1, 2], "b": [3, 4]}} gives 4 configurations and
+{"lists": {"a": [1, 2], "b": [3, 4]}} gives 2. When both are given, every grid point is combined with
+every list position.
+"""
+import copy
+import itertools
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy.orm import joinedload
+
+from config.settings import SIMBAD_SWEEP_MAX_SIZE
+from database import db_session
+from models.simulation import Simulation
+from models.simulation_step import SimulationStep
+from models.sweep import Sweep
+
+# Steps of every simulation, used to compute its progress
+PIPELINE_STEPS = ['CLI', 'ANALYZER', 'REPORT']
+
+
+class SweepError(ValueError):
+    pass
+
+
+def set_path(conf: dict, path: str, value: Any) -> None:
+    """
+    Replaces existing value at dotted path, numeric parts index lists
+    """
+    keys = path.split('.')
+    target = conf
+    try:
+        for key in keys[:-1]:
+            target = target[int(key)] if isinstance(target, list) else target[key]
+        if isinstance(target, list):
+            target[int(keys[-1])] = value
+        elif keys[-1] in target:
+            target[keys[-1]] = value
+        else:
+            raise KeyError(keys[-1])
+    except (KeyError, IndexError, ValueError, TypeError):
+        raise SweepError('Path {} does not exist in configuration'.format(path))
+
+
+def sweep_points(grid: Dict[str, list] = None, lists: Dict[str, list] = None) -> List[Dict[str, Any]]:
+    """
+    Returns path -> value assignments of every sweep point
+    """
+    grid = grid or {}
+    lists = lists or {}
+    lengths = set(len(values) for values in lists.values())
+    if len(lengths) > 1:
+        raise SweepError('Sweep lists have different lengths: {}'.format(sorted(lengths)))
+    size = 1 if not lists else lengths.pop()
+    for values in grid.values():
+        size *= len(values)
+    if size > SIMBAD_SWEEP_MAX_SIZE:
+        raise SweepError('Sweep of {} simulations exceeds the limit of {}'.format(size, SIMBAD_SWEEP_MAX_SIZE))
+
+    grid_paths = list(grid.keys())
+    list_paths = list(lists.keys())
+    list_points = list(zip(*[lists[path] for path in list_paths])) if lists else [()]
+    return [
+        dict(zip(grid_paths + list_paths, grid_values + list_values))
+        for grid_values in itertools.product(*[grid[path] for path in grid_paths])
+        for list_values in list_points
+    ]
+
+
+def expand_sweep(name: str, base: dict, grid: Dict[str, list] = None,
+                 lists: Dict[str, list] = None) -> List[Tuple[str, dict]]:
+    """
+    Expands base configuration into configuration of every sweep point
+    :param name: base configuration name, configurations are named like name_0001
+    :param base: the base configuration
+    :param grid: path -> values combined as cartesian product
+    :param lists: path -> values taken together, all lists need the same length
+    :raises SweepError: for invalid paths, lists of different lengths, or too large sweeps
+    :return: list of (configuration name, configuration)
+    """
+    name = name[:-len('.json')] if name.endswith('.json') else name
+    configurations = []
+    for index, point in enumerate(sweep_points(grid, lists)):
+        conf = copy.deepcopy(base)
+        for path, value in point.items():
+            set_path(conf, path, value)
+        configurations.append(('{}_{:04d}'.format(name, index), conf))
+    return configurations
+
+
+def simulation_progress(steps: List[SimulationStep]) -> float:
+    """
+    Returns progress of simulation in percents, every pipeline step has equal weight
+    """
+    progress = 0.0
+    for step in steps:
+        if step.origin not in PIPELINE_STEPS:
+            continue
+        if step.status == 'SUCCESS':
+            progress += 100.0
+        elif step.origin == 'CLI' and step.cli_runtime_info is not None:
+            progress += step.cli_runtime_info.progress or 0.0
+        elif step.origin == 'ANALYZER' and step.analyzer_runtime_info is not None:
+            progress += step.analyzer_runtime_info.progress or 0.0
+    return progress / len(PIPELINE_STEPS)
+
+
+def sweep_progress(sweep: Sweep) -> dict:
+    """
+    Returns aggregate progress of sweep simulations, with number of simulations in every status
+    """
+    simulations = db_session.query(Simulation).filter(Simulation.sweep_id == sweep.id).all()
+    steps = db_session.query(SimulationStep) \
+        .join(Simulation, SimulationStep.simulation_id == Simulation.id) \
+        .options(joinedload(SimulationStep.cli_runtime_info), joinedload(SimulationStep.analyzer_runtime_info)) \
+        .filter(Simulation.sweep_id == sweep.id).all()
+
+    steps_by_simulation = {}
+    for step in steps:
+        steps_by_simulation.setdefault(step.simulation_id, []).append(step)
+
+    statuses = {}
+    progress = 0.0
+    for simulation in simulations:
+        step_status = None
+        for step in steps_by_simulation.get(simulation.id, []):
+            if step.id == simulation.current_step_id:
+                step_status = step.status
+        # Queued simulations are ongoing, but have not started yet
+        status = 'QUEUED' if simulation.status == 'ONGOING' and step_status == 'QUEUED' else simulation.status
+        statuses[status] = statuses.get(status, 0) + 1
+        if simulation.status == 'SUCCESS':
+            progress += 100.0
+        else:
+            progress += simulation_progress(steps_by_simulation.get(simulation.id, []))
+
+    return {
+        "sweepId": sweep.id,
+        "name": sweep.name,
+        "size": sweep.size,
+        "createdUtc": sweep.created_utc,
+        "progress": progress / len(simulations) if simulations else 0.0,
+        "statuses": statuses,
+        "simulationIds": [simulation.id for simulation in simulations]
+    }
@@ -1,11 +1,16 @@
 import logging
+from typing import Dict, List
 
-from celery import Celery, chain
-from celery.result import AsyncResult
+from celery import Celery, chain, group
+from celery.result import AsyncResult, GroupResult
 
-from server.pipeline.analyzer.tasks import analyzer_step
+from config.settings import SIMBAD_PIPELINED
+from database import db_session
+from models.artifact import Artifact
+from server.pipeline.analyzer.tasks import analyzer_step, check_pipelined_mode
 from server.pipeline.cli.tasks import cli_step
 from server.pipeline.reports.tasks import reports_step
+from server.pipeline.simulation.result_cache import lookup, restore_result
 
 logger = logging.getLogger()
 celery = Celery(__name__, autofinalize=False)
@@ -14,14 +19,55 @@ celery = Celery(__name__, autofinalize=False)
 @celery.task(name='SIMULATION-PIPELINE')
 def run_simulation(artifact_id) -> AsyncResult:
     """
-
-
-    :param artifact_id:
+    Runs cli, analyzer and reports steps of simulation. In pipelined mode (SIMBAD_PIPELINED) the cli step
+    starts the analyzer on output segments when the simulator is admitted, and reports start after the analyzer
+    :param artifact_id: the id of simulation configuration artifact
     :return:
     """
+    if SIMBAD_PIPELINED:
+        check_pipelined_mode()
+        return cli_step.si(artifact_id).apply_async()
+
     result = chain(
         cli_step.s(artifact_id),
         analyzer_step.s(),
         reports_step.s()
     ).apply_async()
     return result
+
+
+def enqueue_simulations(artifact_ids: List[int]) -> GroupResult:
+    """
+    Enqueues pipelines of many simulations in one call, see run_simulation
+    :param artifact_ids: ids of simulation configuration artifacts
+    :return: group result, with result of every pipeline in order of artifact_ids
+    """
+    return group(run_simulation.si(artifact_id) for artifact_id in artifact_ids).apply_async()
+
+
+@celery.task(name='SIMULATION-RESTORE')
+def restore_simulation(artifact_id: int, key: str):
+    """
+    Completes simulation with cached results of identical configuration, see result_cache.restore_result.
+    The pipeline is run instead when the cache entry was evicted since the submission
+    :param artifact_id: the id of simulation configuration artifact
+    :param key: the config hash of simulation
+    :return: the id of the last step of restored simulation
+    """
+    conf: Artifact = db_session.query(Artifact).get(artifact_id)
+    manifest = lookup(key)
+    step = restore_result(conf, manifest) if manifest is not None else None
+    if step is None:
+        logger.info('Cached results of simulation {} were evicted, running the pipeline'.format(conf.simulation_id))
+        run_simulation(artifact_id)
+        return None
+    return step.id
+
+
+def enqueue_restores(keys: Dict[int, str]) -> GroupResult:
+    """
+    Enqueues restores of many simulations in one call, see restore_simulation
+    :param keys: ids of simulation configuration artifacts -> config hash
+    :return: group result, with result of every restore in order of keys
+    """
+    return group(restore_simulation.si(artifact_id, key) for artifact_id, key in keys.items()).apply_async()
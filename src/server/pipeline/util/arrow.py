@@ -0,0 +1,39 @@
+"""
+Reading columns of arrow tables as numpy arrays, without converting values to python objects.
+"""
+from typing import Tuple
+
+import numpy as np
+
+
+def column_values(table, name: str) -> np.ndarray:
+    """
+    Returns column of table as one numpy array, also for tables without rows
+    :param table: arrow table
+    :param name: the column name
+    :return:
+    """
+    column = table.column(name)
+    if column.num_chunks == 0:
+        return np.empty(0, dtype=column.type.to_pandas_dtype())
+    return np.concatenate([chunk.to_numpy(zero_copy_only=False) for chunk in column.chunks])
+
+
+def list_parents(ancestors) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns last but one element of every list in ancestors column (the parent mutation), read directly
+    from list offsets and values buffers
+    :param ancestors: chunked arrow list array
+    :return: parent ids, and mask of rows with lists shorter than 2 elements (roots), which have parent -1
+    """
+    parents, is_root = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=bool)]
+    for chunk in ancestors.chunks:
+        # Offsets of sliced arrays do not start at 0, they index the values of the whole array
+        offsets = np.frombuffer(chunk.buffers()[1], dtype=np.int32)[chunk.offset:chunk.offset + len(chunk) + 1]
+        values = chunk.values.to_numpy(zero_copy_only=False).astype(np.int64)
+        chunk_is_root = np.diff(offsets) < 2
+        chunk_parents = np.full(len(chunk), -1, dtype=np.int64)
+        chunk_parents[~chunk_is_root] = values[offsets[1:][~chunk_is_root] - 2]
+        parents.append(chunk_parents)
+        is_root.append(chunk_is_root)
+    return np.concatenate(parents), np.concatenate(is_root)
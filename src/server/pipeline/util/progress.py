@@ -0,0 +1,203 @@
+"""
+Push based progress of simulation steps.
+
+Executors report progress, resource usage and status changes of steps to a ProgressReporter, which publishes
+every change as json event to the progress channel at once. Events are published on the channel of the
+simulation, and on the channel of all simulations. Database writes of runtime info are coalesced - the
+step tasks persist the latest state only when the reporter says it is due, at most once per
+SIMBAD_PROGRESS_DB_INTERVAL, and always on status change. Clients receive events with server-sent events
+endpoints, see simulation api.
+
+The channel is redis pub/sub (the celery broker by default), so events of celery workers reach the api
+process. The in-process channel is used when redis is not available, then only events published in the
+same process are received, ex. with tasks running eagerly.
+"""
+import json
+import queue
+import threading
+import time
+from typing import Optional, Set
+
+from config.settings import SIMBAD_PROGRESS_CHANNEL, SIMBAD_PROGRESS_REDIS_URL, SIMBAD_PROGRESS_DB_INTERVAL
+
+ALL_SIMULATIONS_CHANNEL = 'simbad:progress'
+# Statuses after which the step does not change anymore
+FINAL_STATUSES = ['SUCCESS', 'FAILURE']
+# The last step of simulation
+LAST_STEP = 'REPORT'
+LOCAL_QUEUE_SIZE = 1000
+
+
+def channel_name(simulation_id: int = None) -> str:
+    if simulation_id is None:
+        return ALL_SIMULATIONS_CHANNEL
+    return '{}:{}'.format(ALL_SIMULATIONS_CHANNEL, simulation_id)
+
+
+def is_final(event: dict) -> bool:
+    """
+    Whether the event is the last one of its simulation
+    """
+    status = event.get('status')
+    return status == 'FAILURE' or (status in FINAL_STATUSES and event.get('origin') == LAST_STEP)
+
+
+class LocalSubscription:
+    def __init__(self, channel: 'LocalChannel', name: str):
+        self.channel = channel
+        self.name = name
+        self.queue = queue.Queue(maxsize=LOCAL_QUEUE_SIZE)
+
+    def get(self, timeout: float) -> Optional[dict]:
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        self.channel.unsubscribe(self)
+
+
+class LocalChannel:
+    """
+    In-process stand-in for redis pub/sub
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions: Set[LocalSubscription] = set()
+
+    def publish(self, name: str, event: dict) -> None:
+        with self._lock:
+            subscriptions = [s for s in self._subscriptions if s.name == name]
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                # Slow subscriber, progress events are superseded by the following ones anyway
+                pass
+
+    def subscribe(self, name: str) -> LocalSubscription:
+        subscription = LocalSubscription(self, name)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: LocalSubscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+
+class RedisSubscription:
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    def get(self, timeout: float) -> Optional[dict]:
+        deadline = time.monotonic() + timeout
+        while True:
+            message = self.pubsub.get_message(ignore_subscribe_messages=True,
+                                              timeout=max(deadline - time.monotonic(), 0))
+            if message is not None and message['type'] == 'message':
+                return json.loads(message['data'])
+            if time.monotonic() >= deadline:
+                return None
+
+    def close(self) -> None:
+        self.pubsub.close()
+
+
+class RedisChannel:
+    def __init__(self, url: str):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.errors = (redis.RedisError,)
+
+    def publish(self, name: str, event: dict) -> None:
+        try:
+            self.client.publish(name, json.dumps(event))
+        except self.errors as e:
+            # Progress is persisted anyway, losing events must not fail the step
+            print('Could not publish progress event: {}'.format(e))
+
+    def subscribe(self, name: str) -> RedisSubscription:
+        pubsub = self.client.pubsub()
+        pubsub.subscribe(name)
+        return RedisSubscription(pubsub)
+
+
+_channel_lock = threading.Lock()
+_channel = None
+
+
+def get_channel():
+    """
+    Returns progress channel specified by SIMBAD_PROGRESS_CHANNEL, REDIS or LOCAL. Falls back to the local
+    channel when redis client is not installed
+    """
+    global _channel
+    with _channel_lock:
+        if _channel is None:
+            if SIMBAD_PROGRESS_CHANNEL == 'REDIS':
+                try:
+                    _channel = RedisChannel(SIMBAD_PROGRESS_REDIS_URL)
+                except ImportError:
+                    print('Redis client not installed, using in-process progress channel')
+                    _channel = LocalChannel()
+            else:
+                _channel = LocalChannel()
+        return _channel
+
+
+class ProgressReporter:
+    def __init__(self, simulation_id: int, step_id: int, origin: str, channel=None, db_interval: float = None):
+        """
+        Creates reporter of simulation step progress. Executors call update from any thread
+        :param simulation_id:
+        :param step_id:
+        :param origin: the step origin, ex. CLI or ANALYZER
+        :param channel: defaults to get_channel()
+        :param db_interval: minimum seconds between runtime info writes, defaults to SIMBAD_PROGRESS_DB_INTERVAL
+        """
+        self.channel = channel or get_channel()
+        self.db_interval = SIMBAD_PROGRESS_DB_INTERVAL if db_interval is None else db_interval
+        self.state = {
+            'simulationId': simulation_id,
+            'stepId': step_id,
+            'origin': origin,
+            'status': None,
+            'progress': 0,
+        }
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._status_changed = False
+        self._persisted_at = 0.0
+
+    def update(self, **fields) -> None:
+        """
+        Updates step state, and publishes the event if anything changed
+        :param fields: ex. progress, cpu, memory, status, error
+        :return:
+        """
+        with self._lock:
+            changed = {key: value for key, value in fields.items() if self.state.get(key) != value}
+            if not changed:
+                return
+            self.state.update(changed)
+            self._dirty = True
+            self._status_changed = self._status_changed or 'status' in changed
+            event = dict(self.state, timestamp=time.time())
+        self.channel.publish(channel_name(event['simulationId']), event)
+        self.channel.publish(channel_name(), event)
+
+    def persist_due(self) -> bool:
+        """
+        Whether the state should be written to database now
+        """
+        with self._lock:
+            interval_elapsed = time.monotonic() - self._persisted_at >= self.db_interval
+            return self._dirty and (self._status_changed or interval_elapsed)
+
+    def persisted(self) -> None:
+        with self._lock:
+            self._dirty = False
+            self._status_changed = False
+            self._persisted_at = time.monotonic()
@@ -0,0 +1,53 @@
+import pytest
+
+import database
+from database import db_session, init_db, init_engine
+import models.analyzer_runtime_info  # noqa: F401
+import models.cli_runtime_info  # noqa: F401
+import models.sweep  # noqa: F401
+from models.artifact import Artifact
+from models.simulation import Simulation
+from models.simulation_step import SimulationStep
+from server.pipeline.util import progress
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """
+    Database in temporary sqlite file, tables are created with init_db
+    """
+    engine = init_engine('sqlite:///{}'.format(tmp_path / 'simbad.db'))
+    yield engine
+    db_session.remove()
+    database.engine = None
+
+
+@pytest.fixture
+def channel(monkeypatch):
+    """
+    In-process progress channel
+    """
+    channel = progress.LocalChannel()
+    monkeypatch.setattr(progress, '_channel', channel)
+    return channel
+
+
+@pytest.fixture
+def conf(engine, channel, tmp_path):
+    """
+    Configuration artifact of ongoing simulation, with its workdir and cli step
+    """
+    init_db()
+    workdir = tmp_path / 'simulation'
+    workdir.mkdir()
+    db_session.begin()
+    simulation = Simulation(workdir=str(workdir), status='ONGOING')
+    db_session.add(simulation)
+    db_session.flush()
+    step = SimulationStep(origin='CLI', simulation_id=simulation.id, status='ONGOING')
+    db_session.add(step)
+    db_session.flush()
+    conf = Artifact(path=str(workdir / 'conf.json'), step_id=step.id, simulation_id=simulation.id, file_type='JSON')
+    db_session.add(conf)
+    db_session.commit()
+    return conf
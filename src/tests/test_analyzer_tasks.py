@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+import config.settings as settings
+from database import db_session
+from models.analyzer_runtime_info import AnalyzerRuntimeInfo
+from models.simulation import Simulation
+from server.pipeline.analyzer import tasks as analyzer_tasks
+from server.pipeline.cli.output_stream import FAILURE_MARKER, SUCCESS_MARKER, segments_dir
+from server.pipeline.util.revoke_chain_authority import RevokeChainRequested
+
+
+class StalledExecutor:
+    def __init__(self):
+        self.status = AnalyzerRuntimeInfo(progress=0)
+        self.is_finished = False
+        self.result = None
+
+    def execute(self, cli_out):
+        pass
+
+
+def test_pipelined_analyzer_times_out(conf, monkeypatch):
+    monkeypatch.setattr(settings, 'SIMBAD_ANALYZER_PIPELINED_TIMEOUT', 0.05)
+    monkeypatch.setattr(settings, 'SIMBAD_ANALYZER_POLLING_PERIOD', 0.01)
+    monkeypatch.setattr(analyzer_tasks, 'get_analyzer_executor', StalledExecutor)
+
+    analyzer_tasks.celery.finalize()
+    with pytest.raises(RevokeChainRequested):
+        analyzer_tasks.analyzer_pipelined_step.run(conf.id)
+
+    segments = segments_dir(conf.get_workdir())
+    assert os.path.exists(os.path.join(segments, FAILURE_MARKER))
+    assert not os.path.exists(os.path.join(segments, SUCCESS_MARKER))
+    simulation = db_session.query(Simulation).get(conf.simulation_id)
+    db_session.refresh(simulation)
+    assert simulation.status == 'FAILURE'
+    step = [step for step in simulation.steps if step.origin == 'ANALYZER'][0]
+    assert step.status == 'FAILURE'
@@ -0,0 +1,73 @@
+import os
+import stat
+import sys
+import threading
+
+import pytest
+
+from models.artifact import Artifact
+from server.pipeline.cli import cli_local_executor
+from server.pipeline.cli.cli_local_executor import CliLocalExecutor
+from server.pipeline.cli.output_stream import FAILURE_MARKER, SUCCESS_MARKER
+
+SIMULATOR = '''#!{python}
+import sys
+# more unexpected stderr output than the pipe buffer holds
+for _ in range({warnings}):
+    sys.stderr.write('warning: {{}}\\n'.format('x' * 100))
+sys.stderr.write('1/2\\n')
+sys.stdout.write('time;systemSize\\n0.0;1\\n1.0;2\\n')
+sys.exit({code})
+'''
+
+
+def simulator(tmp_path, code: int, warnings: int = 2000) -> str:
+    path = str(tmp_path / 'simulator.py')
+    with open(path, 'w') as f:
+        f.write(SIMULATOR.format(python=sys.executable, code=code, warnings=warnings))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+def run(executor: CliLocalExecutor, workdir: str) -> None:
+    os.makedirs(os.path.join(workdir, 'logs'), exist_ok=True)
+    conf = Artifact(path=os.path.join(workdir, 'conf.json'), step_id=1, simulation_id=1)
+    thread = threading.Thread(target=executor.run_cli, args=[conf])
+    thread.start()
+    thread.join(timeout=60)
+    assert not thread.is_alive(), 'simulator output was not drained'
+
+
+@pytest.mark.parametrize('output_format', ['CSV', 'PARQUET'])
+def test_nonzero_exit_is_failure(tmp_path, monkeypatch, output_format):
+    monkeypatch.setattr(cli_local_executor, 'SIMBAD_CLI_OUTPUT_FORMAT', output_format)
+    monkeypatch.setattr(cli_local_executor, 'SIMBAD_PIPELINED', False)
+    executor = CliLocalExecutor(simulator(tmp_path, 3))
+
+    run(executor, str(tmp_path))
+
+    assert executor.is_finished
+    assert executor.status.error == 'Simulator exited with code 3'
+
+
+def test_pipelined_crash_is_marked_failure(tmp_path, monkeypatch):
+    monkeypatch.setattr(cli_local_executor, 'SIMBAD_PIPELINED', True)
+    executor = CliLocalExecutor(simulator(tmp_path, 3))
+
+    run(executor, str(tmp_path))
+
+    segments = executor.result.path
+    assert os.path.exists(os.path.join(segments, FAILURE_MARKER))
+    assert not os.path.exists(os.path.join(segments, SUCCESS_MARKER))
+
+
+def test_pipelined_success_is_marked_after_exit(tmp_path, monkeypatch):
+    monkeypatch.setattr(cli_local_executor, 'SIMBAD_PIPELINED', True)
+    executor = CliLocalExecutor(simulator(tmp_path, 0, warnings=0))
+
+    run(executor, str(tmp_path))
+
+    assert executor.status.error is None
+    assert executor.status.progress == 50
+    assert os.path.exists(os.path.join(executor.result.path, SUCCESS_MARKER))
+    assert not os.path.exists(os.path.join(executor.result.path, FAILURE_MARKER))
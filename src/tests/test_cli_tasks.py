@@ -0,0 +1,115 @@
+import os
+
+import pytest
+from celery.exceptions import Retry
+
+import config.settings as settings
+from database import db_session
+from models.cli_runtime_info import CliRuntimeInfo
+from models.simulation_step import SimulationStep
+from server.pipeline.analyzer.tasks import check_pipelined_mode
+from server.pipeline.cli import tasks as cli_tasks
+from server.pipeline.cli.cli_local_executor import CliLocalExecutor
+from server.pipeline.cli.output_stream import FAILURE_MARKER, segments_dir
+from server.pipeline.cli.scheduler import Footprint, LocalScheduler
+
+
+@pytest.fixture
+def scheduler(monkeypatch, tmp_path):
+    scheduler = LocalScheduler(str(tmp_path / 'scheduler'), cpu_budget=4, memory_budget_mb=1024)
+    monkeypatch.setattr(cli_tasks, 'get_scheduler', lambda: scheduler)
+    return scheduler
+
+
+def failing_executor():
+    raise OSError('Simulator binary not found')
+
+
+def test_failed_step_marks_segments(conf, scheduler, monkeypatch):
+    monkeypatch.setattr(cli_tasks, 'SIMBAD_PIPELINED', True)
+    monkeypatch.setattr(cli_tasks, 'start_pipelined_analyzer', lambda artifact: None)
+    monkeypatch.setattr(cli_tasks, 'get_cli_executor', failing_executor)
+
+    cli_tasks.celery.finalize()
+    with pytest.raises(OSError):
+        cli_tasks.cli_step.run(conf.id)
+
+    assert os.path.exists(os.path.join(segments_dir(conf.get_workdir()), FAILURE_MARKER))
+    assert scheduler.state()['running'] == []
+
+
+@pytest.mark.parametrize('executor, supported', [('HTTP', True), ('SSH', False)])
+def test_check_pipelined_mode(monkeypatch, executor, supported):
+    monkeypatch.setattr(settings, 'SIMBAD_ANALYZER_EXECUTOR', executor)
+    monkeypatch.setattr(settings, 'SIMBAD_PIPELINED', True)
+    if supported:
+        check_pipelined_mode()
+    else:
+        with pytest.raises(ValueError):
+            check_pipelined_mode()
+    monkeypatch.setattr(settings, 'SIMBAD_PIPELINED', False)
+    check_pipelined_mode()
+
+
+def test_step_fails_when_simulator_can_not_run(conf, scheduler, monkeypatch, tmp_path):
+    monkeypatch.setattr(cli_tasks, 'POLLING_PERIOD', 0.01)
+    monkeypatch.setattr(cli_tasks, 'get_cli_executor', lambda: CliLocalExecutor(str(tmp_path / 'missing-binary')))
+
+    cli_tasks.celery.finalize()
+    assert cli_tasks.cli_step.run(conf.id) is None
+
+    step = db_session.query(SimulationStep).get(conf.step_id)
+    db_session.refresh(step)
+    assert step.status == 'FAILURE'
+    assert scheduler.state()['running'] == []
+
+
+class FinishedExecutor:
+    def __init__(self, started: list):
+        self.started = started
+        self.status = CliRuntimeInfo(cpu=0, memory=0, progress=100)
+        self.is_finished = False
+        self.result = self.log = self.profile = self.reporter = None
+
+    def execute(self, conf):
+        # the analyzer was sent before the simulator started
+        assert self.started == [conf.id]
+        self.is_finished = True
+
+
+def test_pipelined_analyzer_starts_when_run_is_admitted(conf, scheduler, monkeypatch):
+    started = []
+    monkeypatch.setattr(cli_tasks, 'SIMBAD_PIPELINED', True)
+    monkeypatch.setattr(cli_tasks, 'start_pipelined_analyzer', lambda artifact: started.append(artifact.id))
+    monkeypatch.setattr(cli_tasks, 'get_cli_executor', lambda: FinishedExecutor(started))
+
+    cli_tasks.celery.finalize()
+    cli_tasks.cli_step.run(conf.id)
+
+    assert started == [conf.id]
+
+
+def test_queued_run_is_retried(conf, scheduler, monkeypatch):
+    started = []
+    monkeypatch.setattr(cli_tasks, 'SIMBAD_PIPELINED', True)
+    monkeypatch.setattr(cli_tasks, 'start_pipelined_analyzer', lambda artifact: started.append(artifact.id))
+    monkeypatch.setattr(cli_tasks, 'get_cli_executor', lambda: FinishedExecutor(started))
+    assert scheduler.request('other', Footprint(4, 100))
+
+    cli_tasks.celery.finalize()
+    with pytest.raises(Retry):
+        cli_tasks.cli_step.run(conf.id)
+
+    step = db_session.query(SimulationStep).get(conf.step_id)
+    db_session.refresh(step)
+    assert step.status == 'QUEUED'
+    assert started == []
+    assert [entry['id'] for entry in scheduler.state()['queued']] == [str(step.id)]
+    assert db_session.query(CliRuntimeInfo).filter(CliRuntimeInfo.step_id == step.id).count() == 0
+
+    scheduler.release('other')
+    cli_tasks.cli_step.run(conf.id)
+
+    assert started == [conf.id]
+    assert scheduler.state()['queued'] == []
+    assert scheduler.state()['running'] == []
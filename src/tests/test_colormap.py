@@ -0,0 +1,63 @@
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pytest
+from matplotlib.colors import Normalize
+
+from server.pipeline.reports import colormap
+from server.pipeline.reports.colormap import lut, to_rgba, to_rgb16
+
+
+@pytest.fixture
+def values():
+    values = np.random.RandomState(0).uniform(-2.0, 12.0, 1000)
+    # bounds, values outside of them, and NaN
+    values[:6] = [0.0, 10.0, -1.0, 11.0, np.nan, 5.0]
+    return values
+
+
+@pytest.mark.parametrize('name', ['viridis', 'jet', 'tab20'])
+def test_to_rgba_matches_matplotlib(values, name):
+    cmap = matplotlib.colormaps[name]
+    expected = cmap(Normalize(0.0, 10.0)(values))
+    np.testing.assert_allclose(to_rgba(values, name, 0.0, 10.0), expected)
+    np.testing.assert_allclose(to_rgba(values, cmap, 0.0, 10.0), expected)
+
+
+def test_to_rgba_default_range(values):
+    expected = matplotlib.colormaps['viridis'](Normalize(np.nanmin(values), np.nanmax(values))(values))
+    np.testing.assert_allclose(to_rgba(values, 'viridis'), expected)
+
+
+def test_resampled_colormap_matches_matplotlib(values):
+    cmap = matplotlib.colormaps['viridis'].resampled(16)
+    expected = cmap(Normalize(0.0, 10.0)(values))
+    np.testing.assert_allclose(to_rgba(values, cmap, 0.0, 10.0), expected)
+
+
+def test_to_rgb16_truncates_colors(values):
+    expected = matplotlib.colormaps['viridis'].resampled(1024)(Normalize(0.0, 10.0)(values))[:, :3]
+    out = np.empty((values.shape[0], 3), dtype=np.uint16)
+    result = to_rgb16(values, 'viridis', 0.0, 10.0, n=1024, scale=65535, out=out)
+    assert result is out
+    np.testing.assert_array_equal(result, (expected * 65535).astype(np.uint16))
+
+
+def test_lut_is_cached_and_read_only():
+    table = lut('viridis')
+    assert lut('viridis') is table
+    assert table.shape == (257, 4)
+    assert not table.flags.writeable
+
+
+def test_lut_of_colormap_object_is_keyed_on_object(values):
+    first = matplotlib.colormaps['viridis'].resampled(16)
+    second = matplotlib.colormaps['viridis'].reversed().resampled(16)
+    second.name = first.name
+
+    assert lut(first) is lut(first)
+    np.testing.assert_allclose(to_rgba(values, second, 0.0, 10.0), second(Normalize(0.0, 10.0)(values)))
+
+    key = (id(first), first.N, 0)
+    del first
+    assert key not in colormap._luts
@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from server.pipeline.reports import data_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    data_cache.clear()
+    yield
+    data_cache.clear()
+
+
+def write_parquet(path: str, values: np.ndarray, mtime: float = None) -> str:
+    pd.DataFrame({'value': values, 'index': np.arange(values.shape[0])}).to_parquet(path)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_unchanged_file_is_read_once(tmp_path):
+    path = write_parquet(str(tmp_path / 'stats.parquet'), np.arange(10, dtype=np.float64))
+
+    assert data_cache.read_table(path) is data_cache.read_table(path)
+
+
+def test_rewritten_file_is_read_again(tmp_path):
+    path = write_parquet(str(tmp_path / 'stats.parquet'), np.arange(10, dtype=np.float64), mtime=1000)
+    first = data_cache.read_table(path)
+
+    write_parquet(path, np.arange(10, 20, dtype=np.float64), mtime=2000)
+
+    second = data_cache.read_table(path)
+    assert second is not first
+    assert second.column('value').to_pylist() == list(range(10, 20))
+    # the older version is dropped
+    assert list(data_cache._tables) == [(os.path.abspath(path), 2000)]
+
+
+def test_least_recently_used_tables_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_cache, 'REPORTS_DATA_CACHE_SIZE_MB', 1)
+    # about 0.6 MB each, two do not fit into the cache
+    values = np.arange(40000, dtype=np.float64)
+    first = write_parquet(str(tmp_path / 'first.parquet'), values)
+    second = write_parquet(str(tmp_path / 'second.parquet'), values)
+
+    data_cache.read_table(first)
+    data_cache.read_table(second)
+
+    assert [key[0] for key in data_cache._tables] == [os.path.abspath(second)]
+    assert data_cache._cached_bytes <= 1024 * 1024
+
+
+def test_read_column_matches_pandas(tmp_path):
+    path = write_parquet(str(tmp_path / 'stats.parquet'), np.linspace(0.0, 1.0, 100))
+    expected = pd.read_parquet(path)
+
+    for column in ['value', 'index']:
+        np.testing.assert_array_equal(data_cache.read_column(path, column), expected[column].values)
+    pd.testing.assert_frame_equal(data_cache.read_frame(path, ['index']), expected[['index']])
+
+
+def test_read_column_of_dataset(tmp_path):
+    dataset = tmp_path / 'stream.parquet'
+    dataset.mkdir()
+    write_parquet(str(dataset / 'part-0.parquet'), np.arange(5, dtype=np.float64))
+    write_parquet(str(dataset / 'part-1.parquet'), np.arange(5, 10, dtype=np.float64))
+
+    values = data_cache.read_column(str(dataset), 'value')
+
+    np.testing.assert_array_equal(np.sort(values), pd.read_parquet(str(dataset))['value'].sort_values().values)
@@ -0,0 +1,50 @@
+from sqlalchemy import inspect
+
+from database import db_session, init_db
+from models.artifact import Artifact
+from models.simulation import Simulation
+
+
+def test_upgrade_adds_missing_columns(engine):
+    # table created before variants of plots were added
+    engine.execute('CREATE TABLE artifacts (id INTEGER PRIMARY KEY, step_id INTEGER, simulation_id INTEGER, '
+                   'created_utc DATETIME, size_kb INTEGER, name VARCHAR, path VARCHAR, file_type VARCHAR)')
+    engine.execute("INSERT INTO artifacts (id, simulation_id, name) VALUES (1, 1, 'plot.png')")
+    init_db()
+
+    columns = [column['name'] for column in inspect(engine).get_columns('artifacts')]
+    assert 'parent_id' in columns
+    assert 'resolution' in columns
+    assert db_session.query(Artifact).get(1).resolution is None
+    # upgrade is idempotent
+    init_db()
+
+
+def test_simulation_artifacts_exclude_variants(engine):
+    init_db()
+    db_session.begin()
+    simulation = Simulation(name='simulation')
+    db_session.add(simulation)
+    db_session.flush()
+    plot = Artifact(name='plot.png', resolution='full', simulation_id=simulation.id)
+    plot.variants = [Artifact(name='plot.thumbnail.png', resolution='thumbnail', simulation_id=simulation.id)]
+    db_session.add(plot)
+    db_session.commit()
+    db_session.expire_all()
+
+    simulation = db_session.query(Simulation).get(simulation.id)
+    assert [artifact.name for artifact in simulation.artifacts] == ['plot.png']
+    assert [variant.name for variant in simulation.artifacts[0].variants] == ['plot.thumbnail.png']
+
+
+def test_upgrade_adds_sweep_of_simulation(engine):
+    engine.execute('CREATE TABLE simulations (id INTEGER PRIMARY KEY, started_utc DATETIME, finished_utc DATETIME, '
+                   'current_step VARCHAR, current_step_id INTEGER, workdir VARCHAR, name VARCHAR(50), '
+                   'status VARCHAR)')
+    init_db()
+
+    columns = [column['name'] for column in inspect(engine).get_columns('simulations')]
+    assert 'sweep_id' in columns
+    assert 'config_hash' in columns
+    indexes = [index['column_names'] for index in inspect(engine).get_indexes('simulations')]
+    assert ['config_hash'] in indexes
@@ -0,0 +1,37 @@
+import numpy as np
+
+from server.pipeline.reports.plots.decimation import decimate_stack
+
+
+def test_short_series_is_not_decimated():
+    time = np.arange(10)
+    layers = np.random.rand(10, 3)
+    decimated_time, decimated_layers = decimate_stack(time, layers, 100)
+    assert decimated_time is time
+    assert decimated_layers is layers
+
+
+def test_disabled_decimation():
+    time = np.arange(1000)
+    layers = np.random.rand(1000, 3)
+    decimated_time, _ = decimate_stack(time, layers, None)
+    assert decimated_time.shape[0] == 1000
+
+
+def test_decimation_keeps_ends_and_limit():
+    time = np.arange(10000)
+    layers = np.random.rand(10000, 4)
+    decimated_time, decimated_layers = decimate_stack(time, layers, 200)
+    assert decimated_time.shape[0] <= 200
+    assert decimated_time[0] == 0
+    assert decimated_time[-1] == 9999
+    assert np.all(np.diff(decimated_time) > 0)
+    np.testing.assert_array_equal(decimated_layers, layers[decimated_time])
+
+
+def test_decimation_keeps_spikes():
+    time = np.arange(10000)
+    layers = np.zeros((10000, 2))
+    layers[4321] = [5.0, -5.0]
+    decimated_time, _ = decimate_stack(time, layers, 100)
+    assert 4321 in decimated_time
@@ -0,0 +1,104 @@
+import os
+
+import laspy
+import numpy as np
+import pandas as pd
+import pytest
+
+from server.pipeline.reports.model import las
+
+PARAMETERS = ['birthEfficiency', 'successResistance', 'mutationId']
+
+
+def write_snapshot(workdir: str, rows: int = 50) -> pd.DataFrame:
+    random = np.random.RandomState(0)
+    snapshot = pd.DataFrame({
+        'x': random.uniform(-10.0, 10.0, rows),
+        'y': random.uniform(3.5, 7.0, rows),
+        'z': random.uniform(0.0, 1.0, rows),
+        'birthEfficiency': random.uniform(0.0, 1.0, rows),
+        'successResistance': random.uniform(0.0, 0.5, rows),
+        'mutationId': random.randint(1, 1000, rows),
+    })
+    path = os.path.join(workdir, 'output_data', 'final_snapshot.csv')
+    os.makedirs(path)
+    half = rows // 2
+    snapshot.iloc[:half].to_csv(os.path.join(path, 'part-0.csv'), sep=';', index=False)
+    snapshot.iloc[half:].to_csv(os.path.join(path, 'part-1.csv'), sep=';', index=False)
+    return snapshot
+
+
+@pytest.fixture
+def conversions(monkeypatch):
+    # chunks smaller than the snapshot, so the output is appended in many writes
+    monkeypatch.setattr(las, 'REPORTS_MODEL_CHUNK_ROWS', 7)
+    conversions = []
+    monkeypatch.setattr(las, 'las_to_entwine', lambda las_path, out_path, threads: conversions.append(
+        (las_path, out_path, threads)))
+    return conversions
+
+
+def check_header(points: laspy.LasData, snapshot: pd.DataFrame) -> None:
+    assert len(points) == snapshot.shape[0]
+    np.testing.assert_array_equal(points.header.offsets, [np.floor(snapshot[c].min()) for c in las.COORDINATES])
+    np.testing.assert_array_equal(points.header.scales, [las.LAS_SCALE] * 3)
+    for column in las.COORDINATES:
+        np.testing.assert_allclose(points[column], snapshot[column].astype(np.float32), atol=las.LAS_SCALE)
+
+
+def test_combined_model_has_parameters_as_extra_dimensions(tmp_path, conversions):
+    snapshot = write_snapshot(str(tmp_path))
+
+    outputs = las.build_models(str(tmp_path), per_parameter=False, cpu_budget=2)
+
+    las_path = str(tmp_path / 'models' / 'cell_model.las')
+    assert outputs == [str(tmp_path / 'models' / 'cell_model')]
+    assert conversions == [(las_path, outputs[0], 2)]
+    points = laspy.read(las_path)
+    check_header(points, snapshot)
+    assert set(PARAMETERS) <= set(points.point_format.extra_dimension_names)
+    for parameter in PARAMETERS:
+        np.testing.assert_allclose(points[parameter], snapshot[parameter].astype(las.snapshot_dtype(parameter)))
+
+
+def test_per_parameter_models_map_parameter_to_colors(tmp_path, conversions):
+    snapshot = write_snapshot(str(tmp_path))
+
+    outputs = las.build_models(str(tmp_path), per_parameter=True, cpu_budget=1)
+
+    assert outputs == [str(tmp_path / 'models' / parameter) for parameter in las.parameter_names
+                       if parameter in snapshot.columns]
+    for parameter in PARAMETERS:
+        points = laspy.read(str(tmp_path / 'models' / '{}.las'.format(parameter)))
+        check_header(points, snapshot)
+        values = snapshot[parameter].astype(las.snapshot_dtype(parameter))
+        r, g, b = las.map_to_colors(values)
+        np.testing.assert_array_equal(points.red, r)
+        np.testing.assert_array_equal(points.green, g)
+        np.testing.assert_array_equal(points.blue, b)
+
+
+def test_failed_entwine_build_raises(tmp_path, monkeypatch):
+    monkeypatch.setattr(las.subprocess, 'run', lambda args, **kwargs: las.subprocess.CompletedProcess(
+        args, returncode=1, stdout='Bounds are too large for the selected scale'))
+
+    with pytest.raises(las.ModelBuildError, match='exit code 1'):
+        las.las_to_entwine(str(tmp_path / 'cell_model.las'), str(tmp_path / 'cell_model'), threads=1)
+
+
+def test_models_share_cpu_budget(tmp_path, conversions):
+    write_snapshot(str(tmp_path))
+
+    las.build_models(str(tmp_path), per_parameter=True, cpu_budget=7)
+
+    assert sorted(os.path.basename(out_path) for _, out_path, _ in conversions) == sorted(PARAMETERS)
+    assert [threads for _, _, threads in conversions] == [2] * len(PARAMETERS)
+
+
+def test_failed_model_fails_build(tmp_path, monkeypatch):
+    write_snapshot(str(tmp_path))
+    monkeypatch.setattr(las.subprocess, 'run', lambda args, **kwargs: las.subprocess.CompletedProcess(
+        args, returncode=2, stdout=''))
+
+    with pytest.raises(las.ModelBuildError):
+        las.build_models(str(tmp_path), per_parameter=True, cpu_budget=2)
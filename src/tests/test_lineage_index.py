@@ -0,0 +1,74 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from server.pipeline.lineage.index import build_lineage_index, load_index
+
+
+def write_mutations(path: str, rows: list):
+    """
+    :param rows: (mutationId, ancestors including the mutation itself, typeCount)
+    """
+    table = pa.table({
+        'mutationId': pa.array([row[0] for row in rows], type=pa.int64()),
+        'ancestors': pa.array([row[1] for row in rows], type=pa.list_(pa.int64())),
+        'typeCount': pa.array([row[2] for row in rows], type=pa.int64()),
+        'mutationCount': pa.array([len(row[1]) for row in rows], type=pa.int64()),
+    })
+    pq.write_table(table, path)
+
+
+@pytest.fixture
+def index(tmp_path):
+    # 1 -> (2 -> 4, 3), 5 is a second root
+    mutations = str(tmp_path / 'large_final_mutations.parquet')
+    write_mutations(mutations, [
+        (4, [1, 2, 4], 10),
+        (1, [1], 1),
+        (3, [1, 3], 100),
+        (2, [1, 2], 1000),
+        (5, [5], 7),
+    ])
+    return load_index(build_lineage_index(mutations, str(tmp_path / 'lineage_index.npz')))
+
+
+def test_subtree(index):
+    assert index.subtree(1) == {
+        'mutationId': 1, 'parentId': None, 'depth': 0, 'mutationCount': 1, 'descendants': 3, 'cells': 1111
+    }
+    assert index.subtree(2)['cells'] == 1010
+    assert index.subtree(4)['parentId'] == 2
+
+
+def test_descendants_and_lineage(index):
+    assert index.descendants(1) == [2, 4, 3]
+    assert index.descendants(1, offset=1, limit=1) == [4]
+    assert index.lineage(4) == [1, 2, 4]
+    assert index.lineage(5) == [5]
+
+
+def test_is_ancestor(index):
+    assert index.is_ancestor(1, 4)
+    assert not index.is_ancestor(3, 4)
+    assert not index.is_ancestor(5, 1)
+
+
+def test_missing_mutation_is_reported(index):
+    with pytest.raises(KeyError) as error:
+        index.is_ancestor(1, 42)
+    assert error.value.args[0] == 42
+    with pytest.raises(KeyError) as error:
+        index.is_ancestor(42, 1)
+    assert error.value.args[0] == 42
+
+
+def test_empty_mutations(tmp_path):
+    mutations = str(tmp_path / 'large_final_mutations.parquet')
+    write_mutations(mutations, [])
+
+    index = load_index(build_lineage_index(mutations, str(tmp_path / 'lineage_index.npz')))
+
+    assert index.mutation_id.shape[0] == 0
+    with pytest.raises(KeyError):
+        index.subtree(1)
@@ -0,0 +1,55 @@
+import os
+import shutil
+
+from server.pipeline.reports.manifest import render_cached
+
+
+def render_to(output: str, calls: list):
+    def render():
+        calls.append(output)
+        with open(output, 'w') as f:
+            f.write('plot')
+        return output
+    return render
+
+
+def write_inputs(workdir: str):
+    data_dir = os.path.join(workdir, 'output_data')
+    dataset = os.path.join(data_dir, 'stream.parquet')
+    os.makedirs(dataset)
+    with open(os.path.join(data_dir, 'stats.parquet'), 'w') as f:
+        f.write('stats')
+    with open(os.path.join(dataset, 'part-0.parquet'), 'w') as f:
+        f.write('part')
+    return [os.path.join(data_dir, 'stats.parquet'), dataset]
+
+
+def test_skips_unchanged_inputs(tmp_path):
+    inputs = write_inputs(str(tmp_path))
+    output = str(tmp_path / 'plot.png')
+    calls = []
+    render_cached(str(tmp_path), 'plot', inputs, {}, render_to(output, calls))
+    render_cached(str(tmp_path), 'plot', inputs, {}, render_to(output, calls))
+    assert calls == [output]
+
+
+def test_renders_changed_inputs(tmp_path):
+    inputs = write_inputs(str(tmp_path))
+    output = str(tmp_path / 'plot.png')
+    calls = []
+    render_cached(str(tmp_path), 'plot', inputs, {}, render_to(output, calls))
+    with open(inputs[0], 'w') as f:
+        f.write('changed stats')
+    render_cached(str(tmp_path), 'plot', inputs, {}, render_to(output, calls))
+    assert calls == [output, output]
+
+
+def test_removed_inputs_are_unchanged(tmp_path):
+    inputs = write_inputs(str(tmp_path))
+    output = str(tmp_path / 'plot.png')
+    calls = []
+    render_cached(str(tmp_path), 'plot', inputs, {}, render_to(output, calls))
+    # report cleanup removes analyzer outputs
+    shutil.rmtree(str(tmp_path / 'output_data'))
+    assert render_cached(str(tmp_path), 'plot', inputs, {}, render_to(output, calls)) == [output]
+    assert calls == [output]
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from server.pipeline.reports import data_cache
+from server.pipeline.reports.plots import mullerplot_matplotlib
+
+PARAMS = ['birthEfficiency', 'successEfficiency']
+
+
+def write_inputs(workdir: str):
+    time = np.arange(10, dtype=np.float64)
+    data = pd.DataFrame({'time': time, '0': np.full(10, 5.0), '1': time, '2': 10.0 - time})
+    order = pd.DataFrame({'position': [0, 1, 2], 'mutationId': [0, 1, 2]})
+    params = pd.DataFrame({'mutationId': [0, 1, 2], 'birthEfficiency': [0.1, 0.5, 0.9],
+                           'successEfficiency': [0.9, 0.2, 0.4]})
+    stats = pd.DataFrame({'systemSize': np.arange(100, 110)})
+    paths = []
+    for name, frame in [('muller', data), ('stats', stats), ('params', params), ('order', order)]:
+        paths.append('{}/{}.parquet'.format(workdir, name))
+        frame.to_parquet(paths[-1])
+    return paths
+
+
+@pytest.mark.parametrize('recolor_only', [True, False])
+def test_recolored_plots_match_rendered_ones(tmp_path, monkeypatch, recolor_only):
+    data_cache.clear()
+    saved = {}
+    stacks = []
+
+    def record(fig, output_file, dpi):
+        stack_axes, colorbar_axes = fig.axes[0], fig.axes[-1]
+        saved[output_file] = ([tuple(c.get_facecolor()[0]) for c in stack_axes.collections],
+                              colorbar_axes.get_ylabel())
+        return output_file
+
+    draw_stack = mullerplot_matplotlib.draw_stack
+    monkeypatch.setattr(mullerplot_matplotlib, 'save_figure', record)
+    monkeypatch.setattr(mullerplot_matplotlib, 'draw_stack', lambda *args: stacks.append(args) or draw_stack(*args))
+    prefix = str(tmp_path) + '/muller_'
+
+    outputs = mullerplot_matplotlib.muller_plots(*write_inputs(str(tmp_path)), prefix, recolor_only=recolor_only,
+                                                 renderer='path')
+
+    assert outputs == [prefix + param + '.png' for param in PARAMS]
+    assert len(stacks) == (1 if recolor_only else len(PARAMS))
+    first, second = (saved[output] for output in outputs)
+    assert (first[1], second[1]) == tuple(PARAMS)
+    assert len(first[0]) == 3
+    assert first[0] != second[0]
+    cmap = mullerplot_matplotlib.plt.get_cmap('nipy_spectral', 4)
+    expected = mullerplot_matplotlib.param_colors(pd.DataFrame({'successEfficiency': [0.9, 0.2, 0.4]}),
+                                                  'successEfficiency', cmap)
+    np.testing.assert_allclose(second[0], expected[:3], atol=1e-6)
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from server.pipeline.reports.plots.mutation_tree_plot import tree_edges
+from server.pipeline.util.arrow import list_parents
+
+# mutation 1 is the root, 7 is a second root with no ancestors recorded
+MUTATIONS = pd.DataFrame({
+    'mutationId': [1, 2, 3, 4, 5, 6, 7],
+    'ancestors': [[1], [1, 2], [1, 3], [1, 2, 4], [1, 3, 5], [1, 2, 4, 6], []],
+    'typeCount': [10, 5, 4, 3, 2, 1, 1],
+    'mutationCount': [500, 300, 50, 200, 40, 150, 400],
+})
+
+
+def write_mutations(path: str, frame: pd.DataFrame = MUTATIONS) -> str:
+    frame.to_parquet(path)
+    return path
+
+
+def previous_edges(frame: pd.DataFrame, mutation_count_gt: int) -> set:
+    """
+    Edges of the subgraph induced by kept mutations, like the tree was filtered before
+    """
+    edges = {(ancestors[-2], mutation_id) for mutation_id, ancestors in zip(frame['mutationId'], frame['ancestors'])
+             if len(ancestors) >= 2}
+    kept = set(frame['mutationId'][frame['mutationCount'] > mutation_count_gt])
+    return {(parent, child) for parent, child in edges if parent in kept and child in kept}
+
+
+def test_parents_of_sliced_chunks():
+    ancestors = pa.array([[9], [1], [1, 2], [1, 2, 3], [], [1, 5]], type=pa.list_(pa.int64()))
+    chunked = pa.chunked_array([ancestors.slice(1, 3), ancestors.slice(4, 2)])
+    assert chunked.chunk(0).offset == 1
+
+    parents, is_root = list_parents(chunked)
+
+    np.testing.assert_array_equal(parents, [-1, 1, 2, -1, 1])
+    np.testing.assert_array_equal(is_root, [True, False, False, True, False])
+
+
+def test_parents_of_roots_only():
+    parents, is_root = list_parents(pa.chunked_array([pa.array([[], [4]], type=pa.list_(pa.int64()))]))
+
+    np.testing.assert_array_equal(parents, [-1, -1])
+    assert is_root.all()
+
+
+def test_edges_match_induced_subgraph(tmp_path):
+    path = write_mutations(str(tmp_path / 'mutations.parquet'))
+
+    for threshold in [None, 100, 250]:
+        vertices, edges, roots = tree_edges(path, threshold)
+        ids = vertices['mutationId']
+        found = {(ids[parent], ids[child]) for parent, child in edges}
+        assert found == previous_edges(MUTATIONS, -1 if threshold is None else threshold)
+        assert set(ids[roots]) <= {1, 7}
+
+
+def test_edges_of_chunked_table(tmp_path):
+    path = str(tmp_path / 'mutations.parquet')
+    pq.write_table(pa.Table.from_pandas(MUTATIONS, preserve_index=False), path, row_group_size=3)
+
+    vertices, edges, roots = tree_edges(path)
+
+    ids = vertices['mutationId']
+    assert {(ids[parent], ids[child]) for parent, child in edges} == previous_edges(MUTATIONS, -1)
+    np.testing.assert_array_equal(ids[roots], [1, 7])
@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from server.pipeline.reports.model.preview import voxel_downsample, preview_cpu_budget, full_model_cpu_budget, \
+    build_preview_model
+
+
+def snapshot(rows: int, seed: int = 0) -> pd.DataFrame:
+    random = np.random.RandomState(seed)
+    return pd.DataFrame({
+        'x': random.uniform(-50.0, 50.0, rows).astype(np.float32),
+        'y': random.uniform(0.0, 20.0, rows).astype(np.float32),
+        'z': random.uniform(5.0, 6.0, rows).astype(np.float32),
+        'birthEfficiency': random.uniform(0.0, 1.0, rows).astype(np.float32),
+        'mutationId': random.randint(1, 100, rows).astype(np.uint32),
+    })
+
+
+def chunks_of(data: pd.DataFrame, rows: int):
+    return (data.iloc[start:start + rows] for start in range(0, data.shape[0], rows))
+
+
+def test_downsample_keeps_cells_and_bounds():
+    data = snapshot(20000)
+
+    preview, bounds = voxel_downsample(chunks_of(data, 3000), 500)
+
+    assert 0 < preview.shape[0] <= 500
+    assert preview['cellCount'].sum() == data.shape[0]
+    for column in ['x', 'y', 'z']:
+        assert bounds[column] == (data[column].min(), data[column].max())
+        assert preview[column].between(bounds[column][0], bounds[column][1]).all()
+    # means weighted by cell counts equal the snapshot mean
+    mean = (preview['birthEfficiency'] * preview['cellCount']).sum() / data.shape[0]
+    assert abs(mean - data['birthEfficiency'].astype(np.float64).mean()) < 1e-4
+
+
+def test_downsample_small_first_chunk():
+    # voxel size estimated from a tiny first chunk is too small for the rest of the snapshot
+    data = pd.concat([snapshot(2000, seed=1).assign(x=np.float32(0.0)), snapshot(50000, seed=2)])
+
+    preview, bounds = voxel_downsample(chunks_of(data, 2000), 300)
+
+    assert 0 < preview.shape[0] <= 300
+    assert preview['cellCount'].sum() == data.shape[0]
+    assert bounds['x'] == (data['x'].min(), data['x'].max())
+
+
+def test_downsample_flat_snapshot():
+    data = snapshot(5000).assign(z=np.float32(1.0))
+
+    preview, _ = voxel_downsample(chunks_of(data, 1000), 100)
+
+    assert 0 < preview.shape[0] <= 100
+    assert (preview['z'] == 1.0).all()
+
+
+def test_downsample_empty_snapshot():
+    preview, bounds = voxel_downsample(iter([]), 100)
+
+    assert preview.shape[0] == 0
+    assert bounds == {}
+
+
+def test_downsample_cells_far_outside_first_chunk():
+    far = snapshot(2).assign(x=np.float32([1e7, 2e7]), y=np.float32(0.0), z=np.float32(0.0))
+    data = pd.concat([snapshot(3000), far])
+
+    preview, bounds = voxel_downsample(chunks_of(data, 1000), 500)
+
+    assert preview['cellCount'].sum() == data.shape[0]
+    assert bounds['x'] == (data['x'].min(), 2e7)
+    # far cells are not clamped into one voxel at the edge of the first chunk grid
+    for x in [1e7, 2e7]:
+        cells = preview[np.isclose(preview['x'], x)]
+        assert cells['cellCount'].tolist() == [1]
+
+
+def test_empty_snapshot_skips_preview_model(tmp_path):
+    snapshot_path = tmp_path / 'output_data' / 'final_snapshot.csv'
+    os.makedirs(str(snapshot_path))
+    snapshot(0).to_csv(str(snapshot_path / 'part-0.csv'), sep=';', index=False)
+
+    assert build_preview_model(str(tmp_path), 100) == []
+    assert not (tmp_path / 'models').exists()
+
+
+def test_preview_cpu_share():
+    assert preview_cpu_budget(8) + full_model_cpu_budget(8) == 8
+    assert preview_cpu_budget(1) == 1
+    assert full_model_cpu_budget(1) == 1
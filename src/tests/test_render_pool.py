@@ -0,0 +1,46 @@
+import os
+
+import billiard
+import numpy as np
+import pandas as pd
+
+from server.pipeline.reports.plots import plot_stats
+
+
+def write_stats(workdir: str):
+    size = 20
+    stats = pd.DataFrame({
+        'entropy': np.linspace(1.0, 2.0, size),
+        'cloneCount': np.arange(2, size + 2),
+        'systemSize': np.arange(100, size + 100),
+    })
+    for name in ['birth', 'lifespan', 'success']:
+        for kind in ['efficiency', 'resistance']:
+            stats['mean_{}_{}'.format(name, kind)] = np.random.rand(size)
+            stats['stddev_{}_{}'.format(name, kind)] = np.random.rand(size)
+    input_file = os.path.join(workdir, 'clone_stats_scalars.parquet')
+    time_file = os.path.join(workdir, 'time_points.parquet')
+    stats.to_parquet(input_file)
+    pd.DataFrame({'time': np.arange(size, dtype=np.float64)}).to_parquet(time_file)
+    return input_file, time_file
+
+
+def render_in_worker(input_file: str, time_file: str, output_path: str, results):
+    results.put(plot_stats.plot_stats(input_file, time_file, output_path))
+
+
+def test_plot_stats_workers_in_daemonic_process(tmp_path, monkeypatch):
+    # Celery prefork workers are daemonic billiard processes
+    monkeypatch.setattr(plot_stats, 'REPORTS_PLOT_STATS_WORKERS', 2)
+    input_file, time_file = write_stats(str(tmp_path))
+    output_path = str(tmp_path) + '/plots-'
+    results = billiard.Queue()
+    worker = billiard.Process(target=render_in_worker, args=(input_file, time_file, output_path, results),
+                              daemon=True)
+    worker.start()
+    paths = results.get(timeout=120)
+    worker.join(timeout=10)
+
+    assert worker.exitcode == 0
+    assert len(paths) == len(plot_stats.plans)
+    assert all(os.path.exists(path) for path in paths)
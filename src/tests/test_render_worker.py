@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+
+import matplotlib
+import matplotlib.pyplot as plt
+import pytest
+from celery import Celery
+from celery.signals import task_postrun, worker_process_init
+
+from server.pipeline.reports import render_worker
+
+
+@pytest.fixture(autouse=True)
+def worker_state(monkeypatch):
+    monkeypatch.setattr(render_worker, '_render_task_names', set())
+    monkeypatch.setattr(render_worker, '_rc_params', None)
+    rc_params = matplotlib.rcParams.copy()
+    yield
+    plt.close('all')
+    matplotlib.rcParams.update(rc_params)
+
+
+def test_render_task_resets_figure_state(monkeypatch):
+    monkeypatch.setattr(render_worker, '_rc_params', matplotlib.rcParams.copy())
+    render_worker.configure(Celery('test'), ['MULLERPLOT'])
+    linewidth = matplotlib.rcParams['lines.linewidth']
+    plt.figure()
+    matplotlib.rcParams['lines.linewidth'] = linewidth + 1
+
+    # other tasks do not touch figures
+    render_worker.on_task_postrun(sender=SimpleNamespace(name='SAVE-RESULT'))
+    assert plt.get_fignums()
+    render_worker.on_task_postrun(sender=SimpleNamespace(name='MULLERPLOT'))
+
+    assert plt.get_fignums() == []
+    assert matplotlib.rcParams['lines.linewidth'] == linewidth
+
+
+def test_warm_up_keeps_rc_params():
+    # warm up imports every report module, including the mutation tree plot
+    pytest.importorskip('igraph')
+    render_worker.on_worker_process_init()
+    render_worker.configure(Celery('test'), ['MULLERPLOT'])
+    dpi = matplotlib.rcParams['figure.dpi']
+    plt.figure()
+    matplotlib.rcParams['figure.dpi'] = dpi * 2
+
+    render_worker.on_task_postrun(sender=SimpleNamespace(name='MULLERPLOT'))
+
+    assert plt.get_fignums() == []
+    assert matplotlib.rcParams['figure.dpi'] == dpi
+
+
+def test_render_tasks_are_routed_to_render_queue(monkeypatch):
+    celery = Celery('test')
+    render_worker.configure(celery, ['MULLERPLOT'])
+    assert not celery.conf.task_routes
+
+    monkeypatch.setattr(render_worker, 'SIMBAD_RENDER_QUEUE', 'render')
+    render_worker.configure(celery, ['MULLERPLOT', 'MUTATION-HISTOGRAM'])
+    assert celery.conf.task_routes == {'MULLERPLOT': {'queue': 'render'}, 'MUTATION-HISTOGRAM': {'queue': 'render'}}
+
+
+def test_handlers_are_connected_in_render_worker_mode(monkeypatch):
+    monkeypatch.setattr(render_worker, 'SIMBAD_RENDER_WORKER', True)
+    render_worker.configure(Celery('test'), ['MULLERPLOT'])
+    try:
+        assert render_worker.on_worker_process_init in [receiver for _, receiver in worker_process_init.receivers]
+        assert render_worker.on_task_postrun in [receiver for _, receiver in task_postrun.receivers]
+    finally:
+        worker_process_init.disconnect(render_worker.on_worker_process_init)
+        task_postrun.disconnect(render_worker.on_task_postrun)
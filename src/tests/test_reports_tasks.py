@@ -0,0 +1,95 @@
+import os
+
+from celery.utils.functional import arity_greater
+from PIL import Image
+
+from database import db_session, init_db
+from models.artifact import Artifact
+from models.simulation import Simulation
+from models.simulation_step import SimulationStep
+from server.pipeline.reports import tasks as reports_tasks
+from server.pipeline.util.progress import channel_name, is_final
+
+
+def test_report_failure_publishes_final_event(engine, channel):
+    init_db()
+    db_session.begin()
+    simulation = Simulation(status='ONGOING', current_step='REPORT')
+    db_session.add(simulation)
+    db_session.flush()
+    step = SimulationStep(origin='REPORT', simulation_id=simulation.id, status='ONGOING')
+    db_session.add(step)
+    db_session.commit()
+    events = channel.subscribe(channel_name(simulation.id))
+
+    reports_tasks.celery.finalize()
+    reports_tasks.report_failed.run(None, ValueError('No plots'), None, simulation.id, step.id)
+
+    event = events.get(timeout=1)
+    assert is_final(event)
+    assert event['error'] == 'No plots'
+    db_session.expire_all()
+    assert db_session.query(Simulation).get(simulation.id).status == 'FAILURE'
+    assert db_session.query(SimulationStep).get(step.id).status == 'FAILURE'
+
+
+def test_report_failed_receives_request_and_exception():
+    # celery passes request, exception and traceback only to error callbacks taking them
+    reports_tasks.celery.finalize()
+    assert arity_greater(reports_tasks.report_failed.__header__, 1)
+
+
+STUB_TASKS = ['all_clones_plot_stats', 'noise_plot_stats', 'major_clones_plot_stats',
+              'all_clones_mullerplot_histogram', 'major_clones_mullerplot_histogram', 'mullerplot',
+              'mutation_histogram', 'lineage_index']
+
+
+def stub_plot(name: str):
+    def render(workdir, *args, **kwargs):
+        Image.new('RGB', (40, 30), 'white').save(os.path.join(workdir, 'plots', '{}.png'.format(name)))
+        return workdir
+    return render
+
+
+def write_simulation(workdir: str) -> None:
+    snapshot = os.path.join(workdir, 'output_data', 'final_snapshot.csv')
+    os.makedirs(snapshot)
+    os.makedirs(os.path.join(workdir, 'stream.parquet'))
+    with open(os.path.join(snapshot, 'part-0.csv'), 'w') as f:
+        f.write('x;y;z;birthEfficiency;mutationId\n')
+        for i in range(50):
+            f.write('{};{};{};{};{}\n'.format(i, i % 7, i % 3, i / 50.0, i % 5 + 1))
+
+
+def test_reports_run_again_on_finished_simulation(engine, channel, tmp_path, monkeypatch):
+    from server.pipeline.reports.model import las
+
+    init_db()
+    workdir = str(tmp_path / 'simulation')
+    write_simulation(workdir)
+    db_session.begin()
+    simulation = Simulation(workdir=workdir, status='ONGOING')
+    db_session.add(simulation)
+    db_session.commit()
+
+    conversions = []
+    monkeypatch.setattr(las, 'las_to_entwine', lambda las_path, out_path, threads: (
+        conversions.append(out_path), os.makedirs(out_path, exist_ok=True)))
+    monkeypatch.setattr(reports_tasks, 'SIMBAD_RESULT_CACHE', False)
+    reports_tasks.celery.finalize()
+    monkeypatch.setattr(reports_tasks.celery.conf, 'task_always_eager', True)
+    for name in STUB_TASKS:
+        monkeypatch.setattr(getattr(reports_tasks, name), 'run', stub_plot(name))
+
+    reports_tasks.reports_step.run(simulation.id)
+    artifacts = db_session.query(Artifact).filter(Artifact.simulation_id == simulation.id).count()
+    assert not os.path.exists(os.path.join(workdir, 'output_data'))
+    assert len(conversions) == 2
+
+    # the analyzer outputs are removed, unchanged models are not built again
+    reports_tasks.reports_step.run(simulation.id)
+
+    assert len(conversions) == 2
+    assert db_session.query(Artifact).filter(Artifact.simulation_id == simulation.id).count() == artifacts
+    db_session.expire_all()
+    assert db_session.query(Simulation).get(simulation.id).status == 'SUCCESS'
@@ -0,0 +1,116 @@
+import json
+import os
+import threading
+import time
+
+from database import db_session, init_db
+from models.simulation import Simulation
+from server.pipeline.simulation import result_cache, tasks as simulation_tasks
+from server.pipeline.simulation.result_cache import cache_lock, cached_keys, config_hash, evict, entry_path, \
+    MANIFEST_NAME
+
+
+def use_cache(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(result_cache, 'SIMBAD_RESULT_CACHE_PATH', str(tmp_path / 'result_cache'))
+    monkeypatch.setattr(result_cache, 'binary_digest', lambda: 'binary')
+
+
+def add_entry(key: str, size_kb: int, last_used: float, artifacts: list = None) -> None:
+    os.makedirs(os.path.join(entry_path(key), 'files'))
+    manifest_path = os.path.join(entry_path(key), MANIFEST_NAME)
+    with open(manifest_path, 'w') as f:
+        json.dump({'configHash': key, 'simulationId': 0, 'sizeKb': size_kb, 'artifacts': artifacts or []}, f)
+    os.utime(manifest_path, (last_used, last_used))
+
+
+def test_config_hash_includes_seed(tmp_path, monkeypatch):
+    use_cache(tmp_path, monkeypatch)
+    conf = {'seed': 1, 'parameters': {'mutations': 2, 'steps': 10}}
+    same = {'parameters': {'steps': 10, 'mutations': 2}, 'seed': 1}
+
+    assert config_hash(conf) == config_hash(same)
+    assert config_hash(conf) != config_hash(dict(conf, seed=2))
+
+
+def test_seedless_configuration_is_not_cached(tmp_path, monkeypatch):
+    use_cache(tmp_path, monkeypatch)
+    assert config_hash({'parameters': {'steps': 10}}) is None
+
+    monkeypatch.setattr(result_cache, 'SIMBAD_RESULT_CACHE_SEED_PATH', 'parameters.seed')
+    assert config_hash({'seed': 1, 'parameters': {'steps': 10}}) is None
+    assert config_hash({'parameters': {'steps': 10, 'seed': 1}}) is not None
+
+
+def test_evicts_old_then_least_recently_used(tmp_path, monkeypatch):
+    use_cache(tmp_path, monkeypatch)
+    now = time.time()
+    add_entry('expired', 10, now - 40 * 86400)
+    add_entry('old', 1024, now - 2 * 86400)
+    add_entry('recent', 1024, now - 86400)
+    add_entry('used', 1024, now)
+
+    assert evict(max_age_days=30, max_size_mb=2) == ['expired', 'old']
+    assert sorted(os.listdir(result_cache.SIMBAD_RESULT_CACHE_PATH)) == ['.cache.lock', 'recent', 'used']
+
+
+def test_eviction_waits_for_restores(tmp_path, monkeypatch):
+    use_cache(tmp_path, monkeypatch)
+    add_entry('expired', 10, time.time() - 40 * 86400)
+    removed = []
+    eviction = threading.Thread(target=lambda: removed.extend(evict(max_age_days=30)))
+
+    with cache_lock(exclusive=False):
+        eviction.start()
+        eviction.join(timeout=0.5)
+        assert eviction.is_alive()
+        assert os.path.exists(entry_path('expired'))
+    eviction.join(timeout=10)
+
+    assert removed == ['expired']
+
+
+def test_cached_keys_match_finished_simulations(tmp_path, monkeypatch, engine):
+    use_cache(tmp_path, monkeypatch)
+    init_db()
+    add_entry('cached', 1, time.time())
+    add_entry('failed', 1, time.time())
+    db_session.begin()
+    db_session.add_all([
+        Simulation(status='SUCCESS', config_hash='cached'),
+        Simulation(status='SUCCESS', config_hash='evicted'),
+        Simulation(status='FAILURE', config_hash='failed'),
+    ])
+    new = [Simulation(status='ONGOING', config_hash=key) for key in ['cached', 'evicted', 'failed', None]]
+    db_session.add_all(new)
+    db_session.commit()
+
+    assert cached_keys([simulation.id for simulation in new]) == {new[0].id: 'cached'}
+
+
+def test_restore_task_completes_simulation(tmp_path, monkeypatch, conf):
+    use_cache(tmp_path, monkeypatch)
+    add_entry('cached', 1, time.time(), [{'path': 'output.txt', 'name': 'output.txt', 'fileType': 'TXT',
+                                          'resolution': None, 'parent': None, 'origin': 'ANALYZER'}])
+    with open(os.path.join(entry_path('cached'), 'files', 'output.txt'), 'w') as f:
+        f.write('result')
+    simulation_tasks.celery.finalize()
+
+    step_id = simulation_tasks.restore_simulation.run(conf.id, 'cached')
+
+    simulation = db_session.query(Simulation).get(conf.simulation_id)
+    assert simulation.status == 'SUCCESS'
+    assert simulation.current_step_id == step_id
+    with open(os.path.join(simulation.workdir, 'output.txt')) as f:
+        assert f.read() == 'result'
+
+
+def test_restore_task_runs_evicted_simulation(tmp_path, monkeypatch, conf):
+    use_cache(tmp_path, monkeypatch)
+    runs = []
+    monkeypatch.setattr(simulation_tasks, 'run_simulation', runs.append)
+    simulation_tasks.celery.finalize()
+
+    assert simulation_tasks.restore_simulation.run(conf.id, 'evicted') is None
+
+    assert runs == [conf.id]
+    assert db_session.query(Simulation).get(conf.simulation_id).status == 'ONGOING'
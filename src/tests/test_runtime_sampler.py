@@ -0,0 +1,54 @@
+import csv
+import subprocess
+import sys
+import time
+
+from server.pipeline.cli import runtime_sampler
+from server.pipeline.cli.runtime_sampler import RuntimeSampler
+
+# Parent idles while its child keeps one core busy, then both exit
+BUSY_CHILD = (
+    "import subprocess, sys\n"
+    "child = subprocess.Popen([sys.executable, '-c', "
+    "'import time\\nend = time.time() + 1.5\\nwhile time.time() < end: pass'])\n"
+    "child.wait()\n"
+)
+
+
+def test_keeps_newest_samples_of_short_lived_process(tmp_path, monkeypatch):
+    monkeypatch.setattr(runtime_sampler, 'SIMBAD_CLI_MAX_SAMPLES', 3)
+    process = subprocess.Popen([sys.executable, '-c', BUSY_CHILD])
+    recorded = []
+    sampler = RuntimeSampler(process.pid, interval=0.05, on_sample=recorded.append)
+
+    sampler.start()
+    process.wait()
+    sampler.stop()
+
+    assert len(recorded) > 3
+    assert list(sampler.samples) == recorded[-3:]
+    with open(sampler.write_csv(str(tmp_path / 'simulator_profile.csv'))) as f:
+        rows = list(csv.reader(f, delimiter=';'))
+    assert rows[0] == list(runtime_sampler.Sample._fields)
+    assert [float(row[0]) for row in rows[1:]] == [sample.timestamp for sample in recorded[-3:]]
+
+
+def test_cpu_includes_child_processes():
+    process = subprocess.Popen([sys.executable, '-c', BUSY_CHILD])
+    try:
+        sampler = RuntimeSampler(process.pid, interval=1)
+        # wait for the busy child to start
+        deadline = time.time() + 5
+        while len(sampler.processes()) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        sampler.sample()
+        time.sleep(0.5)
+        sampler.sample()
+    finally:
+        process.wait()
+
+    first, second = sampler.samples
+    assert first.cpu == 0.0
+    # the parent only waits, so the usage comes from the child
+    assert second.cpu > 50.0
+    assert second.threads >= 2
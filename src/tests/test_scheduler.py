@@ -0,0 +1,137 @@
+import json
+import os
+import time
+
+import pytest
+
+from server.pipeline.cli import scheduler as scheduler_module
+from server.pipeline.cli.scheduler import Footprint, LEDGER_NAME, LocalScheduler, run_footprint
+
+DEAD_PID = 2 ** 22 + 1
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    return LocalScheduler(str(tmp_path), cpu_budget=4, memory_budget_mb=1000)
+
+
+def test_runs_are_admitted_within_budget(scheduler):
+    scheduler.enqueue('a', Footprint(2, 400))
+    scheduler.enqueue('b', Footprint(2, 400))
+    scheduler.enqueue('c', Footprint(1, 100))
+
+    assert scheduler.try_admit('a')
+    assert scheduler.try_admit('b')
+    assert not scheduler.try_admit('c')
+    scheduler.release('a')
+    assert scheduler.try_admit('c')
+    assert [entry['id'] for entry in scheduler.state()['running']] == ['b', 'c']
+
+
+def test_first_waiting_run_is_not_starved(scheduler):
+    scheduler.enqueue('running', Footprint(3, 100))
+    assert scheduler.try_admit('running')
+    scheduler.enqueue('large', Footprint(2, 100))
+    scheduler.enqueue('small', Footprint(1, 100))
+    scheduler.enqueue('later', Footprint(1, 100))
+
+    assert not scheduler.try_admit('large')
+    # the remaining core is reserved for the large run
+    assert not scheduler.try_admit('small')
+    scheduler.release('running')
+    assert scheduler.try_admit('large')
+    assert scheduler.try_admit('small')
+    assert scheduler.try_admit('later')
+
+
+def test_memory_is_reserved_for_first_waiting_run(scheduler):
+    scheduler.enqueue('running', Footprint(1, 600))
+    assert scheduler.try_admit('running')
+    scheduler.enqueue('large', Footprint(1, 500))
+    scheduler.enqueue('small', Footprint(1, 100))
+
+    assert not scheduler.try_admit('large')
+    assert not scheduler.try_admit('small')
+    scheduler.release('running')
+    assert scheduler.try_admit('small')
+
+
+def test_large_runs_are_clamped_to_budget(scheduler):
+    scheduler.enqueue('huge', Footprint(16, 64000))
+
+    assert scheduler.try_admit('huge')
+    assert scheduler.state()['cpuUsed'] == 4
+    assert scheduler.state()['memoryUsedMb'] == 1000
+
+
+def test_unknown_run_raises(scheduler):
+    with pytest.raises(KeyError):
+        scheduler.try_admit('missing')
+
+
+def test_request_keeps_place_in_queue(scheduler):
+    assert scheduler.request('running', Footprint(3, 100))
+    assert not scheduler.request('large', Footprint(2, 100))
+    assert not scheduler.request('small', Footprint(1, 100))
+    # retried requests do not enqueue the run again
+    assert not scheduler.request('large', Footprint(2, 100))
+    assert [entry['id'] for entry in scheduler.state()['queued']] == ['large', 'small']
+
+    scheduler.release('running')
+    assert scheduler.request('large', Footprint(2, 100))
+    assert scheduler.request('large', Footprint(2, 100))
+    assert [entry['id'] for entry in scheduler.state()['running']] == ['large']
+
+
+def test_queued_runs_are_not_tied_to_process(scheduler, monkeypatch):
+    with scheduler.ledger() as ledger:
+        ledger['queued'].append({'id': 'retried', 'cpu': 4, 'memoryMb': 100, 'queuedAt': 0,
+                                 'seenAt': time.time()})
+    assert not scheduler.request('later', Footprint(1, 100))
+
+    with scheduler.ledger() as ledger:
+        ledger['queued'][0]['seenAt'] = time.time() - 120
+    monkeypatch.setattr(scheduler_module, 'SIMBAD_SCHEDULER_QUEUED_TTL', 60)
+    # the run that stopped retrying does not hold its place
+    assert scheduler.request('later', Footprint(1, 100))
+
+
+def test_entries_of_dead_processes_are_pruned(scheduler, tmp_path):
+    with scheduler.ledger() as ledger:
+        ledger['running'].append({'id': 'dead', 'pid': DEAD_PID, 'cpu': 4, 'memoryMb': 1000, 'queuedAt': 0})
+
+    scheduler.enqueue('a', Footprint(1, 100))
+    assert scheduler.try_admit('a')
+
+
+def test_state_does_not_write_ledger(scheduler, tmp_path):
+    with scheduler.ledger() as ledger:
+        ledger['running'].append({'id': 'dead', 'pid': DEAD_PID, 'cpu': 4, 'memoryMb': 1000, 'queuedAt': 0})
+    ledger_path = str(tmp_path / LEDGER_NAME)
+    with open(ledger_path) as f:
+        saved = f.read()
+    modified = os.path.getmtime(ledger_path)
+
+    state = scheduler.state()
+
+    assert state['running'] == []
+    assert state['cpuUsed'] == 0
+    with open(ledger_path) as f:
+        assert f.read() == saved
+    assert os.path.getmtime(ledger_path) == modified
+
+
+def test_state_of_missing_ledger(tmp_path):
+    scheduler = LocalScheduler(str(tmp_path / 'missing'), cpu_budget=2, memory_budget_mb=100)
+
+    assert scheduler.state()['running'] == []
+    assert not os.path.exists(str(tmp_path / 'missing'))
+
+
+def test_run_footprint(tmp_path, monkeypatch):
+    monkeypatch.setattr(scheduler_module, 'SIMBAD_SCHEDULER_RUN_CPU', 1)
+    monkeypatch.setattr(scheduler_module, 'SIMBAD_SCHEDULER_RUN_MEMORY_MB', 512)
+    assert run_footprint(str(tmp_path)) == Footprint(1.0, 512)
+    with open(str(tmp_path / 'resources.json'), 'w') as f:
+        json.dump({'cpu': 3}, f)
+    assert run_footprint(str(tmp_path)) == Footprint(3.0, 512)
@@ -0,0 +1,91 @@
+import os
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pytest
+from PIL import Image
+
+from models.artifact import Artifact
+from server.pipeline.reports.manifest import image_sizes, record_image_size
+from server.pipeline.reports.pdf.simulation_report import downscale_image, build_summary_report, IMAGE_WIDTH_PX
+from server.pipeline.reports.plots.pyramid import save_figure, variant_path
+
+
+def test_same_named_plots_do_not_overwrite(tmp_path):
+    paths = []
+    for directory, color in [('histogram-a', 'red'), ('histogram-b', 'blue')]:
+        os.makedirs(str(tmp_path / directory))
+        path = str(tmp_path / directory / 'plot.png')
+        Image.new('RGBA', (IMAGE_WIDTH_PX * 2, 100), color).save(path)
+        paths.append(path)
+    out_dir = str(tmp_path / 'images')
+    os.makedirs(out_dir)
+
+    images = [downscale_image(path, out_dir, index) for index, path in enumerate(paths)]
+
+    assert len(set(image[0] for image in images)) == 2
+    assert all(image[1] == IMAGE_WIDTH_PX for image in images)
+    with Image.open(images[0][0]) as first:
+        assert first.getpixel((0, 0))[0] > 200
+
+
+def test_save_figure_records_image_size(tmp_path):
+    fig = plt.figure(figsize=(4, 3))
+    fig.add_subplot(111).plot([0, 1], [1, 0])
+
+    path = save_figure(fig, str(tmp_path / 'plot.png'), dpi=100)
+    plt.close(fig)
+
+    with Image.open(path) as image:
+        assert image_sizes(str(tmp_path)) == {path: image.size}
+
+
+def test_recorded_size_downscales_preview(tmp_path):
+    path = str(tmp_path / 'plot.png')
+    Image.new('RGB', (IMAGE_WIDTH_PX * 3, 300), 'red').save(path)
+    os.makedirs(os.path.dirname(variant_path(path, 'preview')))
+    Image.new('RGB', (1280, 128), 'blue').save(variant_path(path, 'preview'))
+
+    out_path, width, height = downscale_image(path, str(tmp_path), 0, (IMAGE_WIDTH_PX * 3, 300))
+
+    assert (width, height) == (IMAGE_WIDTH_PX, 100)
+    with Image.open(out_path) as image:
+        assert image.getpixel((0, 0))[2] > 200
+
+
+def page_colors(path: str) -> list:
+    pymupdf = pytest.importorskip('pymupdf')
+    colors = []
+    with pymupdf.open(path) as document:
+        for page in document:
+            # images from the top of the page
+            images = sorted(page.get_image_info(xrefs=True), key=lambda info: info['bbox'][1])
+            colors.append([pymupdf.Pixmap(document, info['xref']).pixel(0, 0)[:3] for info in images])
+    return colors
+
+
+def test_streamed_report_matches_story_report(tmp_path):
+    plots_dir = tmp_path / 'plots'
+    os.makedirs(str(plots_dir))
+    plots = []
+    palette = ['red', 'green', 'blue', 'yellow', 'magenta', 'cyan', 'black']
+    for index, color in enumerate(palette):
+        path = str(plots_dir / 'plot_{}.png'.format(index))
+        size = (IMAGE_WIDTH_PX * 2, 400 + 300 * (index % 3))
+        Image.new('RGB', size, color).save(path)
+        if index % 2:
+            record_image_size(path, *size)
+        plots.append(Artifact(path=path, name=os.path.basename(path)))
+    for streaming in [False, True]:
+        os.makedirs(str(tmp_path / str(streaming)))
+
+    story = page_colors(build_summary_report(plots, str(tmp_path / 'False'), streaming=False))
+    streamed = page_colors(build_summary_report(plots, str(tmp_path / 'True'), streaming=True))
+
+    assert len(streamed) == len(story) > 1
+    # jpeg recompression changes colors slightly
+    quantized = [[tuple(c // 64 for c in color) for color in page] for page in streamed]
+    assert quantized == [[tuple(c // 64 for c in color) for color in page] for page in story]
+    assert [color for page in quantized for color in page] == \
+        [tuple(c // 64 for c in Image.new('RGB', (1, 1), color).getpixel((0, 0))) for color in palette]
@@ -0,0 +1,40 @@
+import io
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+from server.pipeline.reports.plots.stack_raster import band_image, raster_stackplot
+
+
+def test_band_image_layers():
+    time = np.array([0.0, 1.0])
+    fractions = np.array([[1.0, 1.0], [1.0, 1.0]])
+    bands = band_image(time, fractions, 2, 4, 1.0, 2.0)
+    # top row first, upper half is the second layer
+    np.testing.assert_array_equal(bands[:, 0], [1, 1, 0, 0])
+
+
+def test_band_image_above_stack():
+    time = np.array([0.0, 1.0])
+    fractions = np.array([[0.5], [0.5]])
+    bands = band_image(time, fractions, 1, 2, 1.0, 1.0)
+    np.testing.assert_array_equal(bands[:, 0], [1, 0])
+
+
+def test_raster_is_computed_at_draw_size():
+    fig, ax = plt.subplots(figsize=(8, 4))
+    time = np.arange(100, dtype=np.float64)
+    fractions = np.random.rand(100, 5)
+    stack = raster_stackplot(ax, time, fractions, plt.cm.viridis(np.linspace(0, 1, 5)))
+    initial_width = stack.bands.shape[1]
+
+    # Colorbar added after the stack narrows the axes
+    fig.colorbar(plt.cm.ScalarMappable(cmap='viridis'), ax=ax)
+    fig.savefig(io.BytesIO(), dpi=150, format='png')
+    plt.close(fig)
+
+    assert stack.bands.shape[1] < initial_width * 150 / fig.dpi
+    scale = 150 / fig.dpi
+    assert stack.bands.shape == (int(round(ax.bbox.height * scale)), int(round(ax.bbox.width * scale)))
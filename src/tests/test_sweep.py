@@ -0,0 +1,90 @@
+import pytest
+
+from database import db_session, init_db
+from models.simulation import Simulation
+from models.simulation_step import SimulationStep
+from models.sweep import Sweep
+from server.pipeline.simulation import sweep as sweep_module
+from server.pipeline.simulation.sweep import SweepError, expand_sweep, set_path, sweep_points, sweep_progress
+
+BASE = {
+    'parameters': {'birthEfficiency': 0.1, 'lifespanEfficiency': 0.2},
+    'mutations': [{'probability': 0.01}, {'probability': 0.02}],
+}
+
+
+def test_grid_is_cartesian_product():
+    points = sweep_points(grid={'a': [1, 2], 'b': [3, 4]})
+    assert points == [{'a': 1, 'b': 3}, {'a': 1, 'b': 4}, {'a': 2, 'b': 3}, {'a': 2, 'b': 4}]
+
+
+def test_lists_are_zipped():
+    assert sweep_points(lists={'a': [1, 2], 'b': [3, 4]}) == [{'a': 1, 'b': 3}, {'a': 2, 'b': 4}]
+
+
+def test_grid_combined_with_lists():
+    points = sweep_points(grid={'a': [1, 2]}, lists={'b': [3, 4, 5]})
+    assert len(points) == 6
+    assert points[0] == {'a': 1, 'b': 3}
+    assert points[-1] == {'a': 2, 'b': 5}
+
+
+def test_lists_of_different_lengths():
+    with pytest.raises(SweepError):
+        sweep_points(lists={'a': [1, 2], 'b': [3]})
+
+
+def test_sweep_size_limit(monkeypatch):
+    monkeypatch.setattr(sweep_module, 'SIMBAD_SWEEP_MAX_SIZE', 3)
+    with pytest.raises(SweepError):
+        sweep_points(grid={'a': [1, 2], 'b': [3, 4]})
+
+
+def test_expand_sweep_names_and_values():
+    configurations = expand_sweep('base.json', BASE, grid={'parameters.birthEfficiency': [0.3, 0.4]},
+                                  lists={'mutations.1.probability': [0.5]})
+
+    assert [name for name, _ in configurations] == ['base_0000', 'base_0001']
+    assert configurations[1][1]['parameters']['birthEfficiency'] == 0.4
+    assert configurations[1][1]['mutations'][1]['probability'] == 0.5
+    # the base configuration is not modified
+    assert BASE['parameters']['birthEfficiency'] == 0.1
+    assert BASE['mutations'][1]['probability'] == 0.02
+
+
+def test_expand_sweep_without_values():
+    assert expand_sweep('base', BASE) == [('base_0000', BASE)]
+
+
+@pytest.mark.parametrize('path', ['parameters.missing', 'mutations.5.probability', 'mutations.x', 'a.b.c'])
+def test_set_path_requires_existing_value(path):
+    with pytest.raises(SweepError):
+        set_path({'parameters': {}, 'mutations': [{}]}, path, 1)
+
+
+def test_sweep_progress(engine):
+    init_db()
+    db_session.begin()
+    sweep = Sweep(name='base', size=3)
+    db_session.add(sweep)
+    db_session.flush()
+    simulations = [Simulation(sweep_id=sweep.id, status=status) for status in ['SUCCESS', 'ONGOING', 'ONGOING']]
+    db_session.add_all(simulations)
+    db_session.flush()
+    steps = [
+        SimulationStep(simulation_id=simulations[1].id, origin='CLI', status='SUCCESS'),
+        SimulationStep(simulation_id=simulations[1].id, origin='ANALYZER', status='ONGOING'),
+        SimulationStep(simulation_id=simulations[2].id, origin='CLI', status='QUEUED'),
+    ]
+    db_session.add_all(steps)
+    db_session.flush()
+    simulations[1].current_step_id = steps[1].id
+    simulations[2].current_step_id = steps[2].id
+    db_session.commit()
+
+    progress = sweep_progress(sweep)
+
+    assert progress['statuses'] == {'SUCCESS': 1, 'ONGOING': 1, 'QUEUED': 1}
+    # one finished simulation, and one third of another
+    assert progress['progress'] == pytest.approx((100.0 + 100.0 / 3) / 3)
+    assert progress['simulationIds'] == [simulation.id for simulation in simulations]
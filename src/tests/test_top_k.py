@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from server.pipeline.reports.top_k import top_k, top_indices
+
+
+def write_table(path: str, data: dict, row_group_size: int = 4):
+    pq.write_table(pa.Table.from_pandas(pd.DataFrame(data), preserve_index=False), path,
+                   row_group_size=row_group_size)
+
+
+def test_top_indices_prefers_earlier_ties():
+    values = np.array([1, 3, 2, 3, 3])
+    np.testing.assert_array_equal(top_indices(values, 2), [1, 3])
+
+
+def test_top_k_matches_stable_sort(tmp_path):
+    path = str(tmp_path / 'data.parquet')
+    values = np.random.RandomState(0).randint(0, 10, 50)
+    write_table(path, {'id': np.arange(50), 'value': values})
+
+    result = top_k(path, 'value', 7)
+
+    expected = pd.DataFrame({'id': np.arange(50), 'value': values}) \
+        .sort_values('value', ascending=False, kind='mergesort').head(7)
+    np.testing.assert_array_equal(result['id'].values, expected['id'].values)
+    np.testing.assert_array_equal(result['value'].values, expected['value'].values)
+
+
+def test_top_k_unsigned_column(tmp_path):
+    path = str(tmp_path / 'data.parquet')
+    write_table(path, {'id': np.arange(6), 'value': np.array([0, 5, 2, 5, 1, 9], dtype=np.uint64)})
+
+    result = top_k(path, 'value', 6)
+
+    np.testing.assert_array_equal(result['id'].values, [5, 1, 3, 2, 4, 0])
+
+
+def test_top_k_ignores_nulls(tmp_path):
+    path = str(tmp_path / 'data.parquet')
+    write_table(path, {'id': np.arange(4), 'value': [1.0, None, 3.0, None]})
+
+    result = top_k(path, 'value', 3, columns=['id'])
+
+    assert list(result.columns) == ['id']
+    np.testing.assert_array_equal(result['id'].values, [2, 0])
+
+
+def test_top_k_dataset_directory(tmp_path):
+    dataset = tmp_path / 'stream.parquet'
+    dataset.mkdir()
+    write_table(str(dataset / 'part-0.parquet'), {'value': [1, 8, 3]})
+    write_table(str(dataset / 'part-1.parquet'), {'value': [8, 2, 9]})
+
+    result = top_k(str(dataset), 'value', 3)
+
+    np.testing.assert_array_equal(result['value'].values, [9, 8, 8])